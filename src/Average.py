@@ -0,0 +1,183 @@
+#-------------------------------------------------------------------------------------
+# Average of the FR data of many measurement positions.
+# The files are read one at a time, resampled onto a common log-frequency grid and
+# added to running sums (streaming reducer), so the memory use does not depend on
+# the number of files.
+#   power: average of the power (10^(dB/10)), the spatial average of the sound field
+#   db:    average of the dB values
+# Both can be weighted per file (e.g. main listening position weighted higher).
+#
+#   python ./Average.py "../input_data/pos*.txt" [--method power] [--weights 2 1 1] [-o FR_average.txt]
+#-------------------------------------------------------------------------------------
+
+import os
+import sys
+import glob
+import argparse
+import numpy as np
+
+from Math import log_frequency_grid, resample_log
+from Utils import read_two_column_data, write_two_column_data
+
+average_methods = ["power", "db"]
+
+
+def expand_fr_files(data_file):
+    """
+    Expand the FR data file setting into a list of files.
+
+    Args:
+    - data_file (str/list): File path, glob pattern (e.g. "pos*.txt") or a list of them.
+                            An existing file is used as it is, even if its name has glob characters (e.g. "meas[1].txt").
+
+    Returns:
+    - paths (list): File paths (the matches of a pattern are sorted).
+    """
+
+    patterns = data_file if isinstance(data_file, (list, tuple)) else [data_file]
+
+    paths = []
+    for pattern in patterns:
+        pattern = str(pattern)
+        if glob.has_magic(pattern) and not os.path.exists(pattern):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise ValueError(f"No FR data files match: {pattern}")
+            paths.extend(matches)
+        else:
+            paths.append(pattern)
+
+    return paths
+
+def check_method(method):
+    """
+    Check the averaging method.
+
+    Args:
+    - method (str): Averaging method.
+
+    Returns:
+    - method (str): Averaging method.
+    """
+
+    if method not in average_methods:
+        raise ValueError(f"Unknown average method: {method} ({', '.join(average_methods)})")
+    return method
+
+def start_average(f_range, method="power"):
+    """
+    Start a streaming average on a frequency grid.
+
+    Args:
+    - f_range (ndarray): NumPy ndarray of frequencies of the common grid.
+    - method (str): "power" or "db".
+
+    Returns:
+    - acc (dict): State of the average (use add_fr and finish_average).
+    """
+
+    acc = {'f_range':np.asarray(f_range, dtype=float),
+           'method':check_method(method),
+           'sum':np.zeros(len(f_range)),
+           'weight':0.0,
+           'count':0,
+    }
+
+    return acc
+
+def add_fr(acc, freqs, gains, weight=1.0):
+    """
+    Add the FR data of one measurement to a streaming average.
+
+    Args:
+    - acc (dict): State returned by start_average.
+    - freqs (array): array of frequencies.
+    - gains (array): array of gains [dB].
+    - weight (float): Weight of the measurement.
+    """
+
+    if weight < 0:
+        raise ValueError(f"Weight must not be negative: {weight}")
+
+    g = resample_log(freqs, gains, acc['f_range'])
+    if acc['method'] == "power":
+        g = 10**(g/10)
+
+    acc['sum'] += weight*g
+    acc['weight'] += weight
+    acc['count'] += 1
+
+def finish_average(acc):
+    """
+    Get the result of a streaming average.
+
+    Args:
+    - acc (dict): State returned by start_average.
+
+    Returns:
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of averaged gains [dB].
+    """
+
+    if acc['weight'] <= 0:
+        raise ValueError("No FR data (or only zero weights) to average")
+
+    mean = acc['sum']/acc['weight']
+    if acc['method'] == "power":
+        mean = 10*np.log10(np.maximum(mean, 1e-30))
+
+    return acc['f_range'].copy(), mean
+
+def average_fr(paths, method="power", weights=None, f_range=None, read=read_two_column_data):
+    """
+    Average the FR data files of many measurement positions, one file in memory at a time.
+
+    Args:
+    - paths (list): FR data files.
+    - method (str): "power" or "db".
+    - weights (list): Weight of each file (None: equal weights).
+    - f_range (ndarray): Common frequency grid (None: Math.log_frequency_grid()).
+    - read (function): Reader of one file, returning (freqs, gains).
+
+    Returns:
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of averaged gains [dB].
+    """
+
+    if weights is None:
+        weights = [1.0]*len(paths)
+    if len(weights) != len(paths):
+        raise ValueError(f"{len(weights)} weights for {len(paths)} FR data files")
+    if f_range is None:
+        f_range = log_frequency_grid()
+
+    acc = start_average(f_range, method)
+    for path, weight in zip(paths, weights):
+        add_fr(acc, *read(path), float(weight))
+
+    return finish_average(acc)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Average the FR data of many measurement positions")
+    parser.add_argument("files", nargs="+", help="FR data files or glob patterns")
+    parser.add_argument("--method", default="power", choices=average_methods, help="averaging method (default: power)")
+    parser.add_argument("--weights", type=float, nargs="+", help="weight of each file (default: equal)")
+    parser.add_argument("--ppo", type=float, default=None,
+                        help="points per octave of the grid (default: 1000 points from 20 Hz to 20 kHz)")
+    parser.add_argument("-o", "--output", default="FR_average.txt", help="output FR data file (default: FR_average.txt)")
+    args = parser.parse_args(argv)
+
+    try:
+        paths = expand_fr_files(args.files)
+        freqs, gains = average_fr(paths, args.method, args.weights, log_frequency_grid(args.ppo))
+        write_two_column_data(args.output, freqs, gains)
+    except (OSError, ValueError) as e:
+        print("Error: ", e)
+        return 1
+
+    print(f"FR average ({len(paths)} files, {args.method}): ", args.output)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
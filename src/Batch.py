@@ -0,0 +1,228 @@
+#-------------------------------------------------------------------------------------
+# Headless batch processing: run the SONUS CORRECT pipeline for many speakers / rooms
+# in parallel from a manifest file (no tkinter / ttkthemes needed).
+#
+# Manifest (.yml):
+#   output_folder: ../output/batch   # optional, each job writes to <output_folder>/<name>
+#   defaults:                        # optional, overrides config.yaml for every job
+#     slope: -4.5
+#   jobs:
+#     - name: room1_L
+#       data_file: ../input_data/room1_L.txt
+#       lr: L
+#       low_cutoff1: 60.0
+#
+# The target curve is cached in <output_folder>/.cache unless cache_folder is set.
+# Relative paths are resolved from the folder of the file they are written in.
+#-------------------------------------------------------------------------------------
+
+import sys
+import os
+import time
+import argparse
+import contextlib
+import traceback
+import yaml
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import Pipeline
+import Plot
+
+Plot.use_file_backend()
+
+# Keys of config.yaml that hold file or folder paths
+path_keys = ['output_folder', 'data_file', 'eloud_file', 'hrtf_file', 'target_file', 'cache_folder', 'measure_sweep']
+
+
+def resolve_paths(config, base_dir):
+    """
+    Make the relative paths of a config dictionary absolute.
+
+    Args:
+    - config (dict): Config dictionary (config.yaml / manifest entries).
+    - base_dir (Path): Folder the relative paths are relative to.
+
+    Returns:
+    - dict: Config dictionary with absolute paths. Empty paths are kept empty.
+    """
+
+    resolved = dict(config)
+    for key in path_keys:
+        value = resolved.get(key)
+        if value is None or str(value) == "":
+            continue
+        if isinstance(value, list):
+            # data_file: list of files
+            resolved[key] = [str(Path(base_dir).joinpath(Path(str(v))).resolve()) for v in value]
+        else:
+            resolved[key] = str(Path(base_dir).joinpath(Path(str(value))).resolve())
+    return resolved
+
+def load_manifest(manifest_path, config_path=None):
+    """
+    Load the job list from a manifest file.
+
+    Args:
+    - manifest_path (str): Path to the manifest .yml file.
+    - config_path (str): Path to the base config.yaml (optional).
+
+    Returns:
+    - jobs (list): List of (name, config) tuples with absolute paths.
+    """
+
+    manifest_path = Path(manifest_path).resolve()
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = yaml.safe_load(f)
+
+    # A bare list of jobs is also accepted
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    if not manifest or not manifest.get('jobs'):
+        raise ValueError(f"No jobs found in {manifest_path}")
+
+    return manifest_jobs(manifest, manifest_path, config_path)
+
+def manifest_jobs(manifest, manifest_path, config_path=None):
+    """
+    Make the job list of a loaded manifest.
+
+    Args:
+    - manifest (dict): Manifest with 'jobs' (and optional 'output_folder' and 'defaults').
+    - manifest_path (Path): Path to the manifest file (relative paths are relative to its folder).
+    - config_path (str): Path to the base config.yaml (optional).
+
+    Returns:
+    - jobs (list): List of (name, config) tuples with absolute paths.
+    """
+
+    base_config = {}
+    if config_path is not None:
+        config_path = Path(config_path).resolve()
+        with open(config_path, "r", encoding="utf-8") as f:
+            base_config = resolve_paths(yaml.safe_load(f) or {}, config_path.parent)
+
+    defaults = resolve_paths(manifest.get('defaults') or {}, manifest_path.parent)
+
+    out_root = manifest.get('output_folder')
+    if out_root is None:
+        out_root = defaults.get('output_folder', base_config.get('output_folder', "."))
+    out_root = manifest_path.parent.joinpath(str(out_root)).resolve()
+
+    # The target curve cache is shared by all jobs (see TargetCalc.target_calc)
+    if not defaults.get('cache_folder') and not base_config.get('cache_folder'):
+        defaults['cache_folder'] = str(out_root.joinpath(".cache"))
+
+    jobs = []
+    names = set()
+    for i, entry in enumerate(manifest['jobs']):
+        entry = dict(entry)
+        name = str(entry.pop('name', None) or f"job{i + 1:03d}")
+        if name in names:
+            raise ValueError(f"Duplicate job name in manifest: {name}")
+        names.add(name)
+
+        config = dict(base_config)
+        config.update(defaults)
+        config['output_folder'] = str(out_root.joinpath(name))
+        config.update(resolve_paths(entry, manifest_path.parent))
+        jobs.append((name, config))
+
+    return jobs
+
+def run_job(name, config):
+    """
+    Run the pipeline for one job. The console output of the job is saved to log.txt
+    in its output folder.
+
+    Args:
+    - name (str): Job name.
+    - config (dict): Config dictionary of the job.
+
+    Returns:
+    - name (str): Job name.
+    - ok (bool): True if the job finished successfully.
+    - message (str): Traceback text if the job failed.
+    - elapsed (float): Elapsed time [sec].
+    """
+
+    start = time.perf_counter()
+    output_folder = Path(config['output_folder'])
+
+    try:
+        output_folder.mkdir(parents=True, exist_ok=True)
+        with open(output_folder.joinpath("log.txt"), "w", encoding="utf-8") as log:
+            with contextlib.redirect_stdout(log):
+                # run_pipeline waits for the deferred plots of the job
+                if Pipeline.run_pipeline(config)['plot_failures']:
+                    raise RuntimeError("Saving the plots failed")
+    except Exception:
+        return name, False, traceback.format_exc(), time.perf_counter() - start
+
+    return name, True, "", time.perf_counter() - start
+
+def run_batch(jobs, workers=None):
+    """
+    Run all jobs on a process pool and print the progress.
+
+    Args:
+    - jobs (list): List of (name, config) tuples.
+    - workers (int): Number of worker processes (default: number of CPUs).
+
+    Returns:
+    - failed (list): Names of the jobs that failed.
+    """
+
+    total = len(jobs)
+    failed = []
+    done = 0
+
+    def report(result):
+        nonlocal done
+        name, ok, message, elapsed = result
+        done += 1
+        status = "done  " if ok else "FAILED"
+        print(f"[{done}/{total}] {status} {name} ({elapsed:.1f} s)", flush=True)
+        if not ok:
+            failed.append(name)
+            print(message, file=sys.stderr, flush=True)
+
+    if workers == 1:
+        for name, config in jobs:
+            report(run_job(name, config))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # The jobs run in parallel already: each job designs its EQs one after another
+            futures = [executor.submit(run_job, name, dict(config, parallel_designs=False)) for name, config in jobs]
+            for future in as_completed(futures):
+                report(future.result())
+
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SONUS CORRECT headless batch calculation")
+    parser.add_argument("manifest", help="manifest .yml file with the list of jobs")
+    parser.add_argument("-c", "--config", default=None,
+                        help="base config.yaml (default: config.yaml in the current folder, if any)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    args = parser.parse_args(argv)
+
+    config_path = args.config
+    if config_path is None and os.path.isfile("config.yaml"):
+        config_path = "config.yaml"
+
+    jobs = load_manifest(args.manifest, config_path)
+
+    start = time.perf_counter()
+    failed = run_batch(jobs, args.jobs)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(jobs) - len(failed)}/{len(jobs)} jobs completed in {elapsed:.1f} s")
+    if failed:
+        print("failed jobs: " + ", ".join(failed))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
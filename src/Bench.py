@@ -0,0 +1,332 @@
+#-------------------------------------------------------------------------------------
+# Benchmark of the calculation stages with synthetic speaker FR data.
+# Each stage (readers, target curve, EQ data, FRI, yml merge) and the whole pipeline
+# are timed separately for every point count / band count, and the peak memory
+# (tracemalloc) is recorded. The results are written to a .json file.
+#
+#   python ./Bench.py --points 1000 10000 100000 --bands 10 30 -o bench.json
+#
+# With --startup the start-up time of the commands (python -c "import Pipeline",
+# SonusCorrect.py --help / --check-config) is measured against a time budget instead.
+#-------------------------------------------------------------------------------------
+
+import sys
+import os
+import io
+import json
+import time
+import subprocess
+import platform
+import argparse
+import contextlib
+import tempfile
+import tracemalloc
+import numpy as np
+import scipy
+from pathlib import Path
+
+import Pipeline
+import EqMake
+import TargetCalc
+import FriCalc
+import Marge
+from Math import calculate_eq_curve
+from Utils import read_two_column_data, read_eloud_fr_data, read_eq_data
+import Plot
+
+Plot.use_file_backend()
+
+# Default equal loudness curve (relative to this file)
+src_folder = Path(__file__).resolve().parent
+default_eloud_file = src_folder.joinpath("..", "data", "ISO_226_2023_75phon.txt")
+
+# Start-up time budget of the commands [sec]
+default_startup_budget = 1.0
+
+# Stages in the order they are run
+stage_names = ['read_fr', 'read_eloud', 'target_calc', 'eq_make_artificial', 'eq_make_natural',
+               'read_eq', 'fri_calc', 'merge_yml', 'end_to_end']
+
+
+def make_synthetic_fr(n_points, seed=0, n_modes=40):
+    """
+    Make synthetic speaker FR data: a tilted response with random peaks / dips and noise.
+
+    Args:
+    - n_points (int): Number of frequency points (log spaced, 20Hz to 20000Hz).
+    - seed (int): Seed of the random numbers (same seed, same data).
+    - n_modes (int): Number of random peaks / dips.
+
+    Returns:
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
+    """
+
+    rng = np.random.default_rng(seed)
+    freqs = np.geomspace(20, 20000, n_points)
+
+    f0s = 10**rng.uniform(np.log10(30), np.log10(15000), n_modes)
+    gains = rng.normal(0, 5, n_modes)
+    q_factors = rng.uniform(1, 10, n_modes)
+
+    curve = calculate_eq_curve(f0s, gains, q_factors, freqs)
+    curve += -1.0*np.log2(freqs/1000)                   # tilt [dB/oct]
+    curve += -12*np.exp(-np.log2(freqs/40)**2)*(freqs < 40)  # low frequency roll-off
+    curve += rng.normal(0, 0.3, n_points)
+
+    return freqs, curve
+
+def write_synthetic_fr(file_path, freqs, gains):
+    """
+    Write synthetic FR data in the format of the speaker FR data file.
+    The frequencies keep enough digits to stay distinct (the reader drops repeated frequencies).
+
+    Args:
+    - file_path (Path): Output file path.
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
+    """
+
+    np.savetxt(file_path, np.column_stack((freqs, gains)), delimiter=', ', fmt=('%.8g', '%.4f'))
+
+def make_config(work_dir, spkr_path, eloud_path, band_num):
+    """
+    Make a config dictionary (as config.yaml) for a benchmark run.
+
+    Args:
+    - work_dir (Path): Folder of the output files.
+    - spkr_path (Path): Speaker FR data file.
+    - eloud_path (Path): Equal loudness curve file.
+    - band_num (int): Number of bands.
+
+    Returns:
+    - config (dict): Config dictionary.
+    """
+
+    config = {
+        'band_num': band_num,
+        'data_file': str(spkr_path),
+        'default_q': 4.0,
+        'dip_alpha': 1,
+        'eloud_file': str(eloud_path),
+        'eq1_file': "eq_1.txt",
+        'eq2_file': "eq_2.txt",
+        'eq_file_yml': "eq_R.yml",
+        'high_cutoff1': 5000.0,
+        'high_cutoff2': 3000.0,
+        'hrtf_file': "",
+        'low_cutoff1': 80.0,
+        'low_cutoff2': 80.0,
+        'lr': "R",
+        'max_q': 8.0,
+        'min_q': 1.0,
+        'output_folder': str(work_dir),
+        'slope': -4.5,
+        'target': 0.0,
+    }
+
+    return config
+
+def measure(func, repeat):
+    """
+    Time a function and record its peak memory. The console output of the function is discarded.
+
+    Args:
+    - func (function): Function without arguments.
+    - repeat (int): Number of timed runs.
+
+    Returns:
+    - record (dict): 'times' [sec] of each run, 'min', 'median' [sec] and 'peak_kb' (tracemalloc) [KiB].
+    """
+
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+
+        # Peak memory in a separate run (tracemalloc slows the run down)
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    record = {'times':times,
+              'min':min(times),
+              'median':float(np.median(times)),
+              'peak_kb':peak/1024,
+    }
+
+    return record
+
+def bench_case(n_points, band_num, repeat, seed, eloud_path, stages):
+    """
+    Run the benchmark of all stages for one point count / band count.
+
+    Args:
+    - n_points (int): Number of points of the synthetic FR data.
+    - band_num (int): Number of bands.
+    - repeat (int): Number of timed runs of each stage.
+    - seed (int): Seed of the synthetic FR data.
+    - eloud_path (Path): Equal loudness curve file.
+    - stages (list): Names of the stages to time.
+
+    Returns:
+    - results (list): Result dictionaries of the stages.
+    """
+
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="sonus_bench_") as tmp:
+        work_dir = Path(tmp)
+        spkr_path = work_dir.joinpath("synthetic_FR_data.txt")
+        write_synthetic_fr(spkr_path, *make_synthetic_fr(n_points, seed))
+
+        config = make_config(work_dir, spkr_path, eloud_path, band_num)
+        params = Pipeline.parse_config(config)
+        data1 = Pipeline.eq_make_data(params, "artificial")
+        data2 = Pipeline.eq_make_data(params, "natural")
+        eq1_path = data1['out_path']
+        yml_path = data1['out_path_yml']
+
+        # The stages read the files written by the previous stages
+        funcs = {
+            'read_fr':            lambda: read_two_column_data(spkr_path),
+            'read_eloud':         lambda: read_eloud_fr_data(eloud_path),
+            'target_calc':        lambda: TargetCalc.target_calc(eloud_path, work_dir, params['slope'], Path("")),
+            'eq_make_artificial': lambda: EqMake.eq_make(data1),
+            'eq_make_natural':    lambda: EqMake.eq_make(data2),
+            'read_eq':            lambda: read_eq_data(eq1_path),
+            'fri_calc':           lambda: FriCalc.fri_calc(eq1_path, spkr_path, eloud_path, params['slope']),
+            'merge_yml':          lambda: Marge.merge_yml(yml_path, yml_path, "eqdata.yml"),
+            'end_to_end':         lambda: Pipeline.run_pipeline(config),
+        }
+
+        # With a part of the stages, the input files of later stages are made beforehand
+        if set(stages) != set(stage_names):
+            with contextlib.redirect_stdout(io.StringIO()):
+                Pipeline.run_pipeline(config)
+
+        for name in stage_names:
+            if name not in stages:
+                continue
+
+            record = measure(funcs[name], repeat)
+            record.update({'points':n_points, 'bands':band_num, 'stage':name})
+            results.append(record)
+
+            print(f"{n_points:>8} {band_num:>5}  {name:<20} {record['median']*1000:>10.2f} ms"
+                  f" {record['peak_kb']/1024:>9.2f} MiB", flush=True)
+
+    return results
+
+def startup_commands():
+    """
+    Commands whose start-up time is measured (run in the src folder).
+
+    Returns:
+    - commands (list): List of (name, command line) tuples.
+    """
+
+    python = sys.executable
+    commands = [
+        ("python",                     [python, "-c", "pass"]),
+        ("import Pipeline",            [python, "-c", "import Pipeline"]),
+        ("SonusCorrect --help",        [python, "SonusCorrect.py", "--help"]),
+    ]
+    if src_folder.joinpath("config.yaml").is_file():
+        commands.append(("SonusCorrect --check-config", [python, "SonusCorrect.py", "--check-config", "config.yaml"]))
+
+    return commands
+
+def bench_startup(repeat, budget):
+    """
+    Measure the start-up time of the commands in new processes.
+
+    Args:
+    - repeat (int): Number of timed runs of each command.
+    - budget (float): Time budget of each command [sec] (the median is compared).
+
+    Returns:
+    - results (list): Result dictionaries of the commands.
+    """
+
+    results = []
+    for name, command in startup_commands():
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=src_folder, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+
+        record = {'stage':"startup", 'command':name,
+                  'times':times,
+                  'min':min(times),
+                  'median':float(np.median(times)),
+                  'budget':budget,
+                  'over_budget':bool(np.median(times) > budget),
+        }
+        results.append(record)
+
+        status = "OVER BUDGET" if record['over_budget'] else "ok"
+        print(f"{name:<30} {record['median']*1000:>10.2f} ms  {status}", flush=True)
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SONUS CORRECT benchmark with synthetic FR data")
+    parser.add_argument("--points", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="point counts of the synthetic FR data (default: 1000 10000 100000)")
+    parser.add_argument("--bands", type=int, nargs="+", default=[10, 30],
+                        help="band counts (default: 10 30)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs of each stage (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic FR data (default: 0)")
+    parser.add_argument("--stages", nargs="+", default=stage_names, choices=stage_names, metavar="STAGE",
+                        help="stages to run (default: all): " + " ".join(stage_names))
+    parser.add_argument("--startup", action="store_true",
+                        help="measure the start-up time of the commands instead of the stages")
+    parser.add_argument("--budget", type=float, default=default_startup_budget,
+                        help=f"start-up time budget [sec] (default: {default_startup_budget})")
+    parser.add_argument("--eloud", default=str(default_eloud_file), help="equal loudness curve file")
+    parser.add_argument("-o", "--output", default="bench.json", help="result .json file (default: bench.json)")
+    args = parser.parse_args(argv)
+
+    eloud_path = Path(args.eloud).resolve()
+
+    if args.startup:
+        print(f"{'command':<30} {'median':>13}")
+        results = bench_startup(args.repeat, args.budget)
+    else:
+        print(f"{'points':>8} {'bands':>5}  {'stage':<20} {'median':>13} {'peak':>13}")
+        results = []
+        for n_points in args.points:
+            for band_num in args.bands:
+                results.extend(bench_case(n_points, band_num, args.repeat, args.seed, eloud_path, args.stages))
+
+    report = {
+        'meta': {
+            'date': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"results → {args.output}")
+
+    # Exit code 1 if a command is over the start-up time budget
+    if any(record.get('over_budget') for record in results):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+#-------------------------------------------------------------------------------------
+# Incremental re-run of the pipeline (config: incremental: true).
+# Each stage (target curve, EQ design + FRI of each target type, plot of each EQ) is
+# fingerprinted by the digests of its input files and the settings it depends on.
+# The fingerprints and the stage results are kept in <output_folder>/.build; a stage
+# whose fingerprint is unchanged and whose output files still exist is not run again.
+# Stages depend on each other through their keys (the EQ design key contains the
+# target curve key), so a change invalidates all stages after it.
+#-------------------------------------------------------------------------------------
+
+import os
+import json
+import pickle
+from pathlib import Path
+
+from Cache import file_digest, make_key
+
+# Change when the stage results change (invalidates the results of older versions)
+build_version = 1
+
+build_folder = ".build"
+state_file = "state.json"
+
+# Settings of the EQ design of both target types
+design_keys = ['band_num', 'max_q', 'min_q', 'default_q', 'window_oct', 'target', 'dip_alpha', 'q_fit', 'refine',
+               'fr_smoothing', 'dip_smoothing', 'grid_ppo', 'tolerance_rms', 'tolerance_max', 'min_improvement']
+
+# Settings of the EQ design of each target type
+type_keys = {'artificial':['low_cutoff1', 'high_cutoff1'],
+             'natural':['low_cutoff2', 'high_cutoff2'],
+}
+
+
+def _digest_or_empty(file_path):
+    return file_digest(file_path) if os.path.isfile(file_path) else ""
+
+def stage_keys(params):
+    """
+    Calculate the fingerprints of the stages.
+
+    Args:
+    - params (dict): Parameters returned by Pipeline.parse_config.
+
+    Returns:
+    - keys (dict): 'target', '<target type>' (EQ design and FRI) and 'plot_<target type>' keys.
+    """
+
+    keys = {}
+    keys['target'] = make_key("target", build_version, file_digest(params['eloud_file']),
+                              _digest_or_empty(params['hrtf_file']), params['slope'], params['grid_ppo'])
+
+    # Speaker FR data: all files (measurement positions) and the settings of their reading
+    spkr_parts = [file_digest(path) for path in params['data_files']]
+    spkr_parts += [params['data_weights'], params['average']]
+    if any(path.suffix.lower() == ".wav" for path in params['data_files']):
+        sweep_digest = file_digest(params['measure_sweep']) if params['measure_sweep'] else ""
+        spkr_parts += [sweep_digest, params['measure_channel'], params['measure_window_ms'], params['measure_smoothing']]
+    spkr_key = make_key("spkr", *spkr_parts)
+
+    for target_type, keys_of_type in type_keys.items():
+        settings = [params[key] for key in design_keys + keys_of_type]
+        keys[target_type] = make_key("design", build_version, target_type, keys['target'], spkr_key, *settings)
+        keys['plot_' + target_type] = make_key("plot", build_version, keys[target_type], params['plot'])
+
+    return keys
+
+def load_state(output_folder):
+    """
+    Load the fingerprints of the last run.
+
+    Args:
+    - output_folder (Path): Output folder.
+
+    Returns:
+    - state (dict): {stage: {'key': fingerprint, 'files': output files}} (empty if there was no run).
+    """
+
+    path = Path(output_folder).joinpath(build_folder, state_file)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+def save_state(state, output_folder):
+    """
+    Save the fingerprints of this run.
+
+    Args:
+    - state (dict): State returned by load_state and updated by record.
+    - output_folder (Path): Output folder.
+    """
+
+    folder = Path(output_folder).joinpath(build_folder)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    # Write to a temporary file first, so that an interrupted run never leaves a partial file
+    tmp_path = folder.joinpath(f"{state_file}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, folder.joinpath(state_file))
+
+def is_current(state, output_folder, name, key):
+    """
+    Check whether a stage is unchanged since the last run and its output files still exist.
+
+    Args:
+    - state (dict): State returned by load_state.
+    - output_folder (Path): Output folder.
+    - name (str): Stage name.
+    - key (str): Fingerprint of the stage in this run.
+
+    Returns:
+    - current (bool): True if the stage does not have to run.
+    """
+
+    entry = state.get(name)
+    if not entry or entry.get('key') != key:
+        return False
+    return all(Path(output_folder).joinpath(file).is_file() for file in entry.get('files', []))
+
+def reuse(state, output_folder, name, key):
+    """
+    Load the result of an unchanged stage.
+
+    Args:
+    - state (dict): State returned by load_state.
+    - output_folder (Path): Output folder.
+    - name (str): Stage name.
+    - key (str): Fingerprint of the stage in this run.
+
+    Returns:
+    - result: Result of the stage saved by record, or None if the stage has to run.
+    """
+
+    if not is_current(state, output_folder, name, key):
+        return None
+
+    path = Path(output_folder).joinpath(build_folder, name + ".pkl")
+    try:
+        with open(path, "rb") as f:
+            saved_key, result = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+        return None
+
+    # The result file is written before the state: it may be of a newer, interrupted run
+    return result if saved_key == key else None
+
+def record(state, output_folder, name, key, result=None, files=()):
+    """
+    Record a stage that has run (save_state writes the state).
+
+    Args:
+    - state (dict): State returned by load_state.
+    - output_folder (Path): Output folder.
+    - name (str): Stage name.
+    - key (str): Fingerprint of the stage in this run.
+    - result: Result of the stage for reuse (None: only the output files).
+    - files (list): Output files of the stage (relative to the output folder).
+    """
+
+    if result is not None:
+        folder = Path(output_folder).joinpath(build_folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        tmp_path = folder.joinpath(f"{name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump((key, result), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, folder.joinpath(name + ".pkl"))
+
+    state[name] = {'key':key, 'files':[str(file) for file in files]}
@@ -0,0 +1,138 @@
+#-------------------------------------------------------------------------------------
+# Content-addressed on-disk cache of calculated curves (NumPy arrays).
+# Keys are hashes of the input file contents and parameters, the cache folder is
+# kept below a size limit by deleting the least recently used entries.
+#-------------------------------------------------------------------------------------
+
+import os
+import hashlib
+import numpy as np
+from pathlib import Path
+
+# Default size limit of a cache folder [bytes]
+default_max_bytes = 64 * 1024 * 1024
+
+# File digests already calculated in this process: {path: (size, mtime_ns, digest)}
+_digests = {}
+
+
+def file_digest(file_path):
+    """
+    Calculate the SHA-256 digest of the contents of a file.
+    The digest is remembered until the size or modification time of the file changes.
+
+    Args:
+    - file_path (str): Path to the file.
+
+    Returns:
+    - digest (str): Hex digest of the file contents.
+    """
+
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    known = _digests.get(file_path)
+    if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+        return known[2]
+
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    _digests[file_path] = (stat.st_size, stat.st_mtime_ns, digest)
+    return digest
+
+def make_key(*parts):
+    """
+    Make a cache key from file digests and parameters.
+
+    Args:
+    - parts: Values identifying the cached result (str, float, int, ...).
+
+    Returns:
+    - key (str): Hex digest used as cache file name.
+    """
+
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(repr(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def cache_load(cache_dir, key):
+    """
+    Load a cached array.
+
+    Args:
+    - cache_dir (str): Cache folder.
+    - key (str): Cache key.
+
+    Returns:
+    - (ndarray): Cached NumPy ndarray, or None if it is not cached.
+    """
+
+    path = Path(cache_dir).joinpath(key + ".npy")
+    try:
+        array = np.load(path)
+    except (OSError, ValueError):
+        return None
+
+    # Mark as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return array
+
+def cache_store(cache_dir, key, array, max_bytes=default_max_bytes):
+    """
+    Store an array in the cache and evict the least recently used entries
+    while the cache folder is larger than max_bytes.
+
+    Args:
+    - cache_dir (str): Cache folder.
+    - key (str): Cache key.
+    - array (ndarray): NumPy ndarray to store.
+    - max_bytes (int): Size limit of the cache folder [bytes].
+    """
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # Write to a temporary file first, so that concurrent runs never read a partial file
+    path = cache_dir.joinpath(key + ".npy")
+    tmp_path = cache_dir.joinpath(f"{key}.{os.getpid()}.tmp.npy")
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+    evict(cache_dir, max_bytes)
+
+def evict(cache_dir, max_bytes=default_max_bytes):
+    """
+    Delete the least recently used cache entries until the folder is not larger than max_bytes.
+
+    Args:
+    - cache_dir (str): Cache folder.
+    - max_bytes (int): Size limit of the cache folder [bytes].
+    """
+
+    entries = []
+    for path in Path(cache_dir).glob("*.npy"):
+        if path.name.endswith(".tmp.npy"):
+            continue
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
@@ -2,27 +2,24 @@
 # Program to generate eqfilter for sound field correction from frequency response data
 #-------------------------------------------------------------------------------------
 
-import os
-import subprocess
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from datetime import datetime
 from pathlib import Path
-from scipy.optimize import curve_fit
-from scipy.interpolate import interp1d
-from scipy.signal import find_peaks
 
-from Math import linear_interpolation, gaussian_function, apply_curve, calculate_eq_curve
-from Utils import read_fr_data, remove_duplicates, read_fri_diff, write_eq_settings_yml1
+from Math import linear_interpolation, gaussian_function, fit_gaussians, apply_curve, calculate_eq_curve, add_eq_band, calculate_peak_filter_gains, calculate_eq_jacobian, fractional_octave_smoothing, log_frequency_grid, resample_log
+from Utils import read_two_column_data, remove_duplicate_rows, write_eq_settings_yml1, format_eq_settings
+from Timing import stage
+import Plot
 
+# scipy and matplotlib are imported inside the functions that use them (startup time)
 
-def interpolate_gain(df, target_freq):
+
+def interpolate_gain(freqs, gains, target_freq):
     """
     Interpolate gain at the target frequency using neighboring frequencies.
     
     Args:
-    - df (DataFrame): Dataframe containing frequency and gain columns.
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
     - target_freq (float): Target frequency for interpolation.
     
     Returns:
@@ -30,8 +27,6 @@ def interpolate_gain(df, target_freq):
     """
     
     # Find the neighboring frequencies
-    freqs = df['freq'].values
-    gains = df['gain'].values
     idx = np.argsort(abs(freqs - target_freq))
     nearest_freqs = freqs[idx[:2]]
     nearest_gains = gains[idx[:2]]
@@ -40,14 +35,18 @@ def interpolate_gain(df, target_freq):
     interpolated_gain = np.interp(target_freq, nearest_freqs, nearest_gains)
     return interpolated_gain
 
-def find_dips(df, low_cutoff, high_cutoff):
+def find_dips(freqs_all, gains_all, low_cutoff, high_cutoff, q_fit="curve_fit", dip_smoothing="moving_average"):
     """
     Find dips in frequency response data and output them.
     
     Args:
-    - df (DataFrame): Dataframe containing frequency and gain columns.
+    - freqs_all (ndarray): NumPy ndarray of frequencies.
+    - gains_all (ndarray): NumPy ndarray of gains.
     - low_cutoff (float): Low cutoff frequency.
     - High_cutoff (float): High cutoff frequency.
+    - q_fit (str): "curve_fit": fit the dips one by one, "batch": fit all dips at once.
+    - dip_smoothing (str/float): Baseline of the dips: "moving_average" (over a third of the points)
+                                 or N (1/N octave smoothing, independent of the point density).
     
     Returns:
     - dips (array): Freauencies of dips.
@@ -55,21 +54,27 @@ def find_dips(df, low_cutoff, high_cutoff):
     - q_factors (array): Q factors of dips.
     """
     
-    filtered_df = df[(df['freq'] >= low_cutoff) & (df['freq'] <= high_cutoff)]
+    cutoff = (freqs_all >= low_cutoff) & (freqs_all <= high_cutoff)
     
-    freqs = filtered_df['freq'].to_numpy()
-    gains = filtered_df['gain'].to_numpy()
+    freqs = freqs_all[cutoff]
+    gains = gains_all[cutoff]
     gains_inverted = -gains
     
-    # Find the moving average
-    window_size = int(len(freqs)/3)
-    smoothed_gains = np.convolve(gains_inverted, np.ones(window_size)/window_size, mode='same')
+    if dip_smoothing == "moving_average":
+        # Find the moving average
+        window_size = int(len(freqs)/3)
+        smoothed_gains = np.convolve(gains_inverted, np.ones(window_size)/window_size, mode='same')
+    else:
+        # 1/N octave smoothing on the log-frequency axis
+        smoothed_gains = fractional_octave_smoothing(freqs, gains_inverted, float(dip_smoothing), power=False)
 
     # Subtract moving average from frequency response
     adjusted_gains = gains_inverted[:len(smoothed_gains)] - smoothed_gains
     
     std_gains = adjusted_gains / adjusted_gains.max()
     
+    from scipy.signal import find_peaks
+    
     peaks, _ = find_peaks(std_gains, height=0.3)
     
     # Calculate the distance between peaks and exclude peaks that are close together
@@ -89,53 +94,57 @@ def find_dips(df, low_cutoff, high_cutoff):
     
     q_factors = []
     
-    for i in range(len(dips)):
-        q_factor = estimate_q_factor(filtered_df, dips[i], dip_gains[i], 0.1, 8, 1, 4)
-        q_factors.append(q_factor + 2)    
+    if q_fit == "batch":
+        q_factors = list(estimate_q_factors(freqs, gains, dips, dip_gains, 0.1, 8, 1, 4) + 2)
+    else:
+        for i in range(len(dips)):
+            q_factor = estimate_q_factor(freqs, gains, dips[i], dip_gains[i], 0.1, 8, 1, 4)
+            q_factors.append(q_factor + 2)    
     
     return dips, dip_gains, q_factors
 
 
-def find_peak_and_dip(df, df_t):
+def find_peak_and_dip(freqs, gains, t_gains):
     """
     Find the peak and dip from the data.
     
     Args:
-    - df (DataFrame): Dataframe containing frequency and gain columns.
-    - df_t (DataFrame): Dataframe containing frequency and gain columns.
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
+    - t_gains (ndarray): NumPy ndarray of gains of the target curve at freqs.
     
     Returns:
     - float: Frequency of the peak or dip.
     - float: Gain at the peak or dip frequency.
     """
     
-    df_t_tmp = df_t.rename(columns={'gain':'gain_t'})
-    merged_df = pd.merge(df, df_t_tmp, on='freq')
-    merged_df['gain'] = merged_df['gain'] - merged_df['gain_t']
-    df_r = merged_df[['freq','gain']]
+    gains_r = gains - t_gains
     
     # Find the maximum and minimum gain
-    max_g = df_r['gain'].max()
-    min_g = df_r['gain'].min()
+    idx_max = np.argmax(gains_r)
+    idx_min = np.argmin(gains_r)
+    max_g = gains_r[idx_max]
+    min_g = gains_r[idx_min]
     
     # Check which one is further from the target gain
-    max_g_freq = df_r[df_r['gain'] == max_g]['freq'].values[0]
-    min_g_freq = df_r[df_r['gain'] == min_g]['freq'].values[0]
+    max_g_freq = freqs[idx_max]
+    min_g_freq = freqs[idx_min]
     
     
     if abs(max_g) > abs(min_g): #If the peak is the target
         # Peak is further from the target gain
-        return max_g_freq, df.loc[df['freq'] == max_g_freq, 'gain'].values[0]
+        return max_g_freq, gains[np.argmax(freqs == max_g_freq)]
     else: #If the dip is the target
         # Dip is further from the target gain
-        return min_g_freq, df.loc[df['freq'] == min_g_freq, 'gain'].values[0]
+        return min_g_freq, gains[np.argmax(freqs == min_g_freq)]
     
-def estimate_neighbor_freq(df_filtered, freq, gain, window_oct):
+def estimate_neighbor_freq(freqs, gains, freq, gain, window_oct):
     """
     Estimate the neighbor frequency using Gaussian peak modeling.
     
     Args:
-    - df_filtered (DataFrame): Filtered data.
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
     - freq (float): Frequency of the peak or dip.
     - gain (float): Gain at the peak or dip frequency.
     
@@ -143,10 +152,6 @@ def estimate_neighbor_freq(df_filtered, freq, gain, window_oct):
     - float: Estimated neighbor frequency.
     """
     
-    # Get frequencies and gains from the filtered dataframe
-    freqs = df_filtered['freq'].values
-    gains = df_filtered['gain'].values
-    
     # Extract data within the window around the peak frequency
     f_hi = 2**(np.log2(freq) + window_oct)
     f_lo = 2**(np.log2(freq) - window_oct)
@@ -155,6 +160,8 @@ def estimate_neighbor_freq(df_filtered, freq, gain, window_oct):
     gains_window = gains[idx]
     
     # Fit Gaussian function to the data
+    from scipy.optimize import curve_fit
+    
     sigma = 1/(np.sqrt(2*np.pi)*gain)
     gamma = 1
     p0  = [gain, np.log10(freq), sigma]  # Initial guess for the parameters
@@ -186,12 +193,13 @@ def estimate_neighbor_freq(df_filtered, freq, gain, window_oct):
     
     return neighbor_freq
     
-def estimate_q_factor(df_filtered, freq, gain, window_oct, max_q, min_q, default_q):
+def estimate_q_factor(freqs, gains, freq, gain, window_oct, max_q, min_q, default_q):
     """
     Estimate Q factor.
     
     Args:
-    - df_filtered (DataFrame): Filtered data.
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
     - freq (float): Frequency of the peak or dip.
     - gain (float): Gain at the peak or dip frequency.
     
@@ -200,9 +208,7 @@ def estimate_q_factor(df_filtered, freq, gain, window_oct, max_q, min_q, default
     """
         
     # Find the neighboring frequencies closest to 3 dB below the peak/dip gain
-    freqs = df_filtered['freq'].values
-    gains = df_filtered['gain'].values
-    neighbor_freq = estimate_neighbor_freq(df_filtered, freq, gain, window_oct)
+    neighbor_freq = estimate_neighbor_freq(freqs, gains, freq, gain, window_oct)
     
     # Check if neighbor_freq is assigned before using it
     if neighbor_freq is None:
@@ -226,7 +232,141 @@ def estimate_q_factor(df_filtered, freq, gain, window_oct, max_q, min_q, default
         
     return q_factor
 
+def estimate_q_factors(freqs, gains, peak_freqs, peak_gains, window_oct, max_q, min_q, default_q):
+    """
+    Estimate the Q factors of many peaks / dips at once.
+    The Gaussian functions of all windows are fitted together (Math.fit_gaussians);
+    if a fit fails, the peak/dip gain is used as amplitude as in estimate_neighbor_freq.
+    
+    Args:
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
+    - peak_freqs (array): Frequencies of the peaks or dips.
+    - peak_gains (array): Gains at the peak or dip frequencies.
+    
+    Returns:
+    - q_factors (ndarray): Estimated Q factors.
+    """
+    
+    peak_freqs = np.asarray(peak_freqs, dtype=float)
+    peak_gains = np.asarray(peak_gains, dtype=float)
+    
+    # Extract data within the window around each peak frequency
+    xs = []
+    ys = []
+    for freq in peak_freqs:
+        f_hi = 2**(np.log2(freq) + window_oct)
+        f_lo = 2**(np.log2(freq) - window_oct)
+        idx = (freqs >= f_lo) & (freqs <= f_hi)
+        xs.append(np.log10(freqs[idx]))
+        ys.append(gains[idx])
+    
+    # Fit Gaussian functions to the data
+    with np.errstate(divide='ignore'):
+        sigmas = 1/(np.sqrt(2*np.pi)*peak_gains)
+    p0s = np.column_stack((peak_gains, np.log10(peak_freqs), sigmas))  # Initial guess for the parameters
+    params, ok = fit_gaussians(xs, ys, p0s)
+    amplitudes = np.where(ok, params[:, 0], peak_gains)
+    
+    # Estimate neighbor frequency as the frequency at -3 dB from the peak
+    neighbor_freqs = peak_freqs * 10**((peak_gains - 3) / (20 * amplitudes))
+    
+    # Same log as estimate_q_factor for each peak / dip
+    for x, fit_ok, freq, neighbor_freq in zip(xs, ok, peak_freqs, neighbor_freqs):
+        if fit_ok:
+            print("---Complete Gaussian fitting---")
+        elif len(x) < 3:
+            print("---Gaussian Curve fitting Error---")
+        else:
+            print("---Gaussian Curve fitting failed.---")
+        if neighbor_freq < freq:
+            print("Neighbor frequency is lower than the peak/dip frequency.")
+    
+    # Calculate the Q factor
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mfreqs = 10**(np.log10(peak_freqs) - (np.log10(neighbor_freqs) - np.log10(peak_freqs)))
+        octs = np.log2(neighbor_freqs / mfreqs)
+        q_factors = np.clip(1.41 / octs, min_q, max_q)
+    
+    # Neighbor frequency lower than the peak/dip frequency
+    q_factors = np.where(neighbor_freqs < peak_freqs, default_q, q_factors)
+    
+    return q_factors
+
+def refine_eq(freqs, gains0, t_curve, f0s, eq_gains, q_factors, low_cutoff, high_cutoff, max_q, min_q, max_nfev=200):
+    """
+    Optimize all peak filters together (least squares) after the greedy placement.
+    The error between the EQed FR data and the target curve inside the cutoff range is minimized,
+    with the frequencies kept inside the cutoff range and the Q factors inside [min_q, max_q].
+    
+    Args:
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains0 (ndarray): NumPy ndarray of gains before EQ.
+    - t_curve (ndarray): NumPy ndarray of the target curve.
+    - f0s (list): Frequencies of peak filters.
+    - eq_gains (list): Gains of peak filters.
+    - q_factors (list): Q factors of peak filters.
+    - max_nfev (int): Maximum number of evaluations of the EQ curve.
+    
+    Returns:
+    - f0s (list): Optimized frequencies of peak filters.
+    - eq_gains (list): Optimized gains of peak filters.
+    - q_factors (list): Optimized Q factors of peak filters.
+    """
+    
+    from scipy.optimize import least_squares
+    
+    n = len(f0s)
+    if n == 0 or high_cutoff <= low_cutoff or max_q <= min_q:
+        return f0s, eq_gains, q_factors
+    
+    cutoff = (freqs >= low_cutoff) & (freqs <= high_cutoff)
+    freqs_cutoff = freqs[cutoff]
+    error0 = gains0[cutoff] - t_curve[cutoff]
+    
+    # Parameters: [f0, gain, q] of each filter
+    # The gains are kept within the largest gain of the greedy placement
+    gain_limit = max(np.nanmax(np.abs(eq_gains)), 1.0)
+    lower = np.tile([low_cutoff, -gain_limit, min_q], n)
+    upper = np.tile([high_cutoff, gain_limit, max_q], n)
+    x0 = np.column_stack((f0s, eq_gains, q_factors)).ravel()
+    x0 = np.clip(np.nan_to_num(x0, nan=min_q), lower, upper)
+    
+    def residual(x):
+        p = x.reshape(n, 3)
+        return error0 + calculate_peak_filter_gains(p[:, 0], p[:, 1], p[:, 2], freqs_cutoff).sum(axis=0)
+    
+    def jacobian(x):
+        p = x.reshape(n, 3)
+        # (filters x frequencies x 3) -> (frequencies x parameters)
+        return calculate_eq_jacobian(p[:, 0], p[:, 1], p[:, 2], freqs_cutoff).transpose(1, 0, 2).reshape(len(freqs_cutoff), n*3)
+    
+    res = least_squares(residual, x0, jac=jacobian, bounds=(lower, upper), x_scale='jac', max_nfev=max_nfev)
+    
+    p = res.x.reshape(n, 3)
+    return list(p[:, 0]), list(p[:, 1]), list(p[:, 2])
+
+def calc_rms(freqs, gains, t_curve, low_cutoff, high_cutoff):
+    """
+    Calculate the RMS error between FR data and the target curve inside the cutoff range.
+    
+    Args:
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
+    - t_curve (ndarray): NumPy ndarray of the target curve.
+    
+    Returns:
+    - rms (float): RMS error [dB].
+    """
+    
+    cutoff = (freqs >= low_cutoff) & (freqs <= high_cutoff)
+    rms = float(np.sqrt(np.mean((gains[cutoff] - t_curve[cutoff])**2)))
+    
+    return rms
+
 def plot_data_and_curve(freqs, gains0, gains, eq_curve, t_curve, out, output_folder):
+    
+    import matplotlib.pyplot as plt
 
     data = np.column_stack((freqs, gains0))
     eqd_data = np.column_stack((freqs, gains))
@@ -255,42 +395,38 @@ def plot_data_and_curve(freqs, gains0, gains, eq_curve, t_curve, out, output_fol
     # Show legend
     plt.legend()
 
-    # Saving Graphs
-    plt.savefig('flat_target.png')
+    # Saving Graphs (directly into the output folder, so that concurrent runs do not collide)
+    plt.savefig(Path(output_folder).joinpath(out + "flat_target.png"))
 
     # Graph Display
     plt.close()
     
-    os.rename("flat_target.png" ,out + "flat_target.png" )
-    
-    # Move and overwrite files
-    os.replace(out + "flat_target.png", output_folder.joinpath(out + "flat_target.png"))
-    
     
 def write_eq_settings(fs, gs, qs, out_path, model_str):
     
-    current_datetime = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
-    
     with open(out_path, 'w') as file:
-        for i in range(len(fs)):
-            freq = fs[i]
-            gain = gs[i]
-            q    = qs[i]
-            n    = i + 1
-            file.write(f"Filter {n}: ON  PK  Fc  {freq:.2f} Hz  Gain  {gain:.2f} dB  Q  {q:.3f}\n")    
+        file.write(format_eq_settings(fs, gs, qs))
                 
-def eq_make(data):
+def eq_design(data, fr_freqs, fr_gains, target_data=None):
+    """
+    Generate the EQ data (peak filters) in memory, without reading or writing files.
+    
+    Args:
+    - data (dict): Input data (band number, Q limits, cutoffs, target, ...; see eq_make).
+    - fr_freqs (array): Frequencies of the speaker FR data.
+    - fr_gains (array): Gains of the speaker FR data.
+    - target_data (ndarray): NumPy ndarray (frequencies, gains) of the target curve (used if data['target_on']).
+    
+    Returns:
+    - result (dict): Peak filters ('f0s', 'gains', 'q_factors'), the curves for plotting
+                     ('freqs', 'gains0', 'eqd_gains', 'eq_curve', 't_curve') and the residual RMS
+                     inside the cutoff range ('rms': (after greedy placement, final)).
+    """
     
     #INPUT================================================================
 
     band_num = data['band_num'] 
 
-    file_path = data['file_path'] 
-    out_path  = data['out_path'] #eq filter
-    out_path_yml = data['out_path_yml']
-    lr = data['lr']
-    model_str = data['model_str'] 
-
     max_q     = data['max_q'] 
     min_q     = data['min_q'] 
     default_q = data['default_q'] 
@@ -301,42 +437,61 @@ def eq_make(data):
     high_cutoff = data['high_cutoff'] 
 
     target = data['target'] 
-    target_path = data['target_path']
-    
-    out = data['out']
-    output_folder = data['output_folder']
     
     target_on = data['target_on']
     
     dip_alpha = data['dip_alpha']
     
-    target_type = data['target_type']
+    refine = data.get('refine', False)
     
-    #hrtf_path = data['hrtf_path']
-
-    #=======================================================================
+    # Stop adding bands when the residual inside the cutoff range is small enough (0: off)
+    tolerance_rms = float(data.get('tolerance_rms', 0))     # RMS error [dB]
+    tolerance_max = float(data.get('tolerance_max', 0))     # Maximum error [dB]
+    min_improvement = float(data.get('min_improvement', 0)) # RMS improvement of one band [dB]
     
-    # Load data
-    df   = read_fr_data(file_path)
+    q_fit = data.get('q_fit', "curve_fit")
+    if q_fit not in ("curve_fit", "batch"):
+        raise ValueError(f"Unknown q_fit: {q_fit} (\"curve_fit\" or \"batch\")")
     
-    # Remove duplicates
-    df_no_duplicates = remove_duplicates(df)
+    fr_smoothing = float(data.get('fr_smoothing', 0))
     
-    df_curve = df_no_duplicates
+    grid_ppo = float(data.get('grid_ppo') or 0)
     
-    #Standardized at 1000Hz gain
-    gain_tmp = linear_interpolation(df_curve['freq'].to_numpy(), df_curve['gain'].to_numpy(), 1000)
-    df_curve.loc[:, 'gain'] -= gain_tmp
+    dip_smoothing = data.get('dip_smoothing', "moving_average")
+    if dip_smoothing != "moving_average" and not float(dip_smoothing) > 0:
+        raise ValueError(f"dip_smoothing must be \"moving_average\" or N > 0 (1/N octave): {dip_smoothing}")
+    
+    #=======================================================================
     
-    freqs  = df_curve['freq']
-    gains0 = df_curve['gain']
-    gains  = df_curve['gain']
+    # Remove duplicates
+    freqs, gains0 = remove_duplicate_rows(fr_freqs, fr_gains)
+    
+    # Resample onto the log-frequency grid (fixed number of points per run)
+    if grid_ppo > 0:
+        f_range = log_frequency_grid(grid_ppo)
+        if not np.array_equal(freqs, f_range):
+            with stage("resample"):
+                gains0 = resample_log(freqs, gains0, f_range)
+                freqs = f_range
     
-    dip_freqs, dip_gains, dip_qs = find_dips(df_curve, low_cutoff, high_cutoff)
+    # 1/N octave smoothing of the input FR (power)
+    if fr_smoothing > 0:
+        with stage("smoothing"):
+            gains0 = fractional_octave_smoothing(freqs, gains0, fr_smoothing)
     
-    if target_on:
-        df_t = read_fr_data(target_path)
-        interpolator = interp1d(np.log10(df_t['freq']), df_t['gain'], kind='linear', fill_value="extrapolate")
+    #Standardized at 1000Hz gain
+    gain_tmp = linear_interpolation(freqs, gains0, 1000)
+    gains0 = gains0 - gain_tmp
+    
+    with stage("find_dips"):
+        dip_freqs, dip_gains, dip_qs = find_dips(freqs, gains0, low_cutoff, high_cutoff, q_fit, dip_smoothing)
+    
+    if target_on and np.array_equal(target_data[:, 0], freqs):
+        # Target curve on the same grid
+        t_curve = target_data[:, 1] + target
+    elif target_on:
+        from scipy.interpolate import interp1d
+        interpolator = interp1d(np.log10(target_data[:, 0]), target_data[:, 1], kind='linear', fill_value="extrapolate")
         t_curve = interpolator(np.log10(freqs))
         t_curve = t_curve + target
     else:
@@ -348,58 +503,164 @@ def eq_make(data):
     eq_dips = calculate_eq_curve(dip_freqs, dip_gains, dip_qs, freqs)*(1 - dip_alpha)
     t_curve_dips = apply_curve(t_curve, eq_dips)
     
-    df_t_curve = pd.DataFrame({'freq':freqs, 'gain':t_curve_dips})
+    # Data inside the cutoff range, where the peaks and dips are searched
+    cutoff = (freqs >= low_cutoff) & (freqs <= high_cutoff)
+    freqs_cutoff = freqs[cutoff]
+    t_curve_cutoff = t_curve_dips[cutoff]
     
     q_factors = []
     f0s = []
     eq_gains = [] 
+    eq_curve = np.zeros(len(freqs))
+    gains = gains0
     
     print("===========================================================================")
     print("Generate EQ curve")
-    print("Load FR Data:   ", file_path)
-    print("Output EQ Data: ", out_path)
+    print("Load FR Data:   ", data.get('file_path', ""))
+    print("Output EQ Data: ", data.get('out_path', ""))
     print("===========================================================================")
     
+    # Residual inside the cutoff range, updated with every band
+    residual = gains[cutoff] - t_curve_cutoff
+    rms_band = float(np.sqrt(np.mean(residual**2))) if len(residual) else 0.0
+    stop_reason = ""
+    
     for i in range(0,band_num,1):
         
-        print("band num: ", i + 1)
+        if tolerance_rms > 0 and rms_band <= tolerance_rms:
+            stop_reason = f"RMS error {rms_band:.3f} dB <= {tolerance_rms} dB"
+            break
+        if tolerance_max > 0 and np.abs(residual).max() <= tolerance_max:
+            stop_reason = f"max error {np.abs(residual).max():.3f} dB <= {tolerance_max} dB"
+            break
         
-        gains = df_curve['gain']
+        with stage("band"):
         
-        # Filter the data around the peak or dip frequency
-        df_filtered = df_curve[(df_curve['freq'] >= low_cutoff) & (df_curve['freq'] <= high_cutoff)]
+            print("band num: ", i + 1)
         
-        # Find the peak or dip
-        target_freq, target_gain = find_peak_and_dip(df_filtered, df_t_curve)
+            # Find the peak or dip
+            target_freq, target_gain = find_peak_and_dip(freqs_cutoff, gains[cutoff], t_curve_cutoff)
         
-        print(f"Target frequency: {target_freq} Hz")
-        print(f"Target gain: {target_gain} dB")
-        # Estimate the Q factor
-        q_factor = estimate_q_factor(df_curve, target_freq, target_gain, window_oct, max_q, min_q, default_q)
+            print(f"Target frequency: {target_freq} Hz")
+            print(f"Target gain: {target_gain} dB")
+            # Estimate the Q factor
+            # One window per band: fitted one by one also in "batch" mode
+            q_factor = estimate_q_factor(freqs, gains, target_freq, target_gain, window_oct, max_q, min_q, default_q)
         
-        print(f"Estimated Q factor: {q_factor}")
+            print(f"Estimated Q factor: {q_factor}")
         
-        q_factors.append(q_factor)
-        f0s.append(target_freq)
+            q_factors.append(q_factor)
+            f0s.append(target_freq)
         
-        eq_gains.append(-target_gain + df_t_curve.loc[df_t_curve['freq'] == target_freq, 'gain'].values[0])
+            eq_gains.append(-target_gain + t_curve_dips[np.argmax(freqs == target_freq)])
 
-        # make equalizer
-        eq_curve = calculate_eq_curve(f0s, eq_gains, q_factors, freqs)
+            # make equalizer (add only the new band to the curve of the previous bands)
+            eq_curve_prev = eq_curve
+            eq_curve = add_eq_band(eq_curve, f0s[-1], eq_gains[-1], q_factors[-1], freqs)
+        
+            # apply equalizer
+            gains_new = apply_curve(gains0, eq_curve)
+            residual_new = gains_new[cutoff] - t_curve_cutoff
+            rms_new = float(np.sqrt(np.mean(residual_new**2)))
         
-        # apply equalizer
-        eqd_curve = apply_curve(gains0, eq_curve)
+            print("---------------------------------------")
         
-        df_curve = pd.DataFrame({'freq':freqs, "gain":eqd_curve})
+        # The band is dropped if it improves the RMS error too little
+        if min_improvement > 0 and rms_band - rms_new < min_improvement:
+            stop_reason = f"improvement of band {i + 1}: {rms_band - rms_new:.3f} dB < {min_improvement} dB"
+            f0s.pop()
+            eq_gains.pop()
+            q_factors.pop()
+            eq_curve = eq_curve_prev
+            break
         
-        print("---------------------------------------")
+        gains = gains_new
+        residual = residual_new
+        rms_band = rms_new
+    
+    if stop_reason:
+        print(f"Bands: {len(f0s)} / {band_num} ({stop_reason})")
+    
+    rms = calc_rms(freqs, gains, t_curve_dips, low_cutoff, high_cutoff)
+    rms_greedy = rms
+    
+    # Optimize all bands together
+    if refine:
+        with stage("refine"):
+            f0s, eq_gains, q_factors = refine_eq(freqs, gains0, t_curve_dips, f0s, eq_gains, q_factors,
+                                                 low_cutoff, high_cutoff, max_q, min_q)
+        eq_curve = calculate_eq_curve(f0s, eq_gains, q_factors, freqs)
+        gains = apply_curve(gains0, eq_curve)
+        rms = calc_rms(freqs, gains, t_curve_dips, low_cutoff, high_cutoff)
+        print(f"Residual RMS: {rms_greedy} dB -> {rms} dB (refined)")
+    else:
+        print(f"Residual RMS: {rms} dB")
+    
+    result = {'f0s':f0s,
+              'gains':eq_gains,
+              'q_factors':q_factors,
+              'freqs':freqs,
+              'gains0':gains0,
+              'eqd_gains':gains,
+              'eq_curve':eq_curve,
+              't_curve':t_curve_dips,
+              'rms':(rms_greedy, rms),
+    }
+    
+    return result
+
+def eq_make(data):
+    """
+    Generate the EQ data (peak filters) for the frequency response data and write it to files.
+    
+    Args:
+    - data (dict): Input data (file paths, band number, Q limits, cutoffs, target, ...).
+                   'fr_data': (frequencies, gains) arrays used instead of the file_path file (optional).
+    
+    Returns:
+    - f0s (list): Frequencies of peak filters.
+    - eq_gains (list): Gains of peak filters.
+    - q_factors (list): Q factors of peak filters.
+    """
+    
+    #INPUT================================================================
+
+    file_path = data['file_path'] 
+    out_path  = data['out_path'] #eq filter
+    out_path_yml = data['out_path_yml']
+    model_str = data['model_str'] 
+    
+    target_path = data['target_path']
+    
+    out = data['out']
+    output_folder = data['output_folder']
+    
+    target_type = data['target_type']
+
+    #=======================================================================
+    
+    # Load data (or FR data arrays, e.g. from Measure.measure_fr)
+    if data.get('fr_data') is not None:
+        fr_freqs, fr_gains = data['fr_data']
+    else:
+        fr_freqs, fr_gains = read_two_column_data(file_path)
+    
+    target_data = None
+    if data['target_on']:
+        target_data = np.column_stack(read_two_column_data(target_path))
+    
+    result = eq_design(data, fr_freqs, fr_gains, target_data)
+    
+    f0s       = result['f0s']
+    eq_gains  = result['gains']
+    q_factors = result['q_factors']
     
     # write eq settings
     write_eq_settings(f0s, eq_gains, q_factors, out_path, model_str)
     write_eq_settings_yml1(f0s, eq_gains, q_factors, out_path_yml, target_type)
     
-    gains = df_curve['gain']
-    
     # Plot data and fitting curve
-    plot_data_and_curve(freqs, gains0, gains, eq_curve, t_curve_dips ,out, output_folder)
-    
\ No newline at end of file
+    Plot.plot(data.get('plot', "sync"), plot_data_and_curve,
+              result['freqs'], result['gains0'], result['eqd_gains'], result['eq_curve'], result['t_curve'], out, output_folder)
+    
+    return f0s, eq_gains, q_factors
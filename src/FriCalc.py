@@ -2,20 +2,12 @@
 # Calculate the Frequency Response Integral:FRI value and diff from the frequency response curve.
 #-------------------------------------------------------------------------------------
 
-import os
-import shutil
 import numpy as np
-import pandas as pd
-import re
-import subprocess
-import matplotlib.pyplot as plt
-import cmath
-from pathlib import Path
-from scipy.integrate import simpson
-from scipy.interpolate import interp1d
 
-from Math import linear_interpolation, apply_curve, calc_slope_curve, calculate_eq_curve
-from Utils import read_fr_data, read_eq_data, read_eloud_fr_data, read_spkr_fr_data
+from Math import apply_curve, calc_slope_curve, calculate_eq_curve, log_frequency_grid
+from Utils import read_eq_data, read_eloud_fr_data, read_spkr_fr_data
+
+# scipy is imported inside the functions that use it (startup time)
 
 # calcurate fri -----------------------------------------------------------------------
 def calc_fri(curve, f_range):
@@ -30,6 +22,8 @@ def calc_fri(curve, f_range):
     - fri (float): Frequency Response Integral:FRI value.
     """
     
+    from scipy.integrate import simpson
+    
     curve = 0.775*2**(curve/6)
     
     x = np.log10(f_range)
@@ -40,33 +34,51 @@ def calc_fri(curve, f_range):
     
     return fri
     
-# main----------------------------------------------------------------------------------
-def fri_calc(eq_path, spkr_path, eloud_path, slope):
+# fri session ----------------------------------------------------------------------
+def fri_session(spkr_path, eloud_path, slope):
     """
-    Calculate the Frequency Response Integral:FRI value and diff.
+    Load the speaker FR and equal loudness curves once, for the FRI calculation of any number of EQs.
     
     Args:
-    - eq_path:  eq curve file path.
     - spkr_path:  spkr FR curve file path.
     - eloud_path:  Equal Loudness curve file path.
     - slope (float):  slope [dB/oct].
     
     Returns:
-    - fri_org (float): Frequency Response Integral:FRI value of Original Speaker FR curve.
-    - fri_eqd (float): Frequency Response Integral:FRI value of EQd Speaker FR curve.
-    - fri_diff (float): diff
+    - session (dict): FRI session (frequencies, filtered speaker curve, fri_org, memoized results).
     """
     
-    f_range = np.logspace(np.log10(20), np.log10(20000), 1000)
-    
-    fq_eqs, g_eqs, qs   = read_eq_data(eq_path)
     fq_elouds, g_elouds = read_eloud_fr_data(eloud_path)
     fq_spkrs, g_spkrs   = read_spkr_fr_data(spkr_path)
+    
+    return fri_session_from_data(fq_spkrs, g_spkrs, fq_elouds, g_elouds, slope)
 
-    interpolator = interp1d(fq_spkrs, g_spkrs, kind='linear', fill_value="extrapolate")
-    spkr_curve = interpolator(f_range)
+def fri_session_from_data(fq_spkrs, g_spkrs, fq_elouds, g_elouds, slope, grid_ppo=None):
+    """
+    Make a FRI session from speaker FR and equal loudness data already in memory.
     
-    eq_curve = calculate_eq_curve(fq_eqs, g_eqs, qs, f_range)
+    Args:
+    - fq_spkrs (array): Frequencies of the speaker FR (repeated frequencies already collapsed).
+    - g_spkrs (array): Gains of the speaker FR.
+    - fq_elouds (array): Frequencies of the equal loudness curve.
+    - g_elouds (array): Gains of the equal loudness curve.
+    - slope (float):  slope [dB/oct].
+    - grid_ppo (float): Points per octave of the frequency grid (None: 1000 points, see Math.log_frequency_grid).
+    
+    Returns:
+    - session (dict): FRI session (frequencies, filtered speaker curve, fri_org, memoized results).
+    """
+    
+    from scipy.interpolate import interp1d
+    
+    f_range = log_frequency_grid(grid_ppo)
+
+    # Speaker FR already resampled onto the grid (Pipeline, grid_ppo) is used as it is
+    if np.array_equal(fq_spkrs, f_range):
+        spkr_curve = np.asarray(g_spkrs, dtype=float)
+    else:
+        interpolator = interp1d(fq_spkrs, g_spkrs, kind='linear', fill_value="extrapolate")
+        spkr_curve = interpolator(f_range)
     
     interpolator = interp1d(fq_elouds, g_elouds, kind='linear', fill_value="extrapolate")
     eloud_curve = interpolator(f_range)
@@ -77,12 +89,73 @@ def fri_calc(eq_path, spkr_path, eloud_path, slope):
     
     filtered_spkr_curve = apply_curve(filter_curve, spkr_curve)
     
-    eqd_spkr_curve = apply_curve(eq_curve, filtered_spkr_curve)
+    session = {'f_range':f_range,
+               'filtered_spkr_curve':filtered_spkr_curve,
+               'fri_org':calc_fri(filtered_spkr_curve, f_range),
+               'results':{},
+    }
+    
+    return session
 
-    fri_org = calc_fri(filtered_spkr_curve, f_range)
+def fri_session_calc(session, fs, gs, qs):
+    """
+    Calculate the FRI values of one EQ with a FRI session.
+    The filter values are rounded as in the EQ data file (Fc and Gain: 2 decimals, Q: 3 decimals),
+    so the result equals fri_calc of the written file. Results are memoized per EQ parameter set.
+    
+    Args:
+    - session (dict): FRI session made by fri_session.
+    - fs (array): array of frequencies of peak filters.
+    - gs (array): array of gains of peak filters.
+    - qs (array): array of Q factors of peak filters.
+    
+    Returns:
+    - fri_org (float): Frequency Response Integral:FRI value of Original Speaker FR curve.
+    - fri_eqd (float): Frequency Response Integral:FRI value of EQd Speaker FR curve.
+    - fri_diff (float): diff
+    """
+    
+    key = (tuple(float(f"{f:.2f}") for f in fs),
+           tuple(float(f"{g:.2f}") for g in gs),
+           tuple(float(f"{q:.3f}") for q in qs))
+    
+    results = session['results']
+    if key not in results:
+        f_range = session['f_range']
+        
+        eq_curve = calculate_eq_curve(key[0], key[1], key[2], f_range)
+        
+        eqd_spkr_curve = apply_curve(eq_curve, session['filtered_spkr_curve'])
+        
+        fri_org = session['fri_org']
+        
+        fri_eqd = calc_fri(eqd_spkr_curve, f_range)
+        
+        fri_diff = fri_org - fri_eqd
+        
+        results[key] = (fri_org, fri_eqd, fri_diff)
+    
+    return results[key]
+    
+# main----------------------------------------------------------------------------------
+def fri_calc(eq_path, spkr_path, eloud_path, slope):
+    """
+    Calculate the Frequency Response Integral:FRI value and diff.
+    
+    Args:
+    - eq_path:  eq curve file path.
+    - spkr_path:  spkr FR curve file path.
+    - eloud_path:  Equal Loudness curve file path.
+    - slope (float):  slope [dB/oct].
+    
+    Returns:
+    - fri_org (float): Frequency Response Integral:FRI value of Original Speaker FR curve.
+    - fri_eqd (float): Frequency Response Integral:FRI value of EQd Speaker FR curve.
+    - fri_diff (float): diff
+    """
     
-    fri_eqd = calc_fri(eqd_spkr_curve, f_range)
+    session = fri_session(spkr_path, eloud_path, slope)
     
-    fri_diff = fri_org - fri_eqd
+    fq_eqs, g_eqs, qs = read_eq_data(eq_path)
     
-    return fri_org, fri_eqd, fri_diff
\ No newline at end of file
+    return fri_session_calc(session, fq_eqs, g_eqs, qs)
@@ -2,70 +2,184 @@ import sys
 import yaml
 import os
 
+# libyaml (C) loader / dumper if available
+try:
+    from yaml import CSafeLoader as SafeLoader, CDumper as Dumper
+except ImportError:
+    from yaml import SafeLoader, Dumper
+
+# Channels of the Filter steps in the .yml file of one speaker (Utils.write_eq_settings_yml3):
+# 2 / 3: artificial flat target EQ (L / R), 4 / 5: natural flat target EQ (L / R)
+artificial_channels = (2, 3)
+natural_channels = (4, 5)
+
+# Merged config, written in the folder of the first input file (as a relative output path)
+default_out_file = "eqdata.yml"
+
 def add_prefix(d: dict, prefix: str) -> dict:
     return {f"{prefix}_{k}": v for k, v in d.items()}
 
-def update_pipeline(pipeline: list, prefix: str) -> list:
+def update_pipeline(pipeline: list, prefix: str, channel_map: dict = None) -> list:
     new_pipeline = []
     for step in pipeline:
         step_copy = dict(step)
         if "names" in step_copy:
             step_copy["names"] = [f"{prefix}_{name}" for name in step_copy["names"]]
+        if channel_map and step_copy.get("channel") in channel_map:
+            step_copy["channel"] = channel_map[step_copy["channel"]]
         new_pipeline.append(step_copy)
     return new_pipeline
 
-def merge_yml(left_file, right_file, out_file=None):
-    base_dir = os.path.dirname(os.path.abspath(left_file))
-    if out_file is None:
-        out_file = os.path.join(base_dir, "eqdata.yml")
-    else:
-        out_file = os.path.join(base_dir, out_file)
+def load_yml(path: str) -> dict:
+    with open(path, "r") as f:
+        return yaml.load(f, Loader=SafeLoader) or {}
 
-    with open(left_file, "r") as f:
-        left_cfg = yaml.safe_load(f)
-    with open(right_file, "r") as f:
-        right_cfg = yaml.safe_load(f)
+def merge_channels(channels: list, out_file: str) -> str:
+    """
+    Merge the EQ .yml files of any number of speakers into one config.
+    Input channel i (speaker i) is copied to channel n+i (artificial flat target EQ)
+    and 2n+i (natural flat target EQ), n: number of speakers.
+    Each file is read once, and the merged config is written at once.
 
-    devices = left_cfg.get("devices", {})
+    Args:
+    - channels (list): List of (name, yml file) of each input channel, in channel order.
+                       The name is the prefix of the filter names (e.g. "L", "R", "C", "LFE").
+    - out_file (str): Output .yml file.
 
-    filters = {}
-    filters.update(add_prefix(left_cfg.get("filters", {}), "L"))
-    filters.update(add_prefix(right_cfg.get("filters", {}), "R"))
+    Returns:
+    - out_file (str): Output .yml file.
+    """
+
+    n = len(channels)
+    names = [name for name, _ in channels]
+    if len(set(names)) != n:
+        raise ValueError(f"Duplicate channel names: {names}")
 
+    devices = None
+    filters = {}
     pipeline = []
-    pipeline.extend(update_pipeline(left_cfg.get("pipeline", []), "L"))
-    pipeline.extend(update_pipeline(right_cfg.get("pipeline", []), "R"))
+    for i, (name, path) in enumerate(channels):
+        cfg = load_yml(path)
+        if devices is None:
+            devices = cfg.get("devices", {})
 
-    copy_section = [
-        {"type": "Copy", "channel": 0, "dest": [2, 4]},
-        {"type": "Copy", "channel": 1, "dest": [3, 5]}
-    ]
-    pipeline = copy_section + pipeline
+        channel_map = {ch: n + i for ch in artificial_channels}
+        channel_map.update({ch: 2*n + i for ch in natural_channels})
 
-    mix_section = [
-        {"type": "Mix", "channel": 0, "dest": [2, 4]},
-        {"type": "Mix", "channel": 1, "dest": [3, 5]}
-    ]
-    pipeline.extend(mix_section)
+        filters.update(add_prefix(cfg.get("filters", {}), name))
+        pipeline.extend(update_pipeline(cfg.get("pipeline", []), name, channel_map))
+
+    copy_section = [{"type": "Copy", "channel": i, "dest": [n + i, 2*n + i]} for i in range(n)]
+    mix_section = [{"type": "Mix", "channel": i, "dest": [n + i, 2*n + i]} for i in range(n)]
 
     merged = {
         "devices": devices,
         "filters": filters,
-        "pipeline": pipeline,
+        "pipeline": copy_section + pipeline + mix_section,
     }
 
     with open(out_file, "w") as f:
-        yaml.dump(merged, f, sort_keys=False)
+        yaml.dump(merged, f, Dumper=Dumper, sort_keys=False)
+
+    return out_file
+
+def load_channel_map(map_file: str) -> list:
+    """
+    Load a channel map file:
+      channels:
+        - name: L
+          file: L/eq_L.yml
+        - name: R
+          file: R/eq_R.yml
+    Relative file paths are relative to the folder of the channel map file.
+
+    Args:
+    - map_file (str): Channel map .yml file.
+
+    Returns:
+    - channels (list): List of (name, yml file) in channel order.
+    """
+
+    base_dir = os.path.dirname(os.path.abspath(map_file))
+    cfg = load_yml(map_file)
+    entries = cfg.get("channels", []) if isinstance(cfg, dict) else cfg
+
+    channels = []
+    for entry in entries:
+        if not isinstance(entry, dict) or "name" not in entry or "file" not in entry:
+            raise ValueError(f"{map_file}: each channel needs a name and a file: {entry}")
+        channels.append((str(entry["name"]), os.path.join(base_dir, str(entry["file"]))))
+    return channels
+
+def output_path(channels: list, out_file: str = None) -> str:
+    """
+    Path of the merged config: a relative out_file is relative to the folder of the first input file.
+
+    Args:
+    - channels (list): List of (name, yml file) in channel order.
+    - out_file (str): Output .yml file (default: eqdata.yml).
+
+    Returns:
+    - out_file (str): Output .yml file.
+    """
+
+    base_dir = os.path.dirname(os.path.abspath(channels[0][1]))
+    return os.path.join(base_dir, out_file or default_out_file)
+
+def merge_yml(left_file, right_file, out_file=None):
+    channels = [("L", left_file), ("R", right_file)]
+    out_file = merge_channels(channels, output_path(channels, out_file))
 
     print(f"marge complete! → {out_file}")
 
-if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("how to use: py marge.py left.yml right.yml [output.yml]")
-        sys.exit(1)
+def main(argv: list) -> int:
+    try:
+        return merge_args(argv)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print("Error: ", e)
+        return 1
+
+def merge_args(argv: list) -> int:
+    # py marge.py left.yml right.yml [output.yml]
+    if argv and "=" not in argv[0] and argv[0] not in ("--map", "-o"):
+        if len(argv) < 2:
+            return usage()
+        merge_yml(argv[0], argv[1], argv[2] if len(argv) > 2 else None)
+        return 0
 
-    left = sys.argv[1]
-    right = sys.argv[2]
-    out = sys.argv[3] if len(sys.argv) > 3 else None
+    # py marge.py [--map channels.yml] [NAME=file.yml ...] [-o output.yml]
+    channels = []
+    out_file = None
+    args = iter(argv)
+    for arg in args:
+        if arg == "--map":
+            map_file = next(args, None)
+            if map_file is None:
+                return usage()
+            channels.extend(load_channel_map(map_file))
+        elif arg == "-o":
+            out_file = next(args, None)
+            if out_file is None:
+                return usage()
+        elif "=" in arg:
+            name, path = arg.split("=", 1)
+            channels.append((name, path))
+        else:
+            return usage()
+    if not channels:
+        return usage()
 
-    merge_yml(left, right, out)
+    out_file = merge_channels(channels, output_path(channels, out_file))
+    print(f"marge complete! ({len(channels)} channels) → {out_file}")
+    return 0
+
+def usage() -> int:
+    print("how to use: py marge.py left.yml right.yml [output.yml]")
+    print("            py marge.py L=left.yml R=right.yml C=center.yml ... [-o output.yml]")
+    print("            py marge.py --map channels.yml [-o output.yml]")
+    print("The output file (default: eqdata.yml) is written in the folder of the first input file")
+    print("(relative paths), the files of channels.yml are relative to its folder.")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,4 +1,3 @@
-import pandas as pd
 import numpy as np
 
 def linear_interpolation(f_range, gains, target_freq):
@@ -14,22 +13,51 @@ def linear_interpolation(f_range, gains, target_freq):
     - interpolated_gain (float): interpolated gain of target_freq.
     """
     
-    idx = 0
-    while idx < len(f_range) - 1 and f_range[idx + 1] < target_freq:
-        idx += 1
+    interpolated_gain = linear_interpolation_batch(f_range, gains, [target_freq])[0]
+    
+    return interpolated_gain
+
+def linear_interpolation_batch(f_range, gains, target_freqs, log_freq=False):
+    """
+    Interpolate the gains at many target frequencies at once.
+    The segment of each target frequency is located by binary search, so f_range must be sorted.
+    With log_freq=False the result is identical to linear_interpolation for every target frequency
+    (linear extrapolation below f_range, last gain above f_range).
+    
+    Args:
+    - f_range (ndarray):  NumPy ndarray of frequencies (ascending).
+    - gains (array): array of gains.
+    - target_freqs (array): array of target frequencies.
+    - log_freq (bool): interpolate on the log10 frequency axis (as interp1d on np.log10(freq)).
+    
+    Returns:
+    - interpolated_gains (ndarray): NumPy ndarray of interpolated gains of target_freqs.
+    """
+    
+    x = np.asarray(f_range, dtype=float)
+    y = np.asarray(gains, dtype=float)
+    t = np.asarray(target_freqs, dtype=float)
+    if log_freq:
+        x = np.log10(x)
+        t = np.log10(t)
+    
+    # Index of the lower frequency: last index whose next frequency is below the target
+    last = len(x) - 1
+    idx = np.clip(np.searchsorted(x, t, side='left') - 1, 0, last)
+    idx_upper = np.minimum(idx + 1, last)
+    
+    # Get two frequencies and the corresponding GAIN
+    freq_lower, freq_upper = x[idx], x[idx_upper]
+    gain_lower, gain_upper = y[idx], y[idx_upper]
     
     # linear interpolation
-    if idx == len(f_range) - 1:  # For the last element
-        interpolated_gain = gains[idx]
-    else:
-        # Get two frequencies and the corresponding GAIN
-        freq_lower, freq_upper = f_range[idx], f_range[idx + 1]
-        gain_lower, gain_upper = gains[idx], gains[idx + 1]
-        
-        # linear interpolation
-        interpolated_gain = gain_lower + (gain_upper - gain_lower) * ((target_freq - freq_lower) / (freq_upper - freq_lower))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        interpolated_gains = gain_lower + (gain_upper - gain_lower) * ((t - freq_lower) / (freq_upper - freq_lower))
     
-    return interpolated_gain
+    # For the last element
+    interpolated_gains = np.where(idx == last, gain_lower, interpolated_gains)
+    
+    return interpolated_gains
 
 def gaussian_function(x, a, b, c):
     """
@@ -47,6 +75,128 @@ def gaussian_function(x, a, b, c):
     
     return a * np.exp(-(x - b)**2 / (2 * c**2))
 
+def gaussian_jacobian(x, a, b, c):
+    """
+    Partial derivatives of gaussian_function with respect to a, b and c.
+    
+    Args:
+    - x (array): Input data.
+    - a (float): Amplitude.
+    - b (float): Center frequency.
+    - c (float): Standard deviation.
+    
+    Returns:
+    - array: d/da, d/db and d/dc stacked on the last axis.
+    """
+    
+    d = x - b
+    e = np.exp(-d**2 / (2 * c**2))
+    return np.stack((e, a * e * d / c**2, a * e * d**2 / c**3), axis=-1)
+
+# fit gaussians--------------------------------------------------------
+def fit_gaussians(xs, ys, p0s, max_iter=200, ftol=1.49012e-08, xtol=1.49012e-08):
+    """
+    Fit gaussian_function to many data windows at once (batched Levenberg-Marquardt
+    with the analytic Jacobian). The windows may have different lengths.
+    
+    Args:
+    - xs (list): list of arrays of input data of each window.
+    - ys (list): list of arrays of data to fit of each window.
+    - p0s (array): initial guesses (a, b, c) of each window.
+    - max_iter (int): maximum number of iterations.
+    - ftol (float): relative tolerance of the sum of squares.
+    - xtol (float): relative tolerance of the parameters.
+    
+    Returns:
+    - params (ndarray): NumPy ndarray (windows x 3) of fitted (a, b, c).
+    - ok (ndarray): NumPy ndarray of bool, False where the fit failed
+                    (fewer points than parameters, or no convergence).
+    """
+    
+    n = len(xs)
+    params = np.array(p0s, dtype=float).reshape(n, 3)
+    if n == 0:
+        return params, np.zeros(0, dtype=bool)
+    
+    # Pad the windows to one (windows x points) array
+    lengths = np.array([len(x) for x in xs])
+    m = max(lengths.max(), 1)
+    x = np.zeros((n, m))
+    y = np.zeros((n, m))
+    w = np.arange(m) < lengths[:, None]
+    for i in range(n):
+        x[i, :lengths[i]] = xs[i]
+        y[i, :lengths[i]] = ys[i]
+    
+    def residual(p, x, y, w):
+        with np.errstate(all='ignore'):
+            r = (y - gaussian_function(x, p[:, 0:1], p[:, 1:2], p[:, 2:3])) * w
+            cost = np.sum(r**2, axis=1)
+        return r, np.where(np.isfinite(cost), cost, np.inf)
+    
+    active = (lengths >= 3) & np.all(np.isfinite(params), axis=1) & (params[:, 2] != 0)
+    converged = np.zeros(n, dtype=bool)
+    
+    # Only the windows that are still iterating are computed (idx: their rows)
+    idx = np.flatnonzero(active)
+    x, y, w = x[idx], y[idx], w[idx]
+    p = params[idx]
+    r, cost = residual(p, x, y, w)
+    
+    with np.errstate(all='ignore'):
+        jac = gaussian_jacobian(x, p[:, 0:1], p[:, 1:2], p[:, 2:3]) * w[:, :, None]
+    jac = np.where(np.isfinite(jac), jac, 0.0)
+    
+    # Initial damping relative to the largest curvature (Nielsen)
+    lam = 1e-3 * np.einsum('nmi,nmi->ni', jac, jac).max(axis=1)
+    lam = np.where(lam > 0, lam, 1e-3)
+    nu = np.full(len(idx), 2.0)
+    eye = np.eye(3)
+    
+    for _ in range(max_iter):
+        if len(idx) == 0:
+            break
+        
+        with np.errstate(all='ignore'):
+            jac = gaussian_jacobian(x, p[:, 0:1], p[:, 1:2], p[:, 2:3]) * w[:, :, None]
+        jac = np.where(np.isfinite(jac), jac, 0.0)
+        jtj = np.einsum('nmi,nmj->nij', jac, jac)
+        jtr = np.einsum('nmi,nm->ni', jac, r)
+        
+        # Levenberg-Marquardt step: (J^T J + lam*I) delta = J^T r
+        delta = np.linalg.solve(jtj + lam[:, None, None] * eye, jtr[:, :, None])[:, :, 0]
+        
+        trial = p + delta
+        r_trial, cost_trial = residual(trial, x, y, w)
+        
+        # Gain ratio of the actual and the predicted decrease of the sum of squares
+        predicted = np.einsum('ni,ni->n', delta, lam[:, None] * delta + jtr)
+        with np.errstate(all='ignore'):
+            rho = (cost - cost_trial) / predicted
+        
+        better = (cost_trial < cost) & (rho > 0)
+        small_f = better & (cost - cost_trial <= ftol * cost)
+        small_x = np.all(np.abs(delta) <= xtol * (np.abs(p) + xtol), axis=1)
+        
+        p = np.where(better[:, None], trial, p)
+        r = np.where(better[:, None], r_trial, r)
+        cost = np.where(better, cost_trial, cost)
+        rho = np.where(better, rho, 0.0)
+        lam = np.where(better, lam * np.maximum(1/3, 1 - (2*rho - 1)**3), lam * nu)
+        nu = np.where(better, 2.0, nu * 2)
+        
+        # A perfect fit, or no step improves the fit any more
+        done = small_f | small_x | (cost == 0) | (lam > 1e30)
+        if done.any():
+            params[idx[done]] = p[done]
+            converged[idx[done]] = True
+            keep = ~done
+            idx, x, y, w, p, r, cost, lam, nu = idx[keep], x[keep], y[keep], w[keep], p[keep], r[keep], cost[keep], lam[keep], nu[keep]
+    
+    ok = converged & active & np.all(np.isfinite(params), axis=1)
+    
+    return params, ok
+
 # apply curve--------------------------------------------------------
 def apply_curve(curve_a, curve_b):
     """
@@ -83,6 +233,47 @@ def calc_slope_curve(f_range, slope):
     
     return slope_curve
 
+# peak filter power ratio--------------------------------------------------------
+def _peak_filter_power_ratio(f0s, gains, q_factors, f_range):
+    """
+    Calculate |H|^2 of all peak filters at once as one (filters x frequencies) array.
+    H = (w0^2 + g*w0/q*jw + (jw)^2) / (w0^2 + w0/(g*q)*jw + (jw)^2), w0 = 2*pi*f0/f, w = 2*pi
+    
+    Args:
+    - f0s (array): array of frequencies of peak filters.
+    - gains (array): array of gains of peak filters.
+    - q_factors (array): array of Q factors of peak filters.
+    - f_range (ndarray):  NumPy ndarray of frequencies.
+    
+    Returns:
+    - ratio (ndarray): NumPy ndarray (filters x frequencies) of |H|^2.
+    """
+    
+    f0s = np.asarray(f0s, dtype=float).reshape(-1, 1)
+    g   = 2**(np.asarray(gains, dtype=float).reshape(-1, 1)/6)
+    q   = np.asarray(q_factors, dtype=float).reshape(-1, 1)
+    w   = 2 * np.pi * 1
+    
+    w0 = f0s * (2 * np.pi / np.asarray(f_range, dtype=float))
+    
+    # Real part of numerator and denominator: (w0^2 - w^2)^2
+    re2 = w0**2
+    re2 -= w**2
+    re2 *= re2
+    
+    # Imaginary parts: (g*w0*w/q)^2 and (w0*w/(g*q))^2
+    w0 *= w / q
+    w0 *= w0
+    g2 = g**2
+    
+    ratio = g2*w0
+    ratio += re2
+    w0 /= g2
+    w0 += re2
+    ratio /= w0
+    
+    return ratio
+
 # calculate peak filter--------------------------------------------------------
 def calculate_peak_filter(f0, gain, q_factor, f_range):
     """
@@ -98,24 +289,30 @@ def calculate_peak_filter(f0, gain, q_factor, f_range):
     - output (ndarray): NumPy ndarray of EQ curve(peak filter).
     """
     
-    w0 = 2 * np.pi * f0 / f_range
-    w  = 2 * np.pi * 1
-    jw = np.zeros(len(f_range)) + 1j * w
-    g  = 2**(gain/6)
-    
-    b0 = w0**2 + 1j * np.zeros(len(f_range))
-    b1 = g*(w0/q_factor) + 1j * np.zeros(len(f_range))
-    b2 = np.full(len(f_range), 1) + 1j * np.zeros(len(f_range))
-    a0 = w0**2 + 1j * np.zeros(len(f_range))
-    a1 = 1/g*w0/q_factor + 1j * np.zeros(len(f_range))
-    a2 = np.full(len(f_range), 1) + 1j * np.zeros(len(f_range))
-        
-    H = (b0 + b1 * jw + b2 * jw**2) / (a0 + a1 * jw + a2 * jw**2)
-    
-    output = np.abs(H)
+    output = np.sqrt(_peak_filter_power_ratio(f0, gain, q_factor, f_range)[0])
 
     return output
 
+def calculate_peak_filter_gains(f0s, gains, q_factors, f_range):
+    """
+    Calculate the gain curves of all peak filters at once (broadcast over filters and frequencies).
+    
+    Args:
+    - f0s (array): array of frequencies of peak filters.
+    - gains (array): array of gains of peak filters.
+    - q_factors (array): array of Q factors of peak filters.
+    - f_range (ndarray):  NumPy ndarray of frequencies.
+    
+    Returns:
+    - gain_curves (ndarray): NumPy ndarray (filters x frequencies) of gain curves [dB].
+    """
+    
+    # Gi = 3*log2(Pi/0.775) = 3*log2(|H|) = 1.5*log2(|H|^2)
+    gain_curves = np.log2(_peak_filter_power_ratio(f0s, gains, q_factors, f_range))
+    gain_curves *= 1.5
+    
+    return gain_curves
+
 def calculate_eq_curve(f0s, gains, q_factors, f_range):
     """
     Calculate the EQ curve from peak filters.
@@ -130,10 +327,156 @@ def calculate_eq_curve(f0s, gains, q_factors, f_range):
     - eq_curve (ndarray): NumPy ndarray of EQ-curve.
     """
     
-    eq_curve = np.full(len(f_range), 0.0)
-    Ptotal = np.full(len(f_range), 0.775)
-    for freq, gain, q in zip(f0s, gains, q_factors):
-        Pi = Ptotal*calculate_peak_filter(freq, gain, q, f_range)
-        Gi = 3*np.log2(Pi/0.775)
-        eq_curve += Gi
-    return eq_curve
\ No newline at end of file
+    eq_curve = calculate_peak_filter_gains(f0s, gains, q_factors, f_range).sum(axis=0)
+    return eq_curve
+
+def add_eq_band(eq_curve, f0, gain, q_factor, f_range):
+    """
+    Add the contribution of one new peak filter to an existing EQ curve.
+    
+    Args:
+    - eq_curve (ndarray): NumPy ndarray of EQ-curve of the previous filters.
+    - f0 (float): peak frequency.
+    - gain (float): peak gain.
+    - q_factor (float): peak Q factors.
+    - f_range (ndarray):  NumPy ndarray of frequencies.
+    
+    Returns:
+    - eq_curve (ndarray): NumPy ndarray of EQ-curve including the new filter.
+    """
+    
+    eq_curve = eq_curve + calculate_peak_filter_gains(f0, gain, q_factor, f_range)[0]
+    return eq_curve
+
+def calculate_eq_jacobian(f0s, gains, q_factors, f_range):
+    """
+    Calculate the partial derivatives of the gain curves of all peak filters
+    with respect to their frequency, gain and Q factor (analytic, same model as calculate_peak_filter_gains).
+    
+    Args:
+    - f0s (array): array of frequencies of peak filters.
+    - gains (array): array of gains of peak filters.
+    - q_factors (array): array of Q factors of peak filters.
+    - f_range (ndarray):  NumPy ndarray of frequencies.
+    
+    Returns:
+    - jacobian (ndarray): NumPy ndarray (filters x frequencies x 3) of dG/df0, dG/dgain and dG/dq [dB].
+    """
+    
+    f0s = np.asarray(f0s, dtype=float).reshape(-1, 1)
+    g2  = 2**(np.asarray(gains, dtype=float).reshape(-1, 1)/3)
+    q   = np.asarray(q_factors, dtype=float).reshape(-1, 1)
+    w   = 2 * np.pi * 1
+    
+    # |H|^2 = N/D, N = A + g^2*B, D = A + B/g^2, A = (w0^2 - w^2)^2, B = w0^2*w^2/q^2
+    u = (f0s * (2 * np.pi / np.asarray(f_range, dtype=float)))**2
+    a = (u - w**2)**2
+    b = u * w**2 / q**2
+    num = a + g2*b
+    den = a + b/g2
+    
+    k = 1.5 / np.log(2)
+    
+    # d/du: dA/du = 2*(u - w^2), dB/du = B/u; du/df0 = 2*u/f0
+    da = 2*(u - w**2)
+    d_f0 = k * ((da + g2*b/u)/num - (da + b/(g2*u))/den) * 2*u/f0s
+    
+    # d(g^2)/dgain = g^2*ln(2)/3
+    d_gain = 0.5 * (g2*b/num + b/(g2*den))
+    
+    # dB/dq = -2*B/q
+    d_q = k * (-2*b/q) * (g2/num - 1/(g2*den))
+    
+    jacobian = np.stack((d_f0, d_gain, d_q), axis=-1)
+    
+    return jacobian
+
+def fractional_octave_smoothing(freqs, gains, fraction, power=True):
+    """
+    Smooth a frequency response with a 1/fraction octave wide rectangular window on the log-frequency axis.
+    The window averages are differences of the cumulative (trapezoidal) integral over log2(frequency),
+    so the cost is O(n) for any window width and any spacing of the frequencies.
+    The window is truncated at both ends of the frequency range.
+    
+    Args:
+    - freqs (ndarray): NumPy ndarray of frequencies (ascending, > 0, no duplicates).
+    - gains (ndarray): NumPy ndarray of gains [dB].
+    - fraction (float): Window width = 1/fraction octave (e.g. 3, 6, 12, 24, 48).
+    - power (bool): Average the power (10^(dB/10)) instead of the dB values.
+    
+    Returns:
+    - smoothed (ndarray): NumPy ndarray of smoothed gains [dB].
+    """
+    
+    x = np.log2(np.asarray(freqs, dtype=float))
+    gains = np.asarray(gains, dtype=float)
+    if len(x) < 2:
+        return gains.copy()
+    y = 10**(gains/10) if power else gains
+    
+    # Cumulative integral of y over log2(f)
+    integral = np.concatenate(([0.0], np.cumsum(0.5*(y[1:] + y[:-1])*np.diff(x))))
+    
+    half = 0.5/fraction
+    lower = np.maximum(x - half, x[0])
+    upper = np.minimum(x + half, x[-1])
+    width = upper - lower
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        smoothed = (_integral_at(x, y, integral, upper) - _integral_at(x, y, integral, lower))/width
+    smoothed = np.where(width > 0, smoothed, y)
+    
+    if power:
+        smoothed = 10*np.log10(np.maximum(smoothed, 1e-30))
+    
+    return smoothed
+
+def _integral_at(x, y, integral, t):
+    # Cumulative integral of the linearly interpolated y at t (exact inside the segment of t)
+    k = np.clip(np.searchsorted(x, t, side='right') - 1, 0, len(x) - 2)
+    return integral[k] + 0.5*(t - x[k])*(y[k] + np.interp(t, x, y))
+
+def log_frequency_grid(points_per_octave=None, f_min=20.0, f_max=20000.0):
+    """
+    Log-spaced frequency grid shared by the target curve, the EQ design and the FRI.
+    
+    Args:
+    - points_per_octave (float): Points per octave (None or 0: 1000 points from 20 Hz to 20 kHz, about 100 per octave).
+    - f_min (float): Lowest frequency [Hz].
+    - f_max (float): Highest frequency [Hz].
+    
+    Returns:
+    - f_range (ndarray): NumPy ndarray of frequencies.
+    """
+    
+    if not points_per_octave:
+        return np.logspace(np.log10(f_min), np.log10(f_max), 1000)
+    
+    n_points = int(np.log2(f_max/f_min)*points_per_octave) + 1
+    return np.logspace(np.log10(f_min), np.log10(f_max), n_points)
+
+def resample_log(freqs, gains, f_range):
+    """
+    Resample a frequency response onto other frequencies, interpolating on the log-frequency axis.
+    Repeated frequencies are reduced to their first point (linear extrapolation below the data,
+    last gain above the data, as linear_interpolation_batch).
+    
+    Args:
+    - freqs (array): array of frequencies.
+    - gains (array): array of gains.
+    - f_range (ndarray):  NumPy ndarray of the new frequencies.
+    
+    Returns:
+    - resampled (ndarray): NumPy ndarray of gains at f_range.
+    """
+    
+    freqs = np.asarray(freqs, dtype=float)
+    gains = np.asarray(gains, dtype=float)
+    
+    order = np.argsort(freqs, kind='stable')
+    freqs, gains = freqs[order], gains[order]
+    keep = np.concatenate(([True], freqs[1:] != freqs[:-1]))
+    
+    resampled = linear_interpolation_batch(freqs[keep], gains[keep], f_range, log_freq=True)
+    
+    return resampled
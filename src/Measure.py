@@ -0,0 +1,275 @@
+#-------------------------------------------------------------------------------------
+# Speaker FR data from WAV recordings (log sweep or impulse response), instead of an
+# exported text file:
+#   recording --(FFT deconvolution by the played sweep)--> impulse response
+#   --(window around the peak)--> FFT --(1/N octave smoothing)--> log-frequency grid
+# The WAV files are memory-mapped (Wav.py) and only the used channels are read, so
+# long multi-channel captures do not have to fit into the memory as a whole.
+#
+#   python ./Measure.py --generate-sweep sweep.wav [--f1 20 --f2 20000 --duration 10 --rate 48000]
+#   python ./Measure.py recording.wav --sweep sweep.wav [--channel 0 1] [-o FR_data.txt]
+#   python ./Measure.py impulse_response.wav [-o FR_data.txt]
+#-------------------------------------------------------------------------------------
+
+import sys
+import argparse
+import numpy as np
+from pathlib import Path
+
+from Math import fractional_octave_smoothing, log_frequency_grid
+from Utils import write_two_column_data
+import Wav
+
+# scipy is imported inside the functions that use it (startup time)
+
+# Default analysis settings
+default_window_ms = 500.0    # Window after the peak of the impulse response [ms]
+default_pre_ms = 2.0         # Window before the peak [ms]
+default_smoothing = 24       # 1/N octave smoothing (0: none)
+default_f_min = 20.0
+default_f_max = 20000.0
+default_points_per_octave = 48
+
+# Regularization of the deconvolution (relative to the peak power of the sweep spectrum)
+default_regularization = 1e-6
+
+# Frames read at once from the WAV files
+block_frames = 1 << 20
+
+
+def exp_sweep(f1, f2, duration, fs, fade_ms=10.0):
+    """
+    Generate an exponential (log) sine sweep.
+
+    Args:
+    - f1 (float): Start frequency [Hz].
+    - f2 (float): End frequency [Hz].
+    - duration (float): Length [sec].
+    - fs (int): Sample rate [Hz].
+    - fade_ms (float): Length of the fade in / fade out [ms].
+
+    Returns:
+    - sweep (ndarray): NumPy ndarray of samples (full scale = 1.0).
+    """
+
+    t = np.arange(int(round(duration*fs)))/fs
+    rate = np.log(f2/f1)
+    sweep = np.sin(2*np.pi*f1*duration/rate*(np.exp(t*rate/duration) - 1))
+
+    fade = min(int(fade_ms*fs/1000), len(sweep)//2)
+    if fade > 0:
+        ramp = 0.5 - 0.5*np.cos(np.pi*np.arange(fade)/fade)
+        sweep[:fade] *= ramp
+        sweep[-fade:] *= ramp[::-1]
+
+    return sweep
+
+def read_channels(wav, channels):
+    """
+    Read some channels of a WAV file opened with Wav.open_wav, block by block.
+
+    Args:
+    - wav (dict): WAV file opened with Wav.open_wav.
+    - channels (list): Channel numbers.
+
+    Returns:
+    - samples (ndarray): NumPy ndarray (frames x channels) of float64 samples.
+    """
+
+    for ch in channels:
+        if not 0 <= ch < wav['channels']:
+            raise ValueError(f"Channel {ch} is not in the WAV file ({wav['channels']} channels)")
+
+    samples = np.empty((wav['frames'], len(channels)))
+    for start in range(0, wav['frames'], block_frames):
+        samples[start:start + block_frames] = Wav.read_block(wav, start, start + block_frames)[:, channels]
+
+    return samples
+
+def deconvolve(recording, sweep, regularization=default_regularization):
+    """
+    Calculate the impulse responses of recorded sweeps by FFT deconvolution
+    (regularized division by the spectrum of the played sweep).
+
+    Args:
+    - recording (ndarray): NumPy ndarray (frames x channels) of the recorded signals.
+    - sweep (ndarray): NumPy ndarray of the played sweep.
+    - regularization (float): Regularization relative to the peak power of the sweep spectrum.
+
+    Returns:
+    - ir (ndarray): NumPy ndarray (FFT length x channels) of the impulse responses (circular).
+    """
+
+    from scipy import fft
+
+    n_fft = fft.next_fast_len(recording.shape[0] + len(sweep) - 1, real=True)
+
+    s = fft.rfft(sweep, n_fft)
+    power = np.abs(s)**2
+    inverse = np.conj(s)/(power + regularization*power.max())
+
+    # All channels in one FFT
+    r = fft.rfft(recording, n_fft, axis=0, workers=-1)
+    ir = fft.irfft(r*inverse[:, None], n_fft, axis=0, workers=-1)
+
+    return ir
+
+def window_ir(ir, fs, window_ms=default_window_ms, pre_ms=default_pre_ms):
+    """
+    Cut each impulse response around its peak: half Hann fade in before the peak,
+    flat, and half Hann fade out over the last quarter of the window after the peak.
+    An impulse response shorter than the window is zero padded after its end (not repeated).
+
+    Args:
+    - ir (ndarray): NumPy ndarray (frames x channels) of impulse responses.
+    - fs (int): Sample rate [Hz].
+    - window_ms (float): Window after the peak [ms].
+    - pre_ms (float): Window before the peak [ms].
+
+    Returns:
+    - windowed (ndarray): NumPy ndarray (window frames x channels) of windowed impulse responses.
+    """
+
+    pre = int(pre_ms*fs/1000)
+    post = max(int(window_ms*fs/1000), 1)
+    fade_out = max(post//4, 1)
+
+    window = np.ones(pre + post)
+    if pre > 0:
+        window[:pre] = 0.5 - 0.5*np.cos(np.pi*np.arange(pre)/pre)
+    window[-fade_out:] = 0.5 + 0.5*np.cos(np.pi*np.arange(1, fade_out + 1)/fade_out)
+
+    n = ir.shape[0]
+    windowed = np.zeros((pre + post, ir.shape[1]))
+    for ch, peak in enumerate(np.argmax(np.abs(ir), axis=0)):
+        # Before the peak circular: the part before a peak at the start is at the end (non-causal part of a deconvolution)
+        windowed[:pre, ch] = np.take(ir[:, ch], np.arange(peak - pre, peak), mode='wrap')
+        # After the peak up to the end, or up to the samples already used before the peak
+        stop = max(min(peak + post, n - max(pre - peak, 0)), peak)
+        windowed[pre:pre + stop - peak, ch] = ir[peak:stop, ch]
+
+    return windowed*window[:, None]
+
+def ir_to_fr(ir, fs, n_fft=None):
+    """
+    Calculate the frequency responses of impulse responses by FFT.
+
+    Args:
+    - ir (ndarray): NumPy ndarray (frames x channels) of impulse responses.
+    - fs (int): Sample rate [Hz].
+    - n_fft (int): FFT length (default: length of the impulse responses).
+
+    Returns:
+    - freqs (ndarray): NumPy ndarray of frequencies (without 0 Hz).
+    - gains (ndarray): NumPy ndarray (frequencies x channels) of gains [dB].
+    """
+
+    from scipy import fft
+
+    n_fft = n_fft or ir.shape[0]
+    spectrum = fft.rfft(ir, n_fft, axis=0, workers=-1)[1:]
+    freqs = fft.rfftfreq(n_fft, 1/fs)[1:]
+    gains = 20*np.log10(np.maximum(np.abs(spectrum), 1e-15))
+
+    return freqs, gains
+
+def measure_fr(wav_path, channels=(0,), sweep_path=None, window_ms=default_window_ms, pre_ms=default_pre_ms,
+               smoothing=default_smoothing, f_min=default_f_min, f_max=default_f_max,
+               points_per_octave=default_points_per_octave):
+    """
+    Calculate the speaker FR data from a WAV recording of a sweep (sweep_path: the played sweep)
+    or from a WAV file of impulse responses (sweep_path=None).
+
+    Args:
+    - wav_path (str): Recording or impulse response WAV file.
+    - channels (list): Channels of the WAV file.
+    - sweep_path (str): WAV file of the played sweep (first channel), or None.
+    - window_ms (float): Window after the peak of the impulse response [ms].
+    - pre_ms (float): Window before the peak [ms].
+    - smoothing (float): 1/N octave smoothing of the power (0: none).
+    - f_min (float): Lowest frequency of the output [Hz].
+    - f_max (float): Highest frequency of the output [Hz] (limited to 0.45 x sample rate).
+    - points_per_octave (int): Points per octave of the output (log-spaced).
+
+    Returns:
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray (frequencies x channels) of gains [dB].
+    """
+
+    channels = list(channels)
+    wav = Wav.open_wav(wav_path)
+    fs = wav['fs']
+    samples = read_channels(wav, channels)
+
+    if sweep_path:
+        sweep_wav = Wav.open_wav(sweep_path)
+        if sweep_wav['fs'] != fs:
+            raise ValueError(f"Sample rates differ: {wav_path} {fs} Hz, {sweep_path} {sweep_wav['fs']} Hz")
+        ir = deconvolve(samples, read_channels(sweep_wav, [0])[:, 0])
+    else:
+        ir = samples
+
+    freqs_lin, gains_lin = ir_to_fr(window_ir(ir, fs, window_ms, pre_ms), fs)
+
+    # Log-frequency grid (FR data of about the size of the exported text files)
+    f_max = min(f_max, 0.45*fs)
+    freqs = log_frequency_grid(points_per_octave, f_min, f_max)
+
+    gains = np.empty((len(freqs), len(channels)))
+    for ch in range(len(channels)):
+        g = gains_lin[:, ch]
+        if smoothing:
+            g = fractional_octave_smoothing(freqs_lin, g, smoothing)
+        gains[:, ch] = np.interp(np.log2(freqs), np.log2(freqs_lin), g)
+
+    return freqs, gains
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Speaker FR data from a sweep recording or an impulse response (WAV)")
+    parser.add_argument("input", nargs="?", help="recording (with --sweep) or impulse response WAV file")
+    parser.add_argument("--sweep", help="WAV file of the played sweep (the input is a recording of it)")
+    parser.add_argument("--channel", type=int, nargs="+", default=[0], help="channels of the input (default: 0)")
+    parser.add_argument("--window", type=float, default=default_window_ms,
+                        help=f"window after the peak of the impulse response [ms] (default: {default_window_ms})")
+    parser.add_argument("--pre", type=float, default=default_pre_ms,
+                        help=f"window before the peak [ms] (default: {default_pre_ms})")
+    parser.add_argument("--smoothing", type=float, default=default_smoothing,
+                        help=f"1/N octave smoothing, 0: none (default: {default_smoothing})")
+    parser.add_argument("--ppo", type=int, default=default_points_per_octave,
+                        help=f"points per octave of the output (default: {default_points_per_octave})")
+    parser.add_argument("-o", "--output", default="FR_data.txt",
+                        help="output FR data file; FR_data_<channel>.txt for more channels (default: FR_data.txt)")
+    parser.add_argument("--generate-sweep", metavar="WAV", help="write a log sweep WAV file to play and exit")
+    parser.add_argument("--f1", type=float, default=default_f_min, help="start frequency of the sweep [Hz]")
+    parser.add_argument("--f2", type=float, default=default_f_max, help="end frequency of the sweep [Hz]")
+    parser.add_argument("--duration", type=float, default=10.0, help="length of the sweep [sec]")
+    parser.add_argument("--rate", type=int, default=48000, help="sample rate of the sweep [Hz]")
+    args = parser.parse_args(argv)
+
+    if args.generate_sweep:
+        writer = Wav.open_writer(args.generate_sweep, args.rate, 1)
+        try:
+            # -6 dBFS, 1 sec of silence after the sweep for the decay of the room
+            Wav.write_block(writer, 0.5*exp_sweep(args.f1, args.f2, args.duration, args.rate)[:, None])
+            Wav.write_block(writer, np.zeros((args.rate, 1)))
+        finally:
+            Wav.close_writer(writer)
+        print("Sweep: ", args.generate_sweep)
+        return 0
+
+    if not args.input:
+        parser.error("input WAV file is needed")
+
+    freqs, gains = measure_fr(args.input, args.channel, args.sweep, args.window, args.pre,
+                              args.smoothing, points_per_octave=args.ppo)
+
+    output = Path(args.output)
+    for i, ch in enumerate(args.channel):
+        path = output if len(args.channel) == 1 else output.with_name(f"{output.stem}_{ch}{output.suffix}")
+        write_two_column_data(path, freqs, gains[:, i])
+        print("FR data: ", path)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+#-------------------------------------------------------------------------------------
+# Multi-channel design: EQ data of all channels of a system (L/R, surround, ...) in one
+# run, written as one merged CamillaDSP config (as Marge.py).
+# The target curve and the equal loudness curve are calculated / read once and put
+# into shared memory; the worker processes (one channel each) use them without copies.
+#
+# System file (.yml):
+#   output_folder: ../output/system   # each channel writes to <output_folder>/<name>
+#   merged_file: eqdata.yml           # merged config in <output_folder> (default: eqdata.yml)
+#   defaults:                         # optional, overrides config.yaml for every channel
+#     band_num: 20
+#   channels:                         # in the order of the input channels
+#     - name: L
+#       data_file: ../input_data/L.txt
+#     - name: R
+#       data_file: ../input_data/R.txt
+#     - name: C
+#       data_file: ../input_data/C.txt
+#
+#   python ./MultiChannel.py system.yml [-c config.yaml] [-j number_of_processes]
+#-------------------------------------------------------------------------------------
+
+import os
+import sys
+import time
+import argparse
+import contextlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+import Pipeline
+import TargetCalc
+import Plot
+import Marge
+from Batch import manifest_jobs
+from Utils import read_eloud_fr_data
+
+Plot.use_file_backend()
+
+# Settings of the target curve, the same for all channels
+shared_keys = ['eloud_file', 'hrtf_file', 'slope', 'grid_ppo']
+
+default_merged_file = "eqdata.yml"
+
+# Shared arrays of a worker process (set by _init_worker)
+_worker = {}
+
+
+def load_system(system_path, config_path=None):
+    """
+    Load the channels of a system file.
+
+    Args:
+    - system_path (str): Path to the system .yml file.
+    - config_path (str): Path to the base config.yaml (optional).
+
+    Returns:
+    - channels (list): List of (name, config) tuples with absolute paths, in channel order.
+    - merged_path (Path): Path of the merged config.
+    """
+
+    system_path = Path(system_path).resolve()
+    with open(system_path, "r", encoding="utf-8") as f:
+        system = yaml.safe_load(f) or {}
+    if not system.get('channels'):
+        raise ValueError(f"No channels found in {system_path}")
+
+    for entry in system['channels']:
+        if not entry.get('name'):
+            raise ValueError(f"Channel without name in {system_path}")
+        overridden = [key for key in shared_keys if key in entry]
+        if overridden:
+            raise ValueError(f"Channel {entry['name']}: {', '.join(overridden)} must be the same for all channels (use defaults)")
+
+    manifest = {'jobs':system['channels'],
+                'defaults':system.get('defaults'),
+                'output_folder':system.get('output_folder'),
+    }
+    channels = manifest_jobs(manifest, system_path, config_path)
+
+    for name, config in channels:
+        # The .yml file of each channel is named after the channel
+        config['eq_file_yml'] = f"eq_{name}.yml"
+        if name in ("L", "R"):
+            config['lr'] = name
+
+    out_root = Path(channels[0][1]['output_folder']).parent
+    merged_path = out_root.joinpath(str(system.get('merged_file') or default_merged_file))
+
+    return channels, merged_path
+
+def share_arrays(arrays):
+    """
+    Copy NumPy arrays into shared memory blocks.
+
+    Args:
+    - arrays (dict): {key: ndarray}.
+
+    Returns:
+    - blocks (list): SharedMemory blocks (close and unlink them when the workers are finished).
+    - specs (dict): {key: (block name, shape, dtype)} for attach_arrays.
+    """
+
+    blocks = []
+    specs = {}
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[key] = (block.name, array.shape, array.dtype.str)
+
+    return blocks, specs
+
+def attach_arrays(specs):
+    """
+    Attach to shared arrays made by share_arrays (read only views, no copies).
+
+    Args:
+    - specs (dict): {key: (block name, shape, dtype)}.
+
+    Returns:
+    - arrays (dict): {key: ndarray}.
+    - blocks (list): SharedMemory blocks (keep them while the arrays are used).
+    """
+
+    arrays = {}
+    blocks = []
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.flags.writeable = False
+        arrays[key] = array
+        blocks.append(block)
+
+    return arrays, blocks
+
+def _init_worker(specs):
+    arrays, blocks = attach_arrays(specs)
+    _worker.update({'arrays':arrays, 'blocks':blocks})
+
+def design_channel(name, config):
+    """
+    Design and write the EQ data of one channel with the shared target and equal loudness curves.
+    The console output of the channel is saved to log.txt in its output folder.
+
+    Args:
+    - name (str): Channel name.
+    - config (dict): Config dictionary of the channel.
+
+    Returns:
+    - name (str): Channel name.
+    - yml_path (str): .yml file of the channel (None if the channel failed).
+    - message (str): Traceback text if the channel failed.
+    - elapsed (float): Elapsed time [sec].
+    """
+
+    start = time.perf_counter()
+    arrays = _worker['arrays']
+
+    try:
+        # The channels run in parallel already: each channel designs its EQs one after another
+        params = Pipeline.parse_config(dict(config, parallel_designs=False))
+        output_folder = params['output_folder']
+        output_folder.mkdir(parents=True, exist_ok=True)
+        with open(output_folder.joinpath("log.txt"), "w", encoding="utf-8") as log:
+            with contextlib.redirect_stdout(log):
+                inputs = {'spkr':Pipeline.read_spkr_data(params),
+                          'eloud':(arrays['eloud_freqs'], arrays['eloud_gains']),
+                          'hrtf':None,
+                }
+                result = Pipeline.design(params, inputs, arrays['target'])
+                Pipeline.print_fri(result)
+                Pipeline.write_outputs(params, result)
+                if Plot.wait_plots():
+                    raise RuntimeError("Saving the plots failed")
+    except Exception:
+        return name, None, traceback.format_exc(), time.perf_counter() - start
+
+    return name, str(output_folder.joinpath(params['eqyml_file'])), "", time.perf_counter() - start
+
+def _report(outcomes, total, results):
+    # Results in the channel order, as they finish
+    for i, (name, yml_path, message, elapsed) in enumerate(outcomes):
+        results[name] = yml_path
+        status = "done  " if yml_path else "FAILED"
+        print(f"[{i + 1}/{total}] {status} {name} ({elapsed:.1f} s)", flush=True)
+        if not yml_path:
+            print(message, file=sys.stderr, flush=True)
+
+def run_system(channels, merged_path, workers=None):
+    """
+    Design all channels on a process pool and write the merged config.
+
+    Args:
+    - channels (list): List of (name, config) tuples returned by load_system.
+    - merged_path (Path): Path of the merged config.
+    - workers (int): Number of worker processes (default: number of CPUs, at most the number of channels;
+                     1: in this process).
+
+    Returns:
+    - failed (list): Names of the channels that failed (nothing is merged if any failed).
+    """
+
+    # Target curve (once, into the output folder of the system) and equal loudness curve
+    params = Pipeline.parse_config(channels[0][1])
+    out_root = merged_path.parent
+    out_root.mkdir(parents=True, exist_ok=True)
+    target = TargetCalc.target_calc(params['eloud_file'].resolve(), out_root, params['slope'],
+                                    params['hrtf_file'].resolve(),
+                                    params['cache_folder'] or None, int(params['cache_max_mb']*1024*1024), params['plot'],
+                                    params['grid_ppo'] or None)
+    eloud_freqs, eloud_gains = read_eloud_fr_data(params['eloud_file'].resolve())
+
+    arrays = {'target':target, 'eloud_freqs':eloud_freqs, 'eloud_gains':eloud_gains}
+
+    results = {}
+    workers = min(workers or os.cpu_count() or 1, len(channels))
+    if workers == 1:
+        # In this process: the arrays are used directly
+        _worker['arrays'] = arrays
+        try:
+            _report((design_channel(name, config) for name, config in channels), len(channels), results)
+        finally:
+            _worker.clear()
+    else:
+        blocks, specs = share_arrays(arrays)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(specs,)) as executor:
+                futures = [executor.submit(design_channel, name, config) for name, config in channels]
+                _report((future.result() for future in futures), len(channels), results)
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+    Plot.wait_plots()
+
+    failed = [name for name, _ in channels if not results.get(name)]
+    if not failed:
+        Marge.merge_channels([(name, results[name]) for name, _ in channels], str(merged_path))
+
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SONUS CORRECT multi-channel calculation with a merged config")
+    parser.add_argument("system", help="system .yml file with the list of channels")
+    parser.add_argument("-c", "--config", default=None,
+                        help="base config.yaml (default: config.yaml in the current folder, if any)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    args = parser.parse_args(argv)
+
+    config_path = args.config
+    if config_path is None and os.path.isfile("config.yaml"):
+        config_path = "config.yaml"
+
+    channels, merged_path = load_system(args.system, config_path)
+
+    start = time.perf_counter()
+    failed = run_system(channels, merged_path, args.jobs)
+    elapsed = time.perf_counter() - start
+
+    if failed:
+        print("failed channels: " + ", ".join(failed))
+        return 1
+    print(f"{len(channels)} channels completed in {elapsed:.1f} s")
+    print("Merged config: ", merged_path)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,501 @@
+#-------------------------------------------------------------------------------------
+# Headless calculation pipeline: target curve -> EQ data -> FRI, without the GUI.
+# The stages pass arrays in memory; files are only written at the end (optional),
+# so the calculation can also be embedded in other programs (design()).
+#-------------------------------------------------------------------------------------
+
+import io
+import os
+import cProfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import FriCalc
+import TargetCalc
+import Measure
+import Average
+import EqMake
+import Timing
+import Plot
+import Build
+from Timing import stage
+
+from Math import log_frequency_grid, resample_log
+from Utils import read_two_column_data, read_eloud_fr_data, collapse_duplicate_freqs, remove_duplicate_rows, format_eq_settings_yml, write_fri_data
+
+
+def parse_config(config):
+    """
+    Convert the values of a config.yaml dictionary into typed calculation parameters.
+    
+    Args:
+    - config (dict): Dictionary loaded from config.yaml.
+    
+    Returns:
+    - params (dict): Typed parameters used by run_pipeline.
+    """
+    
+    # data_file: one file, a glob pattern or a list of files (measurement positions, averaged)
+    data_files = Average.expand_fr_files(config['data_file'])
+    
+    params = {
+        'output_folder': Path(config['output_folder']),
+        'eloud_file':    Path(config['eloud_file']),
+        'data_file':     Path(data_files[0]),
+        'data_files':    [Path(path) for path in data_files],
+        'hrtf_file':     Path(config['hrtf_file']),
+        'slope':         float(config['slope']),
+        'band_num':      int(config['band_num']),
+        'eq1_file':      str(config['eq1_file']),
+        'eq2_file':      str(config['eq2_file']),
+        'eqyml_file':    str(config['eq_file_yml']),
+        'lr':            str(config['lr']),
+        'model_str':     ", ".join(map(str, config['data_file'])) if isinstance(config['data_file'], list) else str(config['data_file']),
+        'max_q':         float(config['max_q']),
+        'min_q':         float(config['min_q']),
+        'default_q':     float(config['default_q']),
+        'window_oct':    0.1,
+        'low_cutoff1':   float(config['low_cutoff1']),  # Low frequency cutoff [Hz]
+        'high_cutoff1':  float(config['high_cutoff1']), # High frequency cutoff [Hz]
+        'low_cutoff2':   float(config['low_cutoff2']),  # Low frequency cutoff [Hz]
+        'high_cutoff2':  float(config['high_cutoff2']), # High frequency cutoff [Hz]
+        'target':        float(config['target']),
+        'dip_alpha':     float(config['dip_alpha']),
+        'cache_folder':  str(config.get('cache_folder') or ""),
+        'cache_max_mb':  float(config.get('cache_max_mb', 64)),
+        'q_fit':         str(config.get('q_fit', "curve_fit")),  # "curve_fit" or "batch"
+        'refine':        bool(config.get('refine', False)),      # Optimize all bands together
+        'fr_smoothing':  float(config.get('fr_smoothing', 0)),   # 1/N octave smoothing of the speaker FR (0: none)
+        'dip_smoothing': str(config.get('dip_smoothing', "moving_average")),  # "moving_average" or N (1/N octave)
+        'tolerance_rms': float(config.get('tolerance_rms', 0)),  # Stop adding bands at this RMS error [dB] (0: off)
+        'tolerance_max': float(config.get('tolerance_max', 0)),  # Stop adding bands at this maximum error [dB] (0: off)
+        'min_improvement': float(config.get('min_improvement', 0)),  # Stop if a band improves the RMS error less [dB]
+        'grid_ppo':      float(config.get('grid_ppo', 0)),       # Log-frequency grid [points/octave] (0: input resolution)
+        'average':       Average.check_method(str(config.get('average', "power"))),  # Average of many data files: "power" or "db"
+        'data_weights':  [float(w) for w in config['data_weights']] if config.get('data_weights') else None,
+        'profile':       bool(config.get('profile', False)),     # Timing / profiling (also SONUS_PROFILE=1)
+        'parallel_designs': bool(config.get('parallel_designs', False)), # Natural EQ in a worker process (large inputs)
+        'incremental':   bool(config.get('incremental', False)), # Only run the stages whose inputs changed (Build.py)
+        'plot':          Plot.check_mode(str(config.get('plot', "sync"))),  # "sync", "deferred" or "none"
+        # data_file *.wav: sweep recording (measure_sweep: played sweep) or impulse response
+        'measure_sweep':     str(config.get('measure_sweep') or ""),
+        'measure_channel':   int(config.get('measure_channel', 0)),
+        'measure_window_ms': float(config.get('measure_window_ms', Measure.default_window_ms)),
+        'measure_smoothing': float(config.get('measure_smoothing', Measure.default_smoothing)),
+    }
+    
+    return params
+
+def eq_make_data(params, target_type):
+    """
+    Build the input dictionary of EqMake.eq_make for one target type.
+    
+    Args:
+    - params (dict): Parameters returned by parse_config.
+    - target_type (str): "artificial" or "natural".
+    
+    Returns:
+    - data (dict): Input data of EqMake.eq_make.
+    """
+    
+    output_folder = params['output_folder']
+    
+    if target_type == "artificial":
+        eq_file     = params['eq1_file']
+        low_cutoff  = params['low_cutoff1']
+        high_cutoff = params['high_cutoff1']
+        target_path = ""
+        target_on   = False
+    else:
+        eq_file     = params['eq2_file']
+        low_cutoff  = params['low_cutoff2']
+        high_cutoff = params['high_cutoff2']
+        target_path = output_folder.resolve().joinpath("target_curve_natural_flat.txt")
+        target_on   = True
+    
+    data = {'band_num':params['band_num'],
+            'file_path':params['data_file'].resolve(),
+            'out_path':output_folder.joinpath(eq_file),
+            'out_path_yml':output_folder.joinpath(params['eqyml_file']),
+            'lr':params['lr'],
+            'model_str':params['model_str'],
+            'max_q':params['max_q'],
+            'min_q':params['min_q'],
+            'default_q':params['default_q'],
+            'window_oct':params['window_oct'],
+            'low_cutoff':low_cutoff,
+            'high_cutoff':high_cutoff,
+            'target':params['target'],
+            'target_path':target_path,
+            'out':'plot_' + target_type + '_',
+            'output_folder':output_folder,
+            'target_on':target_on,
+            'dip_alpha':params['dip_alpha'],
+            'target_type':target_type,
+            'q_fit':params['q_fit'],
+            'refine':params['refine'],
+            'fr_smoothing':params['fr_smoothing'],
+            'dip_smoothing':params['dip_smoothing'],
+            'grid_ppo':params['grid_ppo'],
+            'tolerance_rms':params['tolerance_rms'],
+            'tolerance_max':params['tolerance_max'],
+            'min_improvement':params['min_improvement'],
+            'plot':params['plot'],
+    }
+    
+    return data
+
+# in-memory stages----------------------------------------------------------------------
+def load_inputs(params):
+    """
+    Read the input files of the pipeline once.
+    
+    Args:
+    - params (dict): Parameters returned by parse_config.
+    
+    Returns:
+    - inputs (dict): 'spkr', 'eloud' and 'hrtf' (None if no HRTF file) as (frequencies, gains) arrays.
+    """
+    
+    hrtf_path = params['hrtf_file'].resolve()
+    
+    with stage("read_inputs"):
+        inputs = {'spkr':read_spkr_data(params),
+                  'eloud':read_eloud_fr_data(params['eloud_file'].resolve()),
+                  'hrtf':read_two_column_data(hrtf_path) if os.path.isfile(hrtf_path) else None,
+        }
+    
+    return inputs
+
+def read_spkr_data(params):
+    """
+    Read the speaker FR data. Many data files (measurement positions) are averaged one file at a time
+    on the log-frequency grid (Average.py).
+    
+    Args:
+    - params (dict): Parameters returned by parse_config.
+    
+    Returns:
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
+    """
+    
+    if len(params['data_files']) == 1 and params['data_weights'] is None:
+        return read_spkr_file(params, params['data_file'])
+    
+    with stage("average"):
+        return Average.average_fr(params['data_files'], params['average'], params['data_weights'],
+                                  log_frequency_grid(params['grid_ppo'] or None),
+                                  lambda path: read_spkr_file(params, path))
+
+def read_spkr_file(params, path):
+    """
+    Read one speaker FR data file: a text file, or a WAV file (sweep recording / impulse response) measured by Measure.py.
+    
+    Args:
+    - params (dict): Parameters returned by parse_config.
+    - path (Path): FR data file.
+    
+    Returns:
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
+    """
+    
+    data_path = Path(path).resolve()
+    if data_path.suffix.lower() != ".wav":
+        return read_two_column_data(data_path)
+    
+    sweep_path = Path(params['measure_sweep']).resolve() if params['measure_sweep'] else None
+    freqs, gains = Measure.measure_fr(data_path, [params['measure_channel']], sweep_path,
+                                      params['measure_window_ms'], smoothing=params['measure_smoothing'])
+    return freqs, gains[:, 0]
+
+def design(params, inputs, target=None, eqs=None):
+    """
+    Calculate both EQ data sets and their FRI values in memory (no file I/O).
+    
+    Args:
+    - params (dict): Parameters returned by parse_config.
+    - inputs (dict): Input curves returned by load_inputs (or made from arrays in the same form).
+    - target (ndarray): NumPy ndarray (frequencies, gains) of the natural flat target curve.
+                        Calculated from inputs if None (pass it to reuse it for many speakers).
+    - eqs (dict): Results of the target types to reuse ({target type: result['artificial'/'natural']}),
+                  only the other target types are designed (None: both).
+    
+    Returns:
+    - result (dict): 'target' curve and 'artificial' / 'natural' results of EqMake.eq_design
+                     with their FRI values ('fri': (fri_org, fri_eqd, fri_diff)).
+    """
+    
+    slope = params['slope']
+    grid_ppo = params['grid_ppo'] or None
+    fq_elouds, g_elouds = inputs['eloud']
+    
+    if target is None:
+        with stage("target_calc"):
+            if inputs.get('hrtf') is not None:
+                target = TargetCalc.calc_target_data(fq_elouds, g_elouds, slope, *inputs['hrtf'], grid_ppo=grid_ppo)[:,[0,-1]]
+            else:
+                target = TargetCalc.calc_target_data(fq_elouds, g_elouds, slope, grid_ppo=grid_ppo)[:,[0,-1]]
+    
+    # The speaker FR is resampled once onto the grid shared by the target curve, the EQ design and the FRI
+    spkr = inputs['spkr']
+    if grid_ppo:
+        with stage("resample"):
+            f_range = log_frequency_grid(grid_ppo)
+            spkr = (f_range, resample_log(*remove_duplicate_rows(*spkr), f_range))
+    
+    # FRI of both EQs: the speaker and equal loudness curves are prepared only once
+    with stage("fri"):
+        fq_spkrs, g_spkrs = collapse_duplicate_freqs(*spkr)
+        session = FriCalc.fri_session_from_data(fq_spkrs, g_spkrs, fq_elouds, g_elouds, slope, grid_ppo)
+    
+    eqs = dict(eqs or {})
+    target_types = [target_type for target_type in ["artificial", "natural"] if target_type not in eqs]
+    
+    # The designs only share read-only inputs: the natural EQ is designed in a worker process
+    # while this process designs the artificial EQ (not while profiling: the stages are recorded here)
+    if len(target_types) == 2 and params['parallel_designs'] and not Timing.is_enabled():
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(_design_worker, eq_make_data(params, "natural"), spkr, target)
+            eqs = {'artificial':EqMake.eq_design(eq_make_data(params, "artificial"), *spkr, target)}
+            eqs['natural'], log = future.result()
+        # The console output of the worker follows that of the artificial EQ, as in the sequential order
+        print(log, end="")
+    else:
+        for target_type in target_types:
+            with stage("eq_design"):
+                eqs[target_type] = EqMake.eq_design(eq_make_data(params, target_type), *spkr, target)
+    
+    result = {'target':target}
+    for target_type in ["artificial", "natural"]:
+        eq = eqs[target_type]
+        if target_type in target_types:
+            with stage("fri"):
+                eq['fri'] = FriCalc.fri_session_calc(session, eq['f0s'], eq['gains'], eq['q_factors'])
+        result[target_type] = eq
+    
+    return result
+
+def _design_worker(data, spkr, target):
+    """
+    Design one EQ in a worker process of design.
+    
+    Args:
+    - data (dict): Input data of EqMake.eq_design.
+    - spkr (tuple): (frequencies, gains) of the speaker FR.
+    - target (ndarray): NumPy ndarray (frequencies, gains) of the target curve.
+    
+    Returns:
+    - eq (dict): Result of EqMake.eq_design.
+    - log (str): Console output of the design.
+    """
+    
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        eq = EqMake.eq_design(data, *spkr, target)
+    return eq, log.getvalue()
+
+def write_outputs(params, result, plot=True):
+    """
+    Write the EQ data files, the .yml file, fri.txt and the plots of a design result.
+    
+    Args:
+    - params (dict): Parameters returned by parse_config.
+    - result (dict): Result of design.
+    - plot (bool/list): Save the plots (in the plot mode of params['plot']); a list: only the plots of these target types.
+    """
+    
+    output_folder = params['output_folder']
+    
+    designs = {}
+    fri_diffs = {}
+    for target_type in ["artificial", "natural"]:
+        eq = result[target_type]
+        data = eq_make_data(params, target_type)
+        
+        with stage("write_eq"):
+            EqMake.write_eq_settings(eq['f0s'], eq['gains'], eq['q_factors'], data['out_path'], data['model_str'])
+        if plot is True or (plot and target_type in plot):
+            with stage("plot"):
+                Plot.plot(params['plot'], EqMake.plot_data_and_curve,
+                          eq['freqs'], eq['gains0'], eq['eqd_gains'], eq['eq_curve'], eq['t_curve'], data['out'], output_folder)
+        
+        designs[target_type] = (eq['f0s'], eq['gains'], eq['q_factors'])
+        fri_diffs[target_type] = eq['fri'][2]
+    
+    # The whole .yml file is written at once
+    with stage("write_yml"):
+        with open(output_folder.joinpath(params['eqyml_file']), 'w') as file:
+            file.write(format_eq_settings_yml(designs, fri_diffs, params['lr'], params['band_num']))
+    
+    with stage("write_fri"):
+        write_fri_data(output_folder.joinpath("fri.txt"), result['artificial']['fri'], result['natural']['fri'])
+
+# main----------------------------------------------------------------------------------
+def run_pipeline(config, write=True):
+    """
+    Run the whole calculation (target curve, both EQ data sets, FRI) for one speaker.
+    The stages pass their results in memory; files are only written at the end (if write=True),
+    all of them into the output folder.
+    
+    Args:
+    - config (dict): Dictionary loaded from config.yaml.
+    - write (bool): Write the output files.
+    
+    Returns:
+    - result (dict): Result of design (target curve, filters, curves and FRI values),
+                     with 'plot_failures': number of plots that could not be saved.
+    """
+    
+    params = parse_config(config)
+    
+    # Timing / profiling of the stages: profile.prof and profile_trace.json in the output folder
+    if not (params['profile'] or Timing.env_enabled()):
+        result = _run(params, write)
+    else:
+        profiler = cProfile.Profile()
+        Timing.start()
+        profiler.enable()
+        try:
+            with stage("total"):
+                result = _run(params, write)
+        finally:
+            profiler.disable()
+            Timing.stop()
+        
+        Timing.print_summary()
+        for path in Timing.dump(params['output_folder'], profiler):
+            print("Profile data: ", path)
+    
+    # The calculation is finished when its deferred plots are saved
+    result['plot_failures'] = Plot.wait_plots()
+    
+    return result
+
+def _run(params, write):
+    """
+    Run the stages of run_pipeline with parsed parameters.
+    
+    Args:
+    - params (dict): Parameters returned by parse_config.
+    - write (bool): Write the output files.
+    
+    Returns:
+    - result (dict): Result of design.
+    """
+    
+    if write and params['incremental']:
+        return _run_incremental(params)
+    
+    output_folder = params['output_folder']
+    
+    inputs = load_inputs(params)
+    
+    # Frequency response data with slope+ iso-loudness curve applied in TargetCalc.py=========
+    with stage("target_calc"):
+        target = TargetCalc.target_calc(params['eloud_file'].resolve(), output_folder if write else None, params['slope'],
+                                        params['hrtf_file'].resolve(),
+                                        params['cache_folder'] or None, int(params['cache_max_mb']*1024*1024), params['plot'],
+                                        params['grid_ppo'] or None)
+    
+    # EQ Data Creation and FRI=======================================================
+    result = design(params, inputs, target)
+    
+    print_fri(result)
+    
+    if write:
+        write_outputs(params, result)
+    
+    return result
+
+def _run_incremental(params):
+    """
+    Run the stages of run_pipeline whose inputs or settings changed since the last run
+    in the output folder, and reuse the results of the others (see Build.py).
+    The output files that only depend on file names (EQ data, .yml, fri.txt) are always written.
+    
+    Args:
+    - params (dict): Parameters returned by parse_config.
+    
+    Returns:
+    - result (dict): Result of design.
+    """
+    
+    output_folder = params['output_folder']
+    state = Build.load_state(output_folder)
+    keys = Build.stage_keys(params)
+    reused = []
+    
+    with stage("target_calc"):
+        target = Build.reuse(state, output_folder, "target", keys['target'])
+        if target is None:
+            target = TargetCalc.target_calc(params['eloud_file'].resolve(), output_folder, params['slope'],
+                                            params['hrtf_file'].resolve(),
+                                            params['cache_folder'] or None, int(params['cache_max_mb']*1024*1024), params['plot'],
+                                            params['grid_ppo'] or None)
+            Build.record(state, output_folder, "target", keys['target'], target, ["target_curve_natural_flat.txt"])
+        else:
+            reused.append("target_calc")
+    
+    eqs = {}
+    for target_type in ["artificial", "natural"]:
+        eq = Build.reuse(state, output_folder, target_type, keys[target_type])
+        if eq is not None:
+            eqs[target_type] = eq
+            reused.append("eq_design " + target_type)
+    
+    if len(eqs) == 2:
+        result = dict(eqs, target=target)
+    else:
+        result = design(params, load_inputs(params), target, eqs)
+        for target_type in ["artificial", "natural"]:
+            if target_type not in eqs:
+                Build.record(state, output_folder, target_type, keys[target_type], result[target_type])
+    
+    print_fri(result)
+    
+    # Plots of the changed EQs (or missing plot files)
+    plots = []
+    for target_type in ["artificial", "natural"]:
+        name = "plot_" + target_type
+        if Build.is_current(state, output_folder, name, keys[name]):
+            reused.append(name)
+        else:
+            plots.append(target_type)
+    
+    write_outputs(params, result, plots)
+    
+    for target_type in plots:
+        files = [] if params['plot'] == "none" else ["plot_" + target_type + "_flat_target.png"]
+        Build.record(state, output_folder, "plot_" + target_type, keys["plot_" + target_type], files=files)
+    Build.save_state(state, output_folder)
+    
+    if reused:
+        print("Unchanged (reused): ", ", ".join(reused))
+    
+    return result
+
+def print_fri(result):
+    """
+    Print the FRI values of both EQs of a design result.
+    
+    Args:
+    - result (dict): Result of design.
+    """
+    
+    fri1 = result['artificial']['fri']
+    fri2 = result['natural']['fri']
+    
+    #Calculate gain increase/decrease after applying EQ filter in EqCalc.py===========================
+    print("================================================")
+    print("Calculate Frequency Response Integral:FRI")
+    print("================================================")
+    for title, (fri_k, fri_f, fri_diff) in [("Artificial", fri1), ("Natural", fri2)]:
+        print(title + " Flat Target FR Data")
+        print("------------------------------------------------")
+        print("fri_before_EQ-filter[dB]: ", fri_k)
+        print("fri_after_EQ-filter [dB]: ", fri_f)
+        print("fri_diff:           [dB]: ", fri_diff)
+        print("------------------------------------------------")
@@ -0,0 +1,98 @@
+#-------------------------------------------------------------------------------------
+# Plot modes of the calculation (config.yaml: plot)
+#   sync:     the plots are saved before the calculation continues (default)
+#   deferred: the plots are saved by a background process (Agg backend), so the
+#             calculation does not wait for matplotlib
+#   none:     no plots
+# matplotlib is only imported by the plot functions themselves (in the plot process).
+# The plots are only saved to files, never displayed: the plot processes and the
+# command line tools use the Agg backend (use_file_backend).
+#-------------------------------------------------------------------------------------
+
+import os
+import multiprocessing
+
+plot_modes = ["sync", "deferred", "none"]
+
+# Maximum number of plots saved at the same time in the deferred mode
+max_workers = 2
+
+# Background processes of the deferred mode
+_processes = []
+
+
+def check_mode(mode):
+    """
+    Check the plot mode.
+
+    Args:
+    - mode (str): Plot mode.
+
+    Returns:
+    - mode (str): Plot mode.
+    """
+
+    if mode not in plot_modes:
+        raise ValueError(f"Unknown plot mode: {mode} ({', '.join(plot_modes)})")
+    return mode
+
+def use_file_backend():
+    """
+    Use the Agg backend of matplotlib in this process and its child processes
+    (no GUI toolkit is needed). Call it before matplotlib is imported.
+    """
+
+    os.environ["MPLBACKEND"] = "Agg"
+
+def _run_plot(func, args):
+    use_file_backend()
+    func(*args)
+
+def plot(mode, func, *args):
+    """
+    Run a plot function in the given plot mode.
+    In deferred mode the function runs in a new process, so it must be a module-level function.
+
+    Args:
+    - mode (str): Plot mode ("sync", "deferred" or "none").
+    - func (function): Plot function, which saves the plot to a file.
+    - args: Arguments of the plot function.
+    """
+
+    check_mode(mode)
+
+    if mode == "none":
+        return
+    if mode == "sync":
+        func(*args)
+        return
+
+    # Wait for the oldest plot while max_workers plots are being saved
+    running = [p for p in _processes if p.is_alive()]
+    if len(running) >= max_workers:
+        running[0].join()
+
+    # spawn: the process does not inherit the state of the GUI (tkinter) process
+    process = multiprocessing.get_context("spawn").Process(target=_run_plot, args=(func, args))
+    process.start()
+    _processes.append(process)
+
+def wait_plots():
+    """
+    Wait until all deferred plots are saved.
+
+    Returns:
+    - failed (int): Number of plots that failed (their error is printed by the plot process).
+    """
+
+    failed = 0
+    for process in _processes:
+        process.join()
+        if process.exitcode != 0:
+            failed += 1
+    _processes.clear()
+
+    if failed:
+        print(f"{failed} plot(s) could not be saved")
+
+    return failed
@@ -0,0 +1,242 @@
+#-------------------------------------------------------------------------------------
+# Offline rendering of the EQ: the peak filters are converted into digital biquads
+# (second-order sections, RBJ Audio EQ Cookbook "peakingEQ", as the Biquad Peaking
+# filters of the .yml files) and applied to a WAV file block by block, so that the
+# corrections can be previewed without a live DSP. The memory use does not depend
+# on the length of the file.
+#
+#   python ./Render.py in.wav out.wav --eq L=eq_L.txt --eq R=eq_R.txt
+#   python ./Render.py in.wav out.wav --yml eqdata.yml --target natural
+#   python ./Render.py --yml eq_R.yml --rate 48000 --sos-out sos.txt
+#-------------------------------------------------------------------------------------
+
+import sys
+import argparse
+import numpy as np
+import yaml
+
+from Utils import read_eq_data
+import Wav
+
+# scipy is imported inside the functions that use it (startup time)
+
+# Input channels of the speaker names (Utils.write_eq_settings_yml3: L -> 2/4, R -> 3/5)
+lr_channels = {'L':0, 'R':1}
+
+# Frames per block
+default_block_frames = 65536
+
+
+def peaking_sos(f0s, gains, q_factors, fs):
+    """
+    Calculate the second-order sections of peaking EQ biquads (RBJ Audio EQ Cookbook).
+
+    Args:
+    - f0s (array): Frequencies of peak filters [Hz].
+    - gains (array): Gains of peak filters [dB].
+    - q_factors (array): Q factors of peak filters.
+    - fs (float): Sample rate [Hz].
+
+    Returns:
+    - sos (ndarray): NumPy ndarray (filters x 6) of [b0, b1, b2, 1, a1, a2].
+    """
+
+    f0s = np.asarray(f0s, dtype=float)
+    a = 10**(np.asarray(gains, dtype=float)/40)
+    w0 = 2*np.pi*f0s/fs
+    alpha = np.sin(w0)/(2*np.asarray(q_factors, dtype=float))
+    cos_w0 = np.cos(w0)
+
+    a0 = 1 + alpha/a
+    sos = np.column_stack((1 + alpha*a, -2*cos_w0, 1 - alpha*a,
+                           a0, -2*cos_w0, 1 - alpha/a)) / a0[:, None]
+
+    return sos
+
+def read_eq_filters(file_path, target_type="artificial"):
+    """
+    Read the peak filters and gains of each input channel from an EQ data file.
+    .txt: EQ data file of one speaker (eq_make), applied to channel 0.
+    .yml: EQ .yml file of one speaker or merged by Marge.py; Filter step on channel n+i
+          (artificial) or 2n+i (natural) belongs to input channel i, n: number of input channels.
+
+    Args:
+    - file_path (str): EQ data file (.txt or .yml).
+    - target_type (str): "artificial" or "natural" (only for .yml).
+
+    Returns:
+    - channels (dict): {input channel: (f0s, gains, q_factors, gain [dB])}.
+    """
+
+    if not str(file_path).lower().endswith((".yml", ".yaml")):
+        f0s, gains, q_factors = read_eq_data(file_path)
+        return {0:(f0s, gains, q_factors, 0.0)}
+
+    with open(file_path, "r") as f:
+        cfg = yaml.safe_load(f) or {}
+
+    filters = cfg.get("filters", {})
+    pipeline = cfg.get("pipeline", [])
+
+    # Number of input channels: Copy steps of a merged file, L/R for the file of one speaker
+    n = sum(1 for step in pipeline if step.get("type") == "Copy") or 2
+    first = n if target_type == "artificial" else 2*n
+
+    channels = {}
+    for step in pipeline:
+        if step.get("type") != "Filter" or not first <= step.get("channel", -1) < first + n:
+            continue
+
+        f0s, gains, q_factors, gain = [], [], [], 0.0
+        for name in step.get("names", []):
+            filt = filters[name]
+            params = filt.get("parameters", {})
+            if filt.get("type") == "Biquad" and params.get("type") == "Peaking":
+                f0s.append(float(params["freq"]))
+                gains.append(float(params["gain"]))
+                q_factors.append(float(params["q"]))
+            elif filt.get("type") == "Gain":
+                gain += float(params["gain"])
+            else:
+                raise ValueError(f"Unsupported filter {name}: {filt.get('type')} {params.get('type', '')}")
+
+        channels[step["channel"] - first] = (np.array(f0s), np.array(gains), np.array(q_factors), gain)
+
+    return channels
+
+def write_sos(out_path, channel_sos):
+    """
+    Write the second-order sections of each channel.
+    Format: channel, b0, b1, b2, a0, a1, a2 (one section per line).
+
+    Args:
+    - out_path (str): Output file path.
+    - channel_sos (dict): {channel: sos ndarray (sections x 6)}.
+    """
+
+    with open(out_path, 'w') as file:
+        for ch in sorted(channel_sos):
+            for section in channel_sos[ch]:
+                file.write(f"{ch}, " + ", ".join(f"{v:.12g}" for v in section) + "\n")
+
+def render_wav(in_path, out_path, channel_filters, block_frames=default_block_frames):
+    """
+    Apply the EQ of each channel to a WAV file block by block and write a float 32 bit WAV file.
+    Channels without EQ are copied unchanged.
+
+    Args:
+    - in_path (str): Input WAV file.
+    - out_path (str): Output WAV file.
+    - channel_filters (dict): {channel: (f0s, gains, q_factors, gain [dB])}.
+    - block_frames (int): Frames per block.
+
+    Returns:
+    - peak (float): Peak absolute sample value of the output (> 1.0: clipped by a fixed point DAC).
+    """
+
+    from scipy.signal import sosfilt
+
+    wav = Wav.open_wav(in_path)
+    fs = wav['fs']
+
+    sos = {}
+    zi = {}
+    scale = {}
+    for ch, (f0s, gains, q_factors, gain) in channel_filters.items():
+        if ch >= wav['channels']:
+            raise ValueError(f"Channel {ch} is not in {in_path} ({wav['channels']} channels)")
+        if len(f0s):
+            sos[ch] = peaking_sos(f0s, gains, q_factors, fs)
+            zi[ch] = np.zeros((len(f0s), 2))
+        scale[ch] = 10**(gain/20)
+
+    writer = Wav.open_writer(out_path, fs, wav['channels'])
+    peak = 0.0
+    try:
+        for start in range(0, wav['frames'], block_frames):
+            block = Wav.read_block(wav, start, start + block_frames)
+
+            # The filter state is kept between the blocks
+            for ch in sos:
+                block[:, ch], zi[ch] = sosfilt(sos[ch], block[:, ch], zi=zi[ch])
+            for ch, s in scale.items():
+                if s != 1.0:
+                    block[:, ch] *= s
+
+            if block.size:
+                peak = max(peak, float(np.abs(block).max()))
+            Wav.write_block(writer, block)
+    finally:
+        Wav.close_writer(writer)
+
+    return peak
+
+def parse_eq_args(eq_args, target_type):
+    """
+    Read the EQ data files given as CHANNEL=FILE (channel number, or L / R).
+
+    Args:
+    - eq_args (list): List of "CHANNEL=FILE".
+    - target_type (str): "artificial" or "natural" (for .yml files).
+
+    Returns:
+    - channels (dict): {channel: (f0s, gains, q_factors, gain [dB])}.
+    """
+
+    channels = {}
+    for arg in eq_args:
+        name, path = arg.split("=", 1)
+        ch = lr_channels[name] if name in lr_channels else int(name)
+        filters = read_eq_filters(path, target_type)
+        if not filters:
+            raise ValueError(f"{path}: no {target_type} EQ filters found")
+        # The file of one speaker: its own channel (L / R) goes to the given channel
+        channels[ch] = filters[ch] if ch in filters else next(iter(filters.values()))
+    return channels
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply EQ data to a WAV file (offline preview)")
+    parser.add_argument("input", nargs="?", help="input WAV file")
+    parser.add_argument("output", nargs="?", help="output WAV file (float 32 bit)")
+    parser.add_argument("--eq", action="append", default=[], metavar="CHANNEL=FILE",
+                        help="EQ data file (.txt / .yml) of a channel (0, 1, ... or L, R); may be repeated")
+    parser.add_argument("--yml", help="EQ .yml file with all channels (merged by Marge.py, or of one speaker)")
+    parser.add_argument("--target", default="artificial", choices=["artificial", "natural"],
+                        help="EQ of the .yml files (default: artificial)")
+    parser.add_argument("--block", type=int, default=default_block_frames,
+                        help=f"frames per block (default: {default_block_frames})")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="sample rate for --sos-out without input WAV file")
+    parser.add_argument("--sos-out", help="write the biquad coefficients (channel, b0, b1, b2, a0, a1, a2)")
+    args = parser.parse_args(argv)
+
+    if not (args.input and args.output) and not args.sos_out:
+        parser.error("input and output WAV files are needed")
+    if args.sos_out and not args.input and args.rate is None:
+        parser.error("--sos-out needs an input WAV file or --rate")
+
+    try:
+        channel_filters = {}
+        if args.yml:
+            channel_filters.update(read_eq_filters(args.yml, args.target))
+        channel_filters.update(parse_eq_args(args.eq, args.target))
+        if not channel_filters:
+            parser.error("no EQ data: use --eq or --yml")
+
+        if args.sos_out:
+            fs = Wav.open_wav(args.input)['fs'] if args.input else args.rate
+            write_sos(args.sos_out, {ch: peaking_sos(*filters[:3], fs) for ch, filters in channel_filters.items()})
+            print("Biquad coefficients: ", args.sos_out)
+
+        if args.input and args.output:
+            peak = render_wav(args.input, args.output, channel_filters, args.block)
+            print("Output WAV: ", args.output)
+            print(f"Peak: {20*np.log10(max(peak, 1e-12)):.2f} dBFS")
+    except (OSError, ValueError) as e:
+        print("Error: ", e)
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
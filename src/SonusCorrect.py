@@ -5,23 +5,22 @@
 #================================================================================
 import sys
 import os
-import pandas as pd
+import argparse
+import multiprocessing
 import yaml
-import tkinter as tk
-from tkinter import filedialog
-from tkinter import Tk, ttk
-from ttkthemes import ThemedTk
 from pathlib import Path
 
-import FriCalc
-import TargetCalc
-import EqMake
-import Math
-import Utils
+Ver = "1.11"
 
-from Utils import write_eq_settings_yml0, write_eq_settings_yml2, write_eq_settings_yml3
+# GUI modules: imported in main() only when the GUI is started (startup time).
+# The calculation modules (Pipeline: numpy, scipy, matplotlib) are imported on first use.
+tk = ttk = filedialog = ThemedTk = None
 
-Ver = "1.11"
+def import_gui():
+    global tk, ttk, filedialog, ThemedTk
+    import tkinter as tk
+    from tkinter import filedialog, ttk
+    from ttkthemes import ThemedTk
 
 def config_file_path(relative_path: str) -> str:
     base_path = os.path.abspath(".")
@@ -90,6 +89,9 @@ def save_data():
             except ValueError:
                 # If it cannot be converted to numerical values, save as is
                 data_config[key] = entry.get()
+        elif key in list_keys and ";" in entry.get():
+            # Many files (e.g. measurement positions): shown separated by ";"
+            data_config[key] = [part.strip() for part in entry.get().split(";") if part.strip()]
         else:
             # If it cannot be converted to numerical values, save as is
             data_config[key] = entry.get()
@@ -170,6 +172,8 @@ def create_gui():
             entry_frames.append(entry_frame)
             
             value = int(data_config.get(key, "")) if isinstance(data_config.get(key, ""), int) else data_config.get(key, "")
+            if isinstance(value, list):
+                value = "; ".join(map(str, value))
             entry = ttk.Entry(entry_frame, width=80, font=font)
             entry.insert(0, str(value))
             entry.grid(row=0, column=0, sticky="ew") 
@@ -220,48 +224,6 @@ def calculate():
     with open(config_file_path,'r', encoding="utf-8") as f:
         config = yaml.safe_load(f)
     
-    #INPUT==========================================================================
-    output_folder = Path(config['output_folder'])
-    eloud_file     = Path(config['eloud_file'])      
-    data_file  = Path(config['data_file'])   
-    #out        = str(config['out'])         
-    slope      = float(config['slope'])       
-    hrtf_file  = Path(config['hrtf_file'])
-    #================================================================================
-    band_num  =  int(config['band_num'])    
-    eq1_file  =  str(config['eq1_file'])    
-    eq2_file  =  str(config['eq2_file'])
-    eqyml_file = str(config['eq_file_yml'])
-    lr         = str(config['lr'])
-    model_str =  str(config['data_file'])  
-
-    max_q     =  float(config['max_q'])
-    min_q     =  float(config['min_q']) 
-    default_q =  float(config['default_q']) 
-
-    window_oct = 0.1
-    
-    low_cutoff1 = float(config['low_cutoff1'])  # Low frequency cutoff [Hz]
-    high_cutoff1 = float(config['high_cutoff1'])  # High frequency cutoff [Hz]
-    
-    low_cutoff2 = float(config['low_cutoff2'])  # Low frequency cutoff [Hz]
-    high_cutoff2 = float(config['high_cutoff2'])  # High frequency cutoff [Hz]
-
-    target = float(config['target']) 
-    
-    dip_alpha = float(config['dip_alpha']) 
-
-    
-    # Get script file directory
-    script_dir = Path.cwd()
-    
-    # Make file paths absolute
-    file2_path   = eloud_file.resolve()
-    file3_path   = data_file.resolve()
-    target_calclated_path = output_folder.resolve().joinpath("target_curve_natural_flat.txt")
-    hrtf_path    = hrtf_file.resolve()
-    #out_path     = output_folder.resolve().joinpath(out)
-    
     print("================================================================================")
     print("================================================================================")
     print("                                 SONUS CORRECT")
@@ -272,127 +234,83 @@ def calculate():
     print("================================================================================")
     print("")
     
+    # Target curve, EQ data and FRI calculation (see Pipeline.py)
+    import Pipeline
+    result = Pipeline.run_pipeline(config)
     
-    
-    # Frequency response data with slope+ iso-loudness curve applied in TargetCalc.py=========
-    TargetCalc.target_calc(file2_path, output_folder, slope, hrtf_path)
-    
-    # EQ Data Creation=======================================================
-    # flat target--------------------------------------------------
-    target_type = "artificial"
-    eq1_path    = output_folder.joinpath(eq1_file)
-    eq_path_yml = output_folder.joinpath(eqyml_file)
-
-    write_eq_settings_yml0(eq_path_yml, target_type)
-    
-    data = {'band_num':band_num,
-            'file_path':file3_path,
-            'out_path':eq1_path,
-            'out_path_yml':eq_path_yml,
-            'lr':lr,
-            'model_str':model_str,
-            'max_q':max_q,
-            'min_q':min_q,
-            'default_q':default_q,
-            'window_oct':window_oct,
-            'low_cutoff':low_cutoff1,
-            'high_cutoff':high_cutoff1,
-            'target':target,
-            'target_path':"",
-            'out':'plot_artificial_',
-            'output_folder':output_folder,
-            'target_on':False,
-            'dip_alpha':dip_alpha,
-            'target_type':target_type,
-            #'hrtf_path':'',
-    }
-    EqMake.eq_make(data)
-    
-    fri_k1, fri_f1, diff = FriCalc.fri_calc(eq1_path, file3_path, file2_path, slope)
-    
-    write_eq_settings_yml2(eq_path_yml, target_type, diff)
-    
-    # slope - equal loudness curve target-------------------------------------
-    target_type = "natural"
-    eq2_path   = output_folder.joinpath(eq2_file)
-    
-    data2 = {'band_num':band_num,
-            #'file_path':out_path,
-            'file_path':file3_path,
-            'out_path':eq2_path,
-            'out_path_yml':eq_path_yml,
-            'lr':lr,
-            'model_str':model_str,
-            'max_q':max_q,
-            'min_q':min_q,
-            'default_q':default_q,
-            'window_oct':window_oct,
-            'low_cutoff':low_cutoff2,
-            'high_cutoff':high_cutoff2,
-            'target':target,
-            'target_path':target_calclated_path,
-            'out':'plot_natural_',
-            'output_folder':output_folder,
-            'target_on':True,
-            'dip_alpha':dip_alpha,
-            'target_type':target_type,
-            #'hrtf_path':hrtf_path,
-    }
-    EqMake.eq_make(data2)
-    
-    fri_k1, fri_f1, diff = FriCalc.fri_calc(eq2_path, file3_path, file2_path, slope)
-    
-    write_eq_settings_yml2(eq_path_yml, target_type, diff)
-    
-    write_eq_settings_yml3(eq_path_yml, lr, band_num)
-    
-    #Calculate gain increase/decrease after applying EQ filter in EqCalc.py===========================
-    print("================================================")
-    print("Calculate Frequency Response Integral:FRI")
-    print("================================================")
-    print("Artificial Flat Target FR Data")
-    fri_k1, fri_f1, fri_diff1 = FriCalc.fri_calc(eq1_path, file3_path, file2_path, slope)
-    print("------------------------------------------------")
-    print("fri_before_EQ-filter[dB]: ", fri_k1)
-    print("fri_after_EQ-filter [dB]: ", fri_f1)
-    print("fri_diff:           [dB]: ", fri_diff1)
-    print("------------------------------------------------")
-    print("Natural Flat Target FR Data")
-    fri_k2, fri_f2, fri_diff2 = FriCalc.fri_calc(eq2_path, file3_path, file2_path, slope)
-    print("------------------------------------------------")
-    print("fri_before_EQ-filter[dB]: ", fri_k2)
-    print("fri_after_EQ-filter [dB]: ", fri_f2)
-    print("fri_diff:           [dB]: ", fri_diff2)
-    print("------------------------------------------------")
-    
-    with open("fri.txt", "w") as f:
-        f.write("================================================\n")
-        f.write("Calculate Frequency Response Integral:FRI\n")
-        f.write("================================================\n")
-        f.write("Artificial Flat Target FR Data\n")
-        f.write("------------------------------------------------\n")
-        f.write("fri_before_equalization[dB]: " + str(fri_k1) + "\n")
-        f.write("fri_after_equalization [dB]: " + str(fri_f1) + "\n")
-        f.write("fri_diff:              [dB]: " + str(fri_diff1) +"\n")
-        f.write("------------------------------------------------\n")
-        f.write("Natural Flat Target FR Data\n")
-        f.write("------------------------------------------------\n")
-        f.write("fri_before_equalization[dB]: " + str(fri_k2) + "\n")
-        f.write("fri_after_equalization [dB]: " + str(fri_f2) + "\n")
-        f.write("fri_diff:              [dB]: " + str(fri_diff2) + "\n")
-        f.write("------------------------------------------------\n")
-    
-    # Move and overwrite files
-    os.replace("fri.txt", output_folder.joinpath("fri.txt"))
-    
-    print("Calculation completed successfully.")
-    
+    if result['plot_failures']:
+        print("Calculation completed, but some plots could not be saved.")
+    else:
+        print("Calculation completed successfully.")
+    
+    
+# Check config file-----------------------------------------------------------------------------
+def check_config(path):
+    """
+    Check a config file without starting the GUI: all values can be converted,
+    and the input files and the output folder exist.
+    
+    Args:
+    - path (str): Path to config.yaml.
+    
+    Returns:
+    - errors (list): Error messages (empty if the config file is OK).
+    """
+    
+    import Pipeline
+    
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        params = Pipeline.parse_config(config)
+    except KeyError as e:
+        return [f"missing key: {e.args[0]}"]
+    except (OSError, ValueError, TypeError, yaml.YAMLError) as e:
+        return [str(e)]
+    
+    errors = []
+    for data_path in params['data_files']:
+        if not data_path.is_file():
+            errors.append(f"data_file: file not found: {data_path}")
+    if not params['eloud_file'].is_file():
+        errors.append(f"eloud_file: file not found: {params['eloud_file']}")
+    if params['data_weights'] is not None and len(params['data_weights']) != len(params['data_files']):
+        errors.append(f"data_weights: {len(params['data_weights'])} weights for {len(params['data_files'])} data files")
+    if str(config['hrtf_file']) != "" and not params['hrtf_file'].is_file():
+        errors.append(f"hrtf_file: file not found: {params['hrtf_file']}")
+    if params['measure_sweep'] and not Path(params['measure_sweep']).is_file():
+        errors.append(f"measure_sweep: file not found: {params['measure_sweep']}")
+    if not params['output_folder'].is_dir():
+        errors.append(f"output_folder: folder not found: {params['output_folder']}")
+    if params['lr'] not in ("L", "R"):
+        errors.append(f"lr: \"L\" or \"R\": {params['lr']}")
+    if params['min_q'] > params['max_q']:
+        errors.append(f"min_q > max_q: {params['min_q']} > {params['max_q']}")
+    
+    return errors
     
 # main function--------------------------------------------------------------------------------------------
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SONUS CORRECT Ver." + Ver + ": Eq Data Creation Program for Sound Field Correction")
+    parser.add_argument("--check-config", nargs="?", const="config.yaml", metavar="CONFIG",
+                        help="check a config file (default: config.yaml) and exit without starting the GUI")
+    parser.add_argument("--version", action="version", version="SONUS CORRECT Ver." + Ver)
+    args = parser.parse_args(argv)
+    
+    if args.check_config is not None:
+        errors = check_config(args.check_config)
+        for error in errors:
+            print("Error: ", error)
+        if errors:
+            return 1
+        print("Config OK: ", args.check_config)
+        return 0
+    
+    import_gui()
+    
     # Create and run a GUI
     global config_file_path
-    global entries, data_config, numeric_keys, parameter_descriptions, param_com, folder_path_keys, file_path_keys, file_name_keys
+    global entries, data_config, numeric_keys, parameter_descriptions, param_com, folder_path_keys, file_path_keys, file_name_keys, list_keys
     entries = {}
     data_config = {}
     config_file_path = config_file_path("config.yaml")
@@ -452,8 +370,12 @@ def main():
     file_path_keys = ['eloud_file', 'data_file', 'target_file', 'hrtf_file']
     #file_name_keys = ['out','eq1_file','eq2_file']
     file_name_keys = ['eq1_file','eq2_file']
+    # Key to data that can be a list of files (separated by ";" in the GUI)
+    list_keys = ['data_file']
     create_gui()
     
     
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Worker processes of the calculation (frozen executable on Windows)
+    multiprocessing.freeze_support()
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,299 @@
+#-------------------------------------------------------------------------------------
+# Parameter sweep: evaluate many settings of the EQ design for one speaker on a process
+# pool and write a table ranked by the residual RMS / FRI difference.
+# Each worker reads the input data and calculates the target curve once (initializer);
+# the points of the sweep only run the EQ designs and the FRI (Pipeline.design).
+#
+# Sweep file (.yml):
+#   method: lhs          # grid (all combinations), random or lhs (Latin hypercube)
+#   samples: 50          # number of points (random / lhs)
+#   seed: 0
+#   rank: rms            # rms, rms_artificial, rms_natural, fri_artificial or fri_natural
+#   params:
+#     band_num: [10, 15, 20, 30]          # values
+#     dip_alpha: {min: 0.0, max: 1.0}     # range (grid: num values, default 5)
+#     max_q: {min: 4.0, max: 10.0, num: 4}
+#
+#   python ./Sweep.py sweep.yml [-c config.yaml] [-j 4] [-o sweep.csv]
+#-------------------------------------------------------------------------------------
+
+import io
+import sys
+import csv
+import time
+import argparse
+import itertools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import yaml
+
+import Pipeline
+import TargetCalc
+
+# Parameters that can be swept and their types
+sweep_keys = {'dip_alpha':float,
+              'band_num':int,
+              'max_q':float,
+              'min_q':float,
+              'default_q':float,
+              'low_cutoff1':float,
+              'high_cutoff1':float,
+              'low_cutoff2':float,
+              'high_cutoff2':float,
+              'target':float,
+              'tolerance_rms':float,
+              'tolerance_max':float,
+              'min_improvement':float,
+}
+
+sample_methods = ["grid", "random", "lhs"]
+
+# Scores (smaller is better); fri_*: absolute FRI difference (loudness change by the EQ)
+rank_keys = ["rms", "rms_artificial", "rms_natural", "fri_artificial", "fri_natural"]
+
+# Number of values of a range in the grid method
+default_grid_num = 5
+
+# State of a worker process (set by _init_worker)
+_worker = {}
+
+
+def load_sweep(sweep_path):
+    """
+    Load a sweep file.
+
+    Args:
+    - sweep_path (str): Sweep .yml file.
+
+    Returns:
+    - sweep (dict): 'method', 'samples', 'seed', 'rank' and 'params' ({name: list of values or {min, max[, num]}}).
+    """
+
+    with open(sweep_path, "r", encoding="utf-8") as f:
+        sweep = yaml.safe_load(f) or {}
+
+    sweep = {'method':str(sweep.get('method', "grid")),
+             'samples':int(sweep.get('samples', 20)),
+             'seed':sweep.get('seed'),
+             'rank':str(sweep.get('rank', "rms")),
+             'params':sweep.get('params') or {},
+    }
+
+    if sweep['method'] not in sample_methods:
+        raise ValueError(f"Unknown method: {sweep['method']} ({', '.join(sample_methods)})")
+    if sweep['rank'] not in rank_keys:
+        raise ValueError(f"Unknown rank: {sweep['rank']} ({', '.join(rank_keys)})")
+    if not sweep['params']:
+        raise ValueError(f"No params in {sweep_path}")
+    for name, spec in sweep['params'].items():
+        if name not in sweep_keys:
+            raise ValueError(f"Parameter cannot be swept: {name} ({', '.join(sweep_keys)})")
+        if not isinstance(spec, (list, dict)) or (isinstance(spec, dict) and not {'min', 'max'} <= set(spec)):
+            raise ValueError(f"{name}: list of values or {{min, max}} range")
+
+    return sweep
+
+def make_points(sweep):
+    """
+    Make the parameter sets of a sweep.
+    grid: all combinations (ranges: num values from min to max).
+    random: uniform in the ranges / random choice of the values.
+    lhs: Latin hypercube, each range and list is divided into samples strata.
+
+    Args:
+    - sweep (dict): Sweep returned by load_sweep.
+
+    Returns:
+    - points (list): List of {parameter name: value}.
+    """
+
+    names = list(sweep['params'])
+    specs = [sweep['params'][name] for name in names]
+
+    if sweep['method'] == "grid":
+        axes = []
+        for spec in specs:
+            if isinstance(spec, list):
+                axes.append(spec)
+            else:
+                axes.append(list(np.linspace(spec['min'], spec['max'], int(spec.get('num', default_grid_num)))))
+        values = itertools.product(*axes)
+    else:
+        rng = np.random.default_rng(sweep['seed'])
+        n = sweep['samples']
+        if sweep['method'] == "random":
+            u = rng.random((n, len(names)))
+        else:
+            u = np.column_stack([(rng.permutation(n) + rng.random(n))/n for _ in names])
+
+        values = []
+        for row in u:
+            point = []
+            for spec, x in zip(specs, row):
+                if isinstance(spec, list):
+                    point.append(spec[min(int(x*len(spec)), len(spec) - 1)])
+                else:
+                    point.append(spec['min'] + x*(spec['max'] - spec['min']))
+            values.append(point)
+
+    points = []
+    for point in values:
+        typed = {}
+        for name, value in zip(names, point):
+            value = sweep_keys[name](round(float(value)) if sweep_keys[name] is int else float(value))
+            typed[name] = value
+        points.append(typed)
+
+    return points
+
+def _init_worker(config):
+    # The inputs and the target curve are shared by all points of the worker
+    with contextlib.redirect_stdout(io.StringIO()):
+        params = Pipeline.parse_config(dict(config, parallel_designs=False, plot="none"))
+        inputs = Pipeline.load_inputs(params)
+        target = TargetCalc.target_calc(params['eloud_file'].resolve(), None, params['slope'],
+                                        params['hrtf_file'].resolve(),
+                                        params['cache_folder'] or None, int(params['cache_max_mb']*1024*1024), "none",
+                                        params['grid_ppo'] or None)
+
+    _worker.update({'params':params, 'inputs':inputs, 'target':target})
+
+def evaluate_point(point):
+    """
+    Design both EQs with one parameter set (in a worker initialized by _init_worker).
+
+    Args:
+    - point (dict): {parameter name: value}.
+
+    Returns:
+    - row (dict): The parameters and the scores ('rms_artificial', 'rms_natural',
+                  'fri_artificial', 'fri_natural': FRI differences [dB]), the numbers of bands
+                  ('bands_artificial', 'bands_natural') or 'error'.
+    """
+
+    row = dict(point)
+    params = dict(_worker['params'])
+    params.update(point)
+
+    if params['min_q'] > params['max_q']:
+        row['error'] = "min_q > max_q"
+        return row
+    if params['low_cutoff1'] >= params['high_cutoff1'] or params['low_cutoff2'] >= params['high_cutoff2']:
+        row['error'] = "low_cutoff >= high_cutoff"
+        return row
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = Pipeline.design(params, _worker['inputs'], _worker['target'])
+    except Exception as e:
+        row['error'] = f"{type(e).__name__}: {e}"
+        return row
+
+    for target_type in ["artificial", "natural"]:
+        row['rms_' + target_type] = float(result[target_type]['rms'][1])
+        row['fri_' + target_type] = float(result[target_type]['fri'][2])
+        row['bands_' + target_type] = len(result[target_type]['f0s'])
+
+    return row
+
+def score(row, rank):
+    """
+    Score of an evaluated point (smaller is better, failed points: inf).
+
+    Args:
+    - row (dict): Row returned by evaluate_point.
+    - rank (str): Score name (see rank_keys).
+
+    Returns:
+    - score (float): Score.
+    """
+
+    if 'error' in row:
+        return float("inf")
+    if rank == "rms":
+        return 0.5*(row['rms_artificial'] + row['rms_natural'])
+    if rank.startswith("fri_"):
+        return abs(row[rank])
+    return row[rank]
+
+def run_sweep(config, points, rank="rms", workers=None):
+    """
+    Evaluate the points on a process pool and rank them.
+
+    Args:
+    - config (dict): Dictionary loaded from config.yaml.
+    - points (list): Parameter sets returned by make_points.
+    - rank (str): Score name (see rank_keys).
+    - workers (int): Number of worker processes (default: number of CPUs, 1: in this process).
+
+    Returns:
+    - rows (list): Rows of evaluate_point with 'score', sorted by the score.
+    """
+
+    if workers == 1:
+        _init_worker(config)
+        rows = [evaluate_point(point) for point in points]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as executor:
+            # Results in the order of the points (deterministic ranking of equal scores)
+            rows = list(executor.map(evaluate_point, points, chunksize=max(1, len(points)//(8*(workers or 4)))))
+
+    for row in rows:
+        row['score'] = score(row, rank)
+    rows.sort(key=lambda row: row['score'])
+
+    return rows
+
+def write_table(out_path, rows, names):
+    """
+    Write the ranked table as a CSV file.
+
+    Args:
+    - out_path (str): Output .csv file.
+    - rows (list): Rows returned by run_sweep.
+    - names (list): Parameter names.
+    """
+
+    columns = (["rank"] + names + ["score", "rms_artificial", "rms_natural", "fri_artificial", "fri_natural",
+                                   "bands_artificial", "bands_natural", "error"])
+    with open(out_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for i, row in enumerate(rows):
+            writer.writerow(dict(row, rank=i + 1))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SONUS CORRECT parameter sweep")
+    parser.add_argument("sweep", help="sweep .yml file")
+    parser.add_argument("-c", "--config", default="config.yaml", help="base config.yaml (default: config.yaml)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("-o", "--output", default="sweep.csv", help="ranked table (default: sweep.csv)")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+
+    sweep = load_sweep(args.sweep)
+    points = make_points(sweep)
+    print(f"{len(points)} points ({sweep['method']}), rank: {sweep['rank']}")
+
+    start = time.perf_counter()
+    rows = run_sweep(config, points, sweep['rank'], args.jobs)
+    elapsed = time.perf_counter() - start
+
+    names = list(sweep['params'])
+    write_table(args.output, rows, names)
+
+    print(f"{len(rows)} points evaluated in {elapsed:.1f} s")
+    for i, row in enumerate(rows[:5]):
+        values = ", ".join(f"{name}={row[name]:g}" for name in names)
+        print(f"{i + 1}. score {row['score']:.3f}: {values}")
+    print("Sweep table: ", args.output)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
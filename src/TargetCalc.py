@@ -3,18 +3,19 @@
 #-------------------------------------------------------------------------------------
 
 import os
-import shutil
 import numpy as np
-import pandas as pd
-import re
-import subprocess
-import matplotlib.pyplot as plt
-import cmath
 from pathlib import Path
-from scipy.interpolate import interp1d
 
-from Math import linear_interpolation, apply_curve, calc_slope_curve
-from Utils import read_fr_data, read_eq_data, read_eloud_fr_data, read_spkr_fr_data
+from Math import linear_interpolation, apply_curve, calc_slope_curve, log_frequency_grid
+from Utils import read_eloud_fr_data, read_two_column_data
+from Cache import file_digest, make_key, cache_load, cache_store, default_max_bytes
+from Timing import stage
+import Plot
+
+# scipy and matplotlib are imported inside the functions that use them (startup time)
+
+# Change this when the calculation below changes, so that old cached targets are not used
+target_cache_version = 1
 
 
 # Functions that shave the low and high of the target curve.
@@ -71,6 +72,8 @@ def ear_canal_transfer_function(f_range):
 # Plot the curves---------------------------------------------------------------
 def plot_eq_curve(data, output_folder):
     
+    import matplotlib.pyplot as plt
+    
     # plot setting
     plt.figure(figsize=(8, 6))
     plt.xlabel('Frequency (Hz)')
@@ -95,22 +98,35 @@ def plot_eq_curve(data, output_folder):
     # Show legend
     plt.legend()
 
-    # Saving Graphs
-    plt.savefig('target_FR_data_plot.png')
+    # Saving Graphs (directly into the output folder, so that concurrent runs do not collide)
+    plt.savefig(Path(output_folder).joinpath("target_FR_data_plot.png"))
 
     # Graph Display
     plt.close()
     
-    # Move and overwrite files
-    os.replace("plot_artificial_flat_target.png", output_folder.joinpath("plot_natural_flat_target.png"))
+# target curve calculation----------------------------------------------------------
+def calc_target_data(fq_elouds, g_elouds, slope, fq_hrtfs=None, g_hrtfs=None, grid_ppo=None):
+    """
+    Calculate the natural flat target curve in memory.
+    
+    Args:
+    - fq_elouds (array): Frequencies of the equal loudness curve.
+    - g_elouds (array): Gains of the equal loudness curve.
+    - slope (float):  slope [dB/oct].
+    - fq_hrtfs (array): Frequencies of the HRTF (optional).
+    - g_hrtfs (array): Gains of the HRTF (optional).
+    - grid_ppo (float): Points per octave of the frequency grid (None: 1000 points, see Math.log_frequency_grid).
     
-# main----------------------------------------------------------------------------------
-def target_calc(eloud_file_path, output_folder, slope, hrtf_path):
+    Returns:
+    - data (ndarray): NumPy ndarray of the curves. Without HRTF: (freq, target),
+                      with HRTF: (freq, HRTF, ECTF, HRTF - ECTF, target without HRTF, target).
+                      The target curve is data[:, [0, -1]].
+    """
     
-    f_range = np.logspace(np.log10(20), np.log10(20000), 1000)
+    from scipy.interpolate import interp1d
+    
+    f_range = log_frequency_grid(grid_ppo)
     
-    fq_elouds, g_elouds = read_eloud_fr_data(eloud_file_path)
-
     interpolator_eloud = interp1d(fq_elouds, g_elouds, kind='linear', fill_value="extrapolate")
     eloud_curve = interpolator_eloud(f_range)
     
@@ -124,15 +140,73 @@ def target_calc(eloud_file_path, output_folder, slope, hrtf_path):
     target_curve_std = target_curve - gain_tmp
     
     #Head transfer function - External auditory canal transfer function
-    if os.path.isfile(hrtf_path):
-        df_hrtf = read_fr_data(hrtf_path)
-        interpolator = interp1d(np.log10(df_hrtf['freq']), df_hrtf['gain'], kind='linear', fill_value="extrapolate")
+    if fq_hrtfs is not None:
+        interpolator = interp1d(np.log10(fq_hrtfs), g_hrtfs, kind='linear', fill_value="extrapolate")
         hrtf_curve = interpolator(np.log10(f_range))
         ectf_curve = ear_canal_transfer_function(f_range)
         target_curve_std2 = target_curve_std + hrtf_curve - ectf_curve
         data = np.column_stack((f_range, hrtf_curve, ectf_curve, hrtf_curve - ectf_curve, target_curve_std, target_curve_std2))
-        np.savetxt(output_folder.resolve().joinpath("target_curve_natural_flat.txt"), data[:,[0,5]], delimiter=',', fmt='%.6f')
-        plot_eq_curve(data, output_folder)
     else:
         data = np.column_stack((f_range, target_curve_std))
-        np.savetxt(output_folder.resolve().joinpath("target_curve_natural_flat.txt"), data[:,[0,1]], delimiter=',', fmt='%.6f')
\ No newline at end of file
+    
+    return data
+
+# main----------------------------------------------------------------------------------
+def target_calc(eloud_file_path, output_folder, slope, hrtf_path, cache_dir=None, cache_max_bytes=default_max_bytes, plot="sync", grid_ppo=None):
+    """
+    Calculate the natural flat target curve and write target_curve_natural_flat.txt.
+    With cache_dir the result is cached by the contents of the input files and the slope,
+    and a cached result is reused without recalculation (and without the plot).
+    With output_folder=None nothing is written (in-memory use).
+    
+    Args:
+    - eloud_file_path:  Equal Loudness curve file path.
+    - output_folder:  Output folder path (None: do not write files).
+    - slope (float):  slope [dB/oct].
+    - hrtf_path:  HRTF file path (no HRTF if it is not a file).
+    - cache_dir:  Cache folder path (optional).
+    - cache_max_bytes (int):  Size limit of the cache folder [bytes].
+    - plot (str):  Plot mode ("sync", "deferred" or "none", see Plot.py).
+    - grid_ppo (float):  Points per octave of the frequency grid (None: 1000 points).
+    
+    Returns:
+    - target (ndarray): NumPy ndarray (frequencies, gains) of the target curve.
+    """
+    
+    hrtf_on = os.path.isfile(hrtf_path)
+    
+    key = None
+    if cache_dir:
+        hrtf_digest = file_digest(hrtf_path) if hrtf_on else ""
+        grid_part = (float(grid_ppo),) if grid_ppo else ()
+        key = make_key("target_calc", target_cache_version, file_digest(eloud_file_path), float(slope), hrtf_digest, *grid_part)
+        target = cache_load(cache_dir, key)
+        if target is not None:
+            if output_folder is not None:
+                write_target_data(target, output_folder)
+            return target
+    
+    fq_elouds, g_elouds = read_eloud_fr_data(eloud_file_path)
+    
+    if hrtf_on:
+        fq_hrtfs, g_hrtfs = read_two_column_data(hrtf_path)
+        data = calc_target_data(fq_elouds, g_elouds, slope, fq_hrtfs, g_hrtfs, grid_ppo)
+    else:
+        data = calc_target_data(fq_elouds, g_elouds, slope, grid_ppo=grid_ppo)
+    target = data[:,[0,-1]]
+    
+    if output_folder is not None:
+        write_target_data(target, output_folder)
+        if hrtf_on:
+            with stage("plot"):
+                Plot.plot(plot, plot_eq_curve, data, output_folder)
+    
+    if key is not None:
+        cache_store(cache_dir, key, target, cache_max_bytes)
+    
+    return target
+
+def write_target_data(target, output_folder):
+    
+    target_path = Path(output_folder).resolve().joinpath("target_curve_natural_flat.txt")
+    np.savetxt(target_path, target, delimiter=',', fmt='%.6f')
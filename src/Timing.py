@@ -0,0 +1,175 @@
+#-------------------------------------------------------------------------------------
+# Timing / profiling of the calculation stages.
+# The stages are marked with "with stage(name):". While profiling is off (default)
+# this only costs one function call; while it is on (config.yaml: profile: true, or
+# environment variable SONUS_PROFILE=1) the wall time, number of calls and
+# allocated memory (tracemalloc) of each stage are recorded, and dump() writes a
+# JSON trace (chrome://tracing / Perfetto format) and a cProfile file.
+#-------------------------------------------------------------------------------------
+
+import os
+import json
+import time
+import tracemalloc
+import contextlib
+from pathlib import Path
+
+# Environment variable that turns profiling on for every run
+env_name = "SONUS_PROFILE"
+
+# Output files (in the output folder)
+trace_file = "profile_trace.json"
+cprofile_file = "profile.prof"
+
+_enabled = False
+_started_tracemalloc = False
+_t0 = 0.0
+_records = {}   # {name: {'calls', 'total', 'max', 'peak_kb'}}
+_events = []    # trace events
+_stack = []     # open stages: [start_memory, peak_memory]
+
+
+def env_enabled():
+    """
+    Check the environment variable SONUS_PROFILE.
+
+    Returns:
+    - bool: True if profiling is turned on by the environment variable.
+    """
+
+    return os.environ.get(env_name, "").strip().lower() not in ("", "0", "false", "no", "off")
+
+def is_enabled():
+    """
+    Returns:
+    - bool: True while the stages are recorded.
+    """
+
+    return _enabled
+
+def start():
+    """
+    Clear the records and start recording the stages.
+    """
+
+    global _enabled, _started_tracemalloc, _t0
+
+    _records.clear()
+    _events.clear()
+    _stack.clear()
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+
+    _t0 = time.perf_counter()
+    _enabled = True
+
+def stop():
+    """
+    Stop recording the stages (the records are kept until the next start).
+    """
+
+    global _enabled, _started_tracemalloc
+
+    _enabled = False
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Record the wall time, the number of calls and the peak allocated memory of a stage.
+    Stages may be nested; the memory of a stage includes its inner stages.
+
+    Args:
+    - name (str): Stage name.
+    """
+
+    if not _enabled:
+        yield
+        return
+
+    # Keep the peak of the outer stage before the peak is reset for this stage
+    current, peak = tracemalloc.get_traced_memory()
+    if _stack:
+        _stack[-1][1] = max(_stack[-1][1], peak)
+    tracemalloc.reset_peak()
+    frame = [current, current]
+    _stack.append(frame)
+
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start_time
+        _stack.pop()
+        peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+        if _stack:
+            _stack[-1][1] = max(_stack[-1][1], peak)
+        peak_kb = (peak - frame[0])/1024
+
+        record = _records.setdefault(name, {'calls':0, 'total':0.0, 'max':0.0, 'peak_kb':0.0})
+        record['calls'] += 1
+        record['total'] += elapsed
+        record['max'] = max(record['max'], elapsed)
+        record['peak_kb'] = max(record['peak_kb'], peak_kb)
+
+        _events.append({'name':name, 'ph':"X", 'pid':os.getpid(), 'tid':0,
+                        'ts':(start_time - _t0)*1e6, 'dur':elapsed*1e6,
+                        'args':{'peak_kb':round(peak_kb, 1)}})
+
+def records():
+    """
+    Get the records of the stages.
+
+    Returns:
+    - dict: {stage name: {'calls', 'total' [sec], 'max' [sec], 'peak_kb' [KiB]}} in the order of the first call.
+    """
+
+    return {name: dict(record) for name, record in _records.items()}
+
+def print_summary():
+    """
+    Print the records of the stages as a table.
+    """
+
+    print("================================================")
+    print("Profile")
+    print("================================================")
+    print(f"{'stage':<16} {'calls':>6} {'total[ms]':>11} {'max[ms]':>10} {'peak[KiB]':>10}")
+    for name, record in _records.items():
+        print(f"{name:<16} {record['calls']:>6} {record['total']*1000:>11.2f} {record['max']*1000:>10.2f} {record['peak_kb']:>10.1f}")
+    print("------------------------------------------------")
+
+def dump(output_folder, profiler=None):
+    """
+    Write the JSON trace of the stages (and the cProfile statistics) to the output folder.
+
+    Args:
+    - output_folder (Path): Output folder.
+    - profiler (cProfile.Profile): Profiler whose statistics are written to profile.prof (optional).
+
+    Returns:
+    - paths (list): Paths of the written files.
+    """
+
+    output_folder = Path(output_folder)
+    output_folder.mkdir(parents=True, exist_ok=True)
+
+    # Events sorted by start time, so that viewers nest them correctly
+    trace = {'traceEvents':sorted(_events, key=lambda e: e['ts']),
+             'displayTimeUnit':"ms",
+             'stages':records(),
+    }
+
+    paths = [output_folder.joinpath(trace_file)]
+    with open(paths[0], "w", encoding="utf-8") as f:
+        json.dump(trace, f, indent=1)
+
+    if profiler is not None:
+        paths.append(output_folder.joinpath(cprofile_file))
+        profiler.dump_stats(str(paths[1]))
+
+    return paths
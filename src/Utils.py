@@ -1,7 +1,16 @@
-import pandas as pd
 import numpy as np
 import re
 
+# pandas is imported inside read_fr_data, the only function that uses it (startup time)
+
+# Separators of the data files: comma / space / tab
+_separator = re.compile(r'[, \t\r\n]+')
+_number_chars = set("0123456789+-.")
+
+# "Filter N: ON  PK  Fc  f Hz  Gain  g dB  Q  q" (same fields as line.split()[2], [5], [8], [11])
+_eq_line = re.compile(r'^Filter\S*[ \t]+\S+[ \t]+ON[ \t]+\S+[ \t]+\S+[ \t]+(\S+)[ \t]+\S+[ \t]+\S+[ \t]+(\S+)'
+                      r'[ \t]+\S+[ \t]+\S+[ \t]+(\S+)', re.M)
+
 def read_fr_data(file_path):
     """
     Load frequency data from a text file.
@@ -12,60 +21,120 @@ def read_fr_data(file_path):
     Returns:
     - DataFrame: Loaded data.
     """
-    df = pd.read_csv(file_path, header=None, names=['freq', 'gain'])
+    import pandas as pd
+    
+    freqs, gains = read_two_column_data(file_path)
+    df = pd.DataFrame({'freq': freqs, 'gain': gains})
     return df
 
+# fast two column data read--------------------------------------------------------------
+def read_two_column_data(file_path, collapse_duplicates=False):
+    """
+    Load frequency and gain columns from a comma / space / tab separated text file
+    straight into contiguous float64 NumPy arrays.
+    Comment or header lines (not starting with a number, e.g. REW "*" lines) are skipped,
+    columns after the second one (e.g. phase) are ignored. All data lines must have the
+    same number of columns (ValueError with the line number otherwise).
+    
+    Args:
+    - file_path (str): Path to the text file.
+    - collapse_duplicates (bool): Drop lines whose frequency equals the previous one
+                                  (same as read_spkr_fr_data).
+    
+    Returns:
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
+    """
+    
+    with open(file_path, 'r') as file:
+        text = file.read()
+    
+    # Fields of the data lines, with their line numbers
+    numbers = []
+    rows = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if line and line[0] in _number_chars:
+            numbers.append(number)
+            rows.append(_separator.split(line.strip(", \t")))
+    
+    if len(rows) == 0:
+        return np.empty(0), np.empty(0)
+    
+    ncols = len(rows[0])
+    if ncols < 2:
+        raise ValueError(f"{file_path}: line {numbers[0]}: 2 or more columns expected, found {ncols}")
+    for number, row in zip(numbers, rows):
+        if len(row) != ncols:
+            raise ValueError(f"{file_path}: line {number}: {ncols} columns expected, found {len(row)}")
+    
+    values = np.array(rows, dtype=float)
+    
+    freqs = np.ascontiguousarray(values[:, 0])
+    gains = np.ascontiguousarray(values[:, 1])
+    
+    if collapse_duplicates:
+        freqs, gains = collapse_duplicate_freqs(freqs, gains)
+    
+    return freqs, gains
+
+def collapse_duplicate_freqs(freqs, gains):
+    """
+    Drop the points whose frequency equals the previous one (as read_spkr_fr_data).
+    
+    Args:
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
+    
+    Returns:
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
+    """
+    
+    freqs = np.asarray(freqs, dtype=float)
+    gains = np.asarray(gains, dtype=float)
+    if len(freqs) == 0:
+        return freqs, gains
+    
+    keep = np.empty(len(freqs), dtype=bool)
+    keep[0] = freqs[0] != 0
+    keep[1:] = freqs[1:] != freqs[:-1]
+    
+    return freqs[keep], gains[keep]
+
+# eq data parse--------------------------------------------------------------
+def parse_eq_data(text):
+    """
+    Parse all "Filter N: ON  PK  Fc  f Hz  Gain  g dB  Q  q" lines of an EQ text at once.
+    Lines of filters that are not ON are skipped.
+    
+    Args:
+    - text (str): Contents of an EQ data file.
+    
+    Returns:
+    - frequencies (ndarray): NumPy ndarray of frequencies of peak filters.
+    - gains (ndarray): NumPy ndarray of gains of peak filters.
+    - q_factors (ndarray): NumPy ndarray of Q factors of peak filters.
+    """
+    
+    matches = _eq_line.findall(text)
+    values = np.array(matches, dtype=float).reshape(-1, 3)
+    
+    return values[:, 0].copy(), values[:, 1].copy(), values[:, 2].copy()
+
 # file read and setting--------------------------------------------------------------
 def read_eq_data(file_path):
-    frequencies = []
-    gains = []
-    q_factors = []
     with open(file_path, 'r') as file:
-        for line in file:
-            if line.startswith('Filter'):
-                if line.split()[2] == "ON":
-                    freq = float(line.split()[5])
-                    gain = float(line.split()[8])
-                    q = float(line.split()[11])
-                    frequencies.append(freq)
-                    gains.append(gain)
-                    q_factors.append(q)
-                    #print("freq: ",freq," gain: ",gain," q: ",q)
-    return frequencies, gains, q_factors
+        text = file.read()
+    return parse_eq_data(text)
 
 # k-file read and setting--------------------------------------------------------------
 def read_eloud_fr_data(file_path):
-    frequencies = []
-    gains = []
-    with open(file_path, 'r') as file:
-        for line in file:
-            freq = float(re.split(r'[, \t]+', line)[0])
-            gain = float(re.split(r'[, \t]+', line)[1])
-            frequencies.append(freq)
-            gains.append(gain)
-            #print("freq: ",freq," gain: ",gain)
-    return frequencies, gains
+    return read_two_column_data(file_path)
 
 # msp3 data read and setting--------------------------------------------------------------
 def read_spkr_fr_data(file_path):
-    frequencies = []
-    gains = []
-    with open(file_path, 'r') as file:
-        i = 0
-        for line in file:
-            freq = float(re.split(r'[, \t]+', line)[0])
-            gain = float(re.split(r'[, \t]+', line)[1])
-            if len(frequencies) != 0:
-                freq_pre = frequencies[len(frequencies) - 1]
-            else:
-                freq_pre = 0
-                
-            if freq_pre != freq:
-                frequencies.append(freq)
-                gains.append(gain)
-            i += 1
-            #print("freq: ",freq," gain: ",gain)
-    return frequencies, gains
+    return read_two_column_data(file_path, collapse_duplicates=True)
 
 # read from FRI file--------------------------------------------------------------
 def read_fri_diff(file_path):
@@ -92,77 +161,200 @@ def remove_duplicates(df):
     df_no_duplicates = df.drop_duplicates()
     return df_no_duplicates
 
+def remove_duplicate_rows(freqs, gains):
+    """
+    Remove duplicate (frequency, gain) points, keeping the first one (same as remove_duplicates).
+    
+    Args:
+    - freqs (array): array of frequencies.
+    - gains (array): array of gains.
+    
+    Returns:
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
+    """
+    
+    points = np.column_stack((np.asarray(freqs, dtype=float), np.asarray(gains, dtype=float)))
+    if len(points) == 0:
+        return points[:, 0], points[:, 1]
+    
+    _, idx = np.unique(points, axis=0, return_index=True)
+    idx.sort()
+    
+    return points[idx, 0], points[idx, 1]
+
+# EQ data text--------------------------------------------------------------
+def format_eq_settings(fs, gs, qs):
+    
+    text = ""
+    for i in range(len(fs)):
+        freq = fs[i]
+        gain = gs[i]
+        q    = qs[i]
+        n    = i + 1
+        text += f"Filter {n}: ON  PK  Fc  {freq:.2f} Hz  Gain  {gain:.2f} dB  Q  {q:.3f}\n"
+    return text
+
+# EQ data .yml text (write_eq_settings_yml0 - 3 write these to the file)-----------------
+def format_eq_settings_yml0(target_type):
+    
+    if target_type != "artificial":
+        return ""
+    return (f"devices:\n" +
+            f"  capture:\n" +
+            f"    type: CoreAudio\n" +
+            f"    device: \"BlackHole 2ch\"\n" +
+            f"  playback:\n" +
+            f"    type: CoreAudio\n" +
+            f"    device: \"MacBook Pro Speakers\"\n" +
+            f"\n" +
+            f"filters:\n")
+
+def format_eq_settings_yml1(fs, gs, qs, target_type):
+    
+    text = ""
+    for i in range(len(fs)):
+        freq = fs[i]
+        gain = gs[i]
+        q    = qs[i]
+        n    = i + 1
+        title= target_type + "_eq" + str(n)
+        text += (f"  {title}:\n" +
+                 f"    type: Biquad\n" +
+                 f"    parameters:\n" +
+                 f"      type: Peaking\n" +
+                 f"      freq: {freq:.2f}\n" +
+                 f"      q: {q:.3f}\n" +
+                 f"      gain: {gain:.2f}\n")
+    return text
+
+def format_eq_settings_yml2(target_type, g_diff):
+    
+    title= target_type + "_gain"   
+    return (f"  {title}:\n" +
+            f"    type: Gain\n" +
+            f"    parameters:\n" +
+            f"      gain: {g_diff}\n" +
+            f"  {title}_for_alpha:\n" +
+            f"    type: Gain\n" +
+            f"    parameters:\n" +
+            f"      gain: {-6.0}\n")
+
+def format_eq_settings_yml3(lr, band_num):
+    
+    # Number of bands: the same for both EQs, or {target_type: number of bands}
+    if not isinstance(band_num, dict):
+        band_num = {"artificial":band_num, "natural":band_num}
+    
+    text = (f"\n" +
+            f"pipeline:\n")
+
+    if lr == "L":
+        ch = [2,4]
+    else:
+        ch = [3,5]
+        
+    for j in ch:
+        text += (f"  - type: Filter\n" +
+                 f"    channel: {j}\n"
+                 f"    names:\n")
+        for k in range(band_num["artificial" if j in (2, 3) else "natural"]):
+            n = k + 1
+            if j == 2 or j == 3:
+                title= "artificial" + "_eq" + str(n)
+            else:
+                title= "natural" + "_eq" + str(n)
+            text += f"      - {title}\n"
+        if j == 2 or j == 3:
+            title= "artificial" + "_gain"
+        else:
+            title= "natural" + "_gain"
+        text += f"      - {title}\n"
+        text += f"      - {title}_for_alpha\n"
+    return text
+
+def format_eq_settings_yml(designs, fri_diffs, lr, band_num):
+    """
+    Make the whole EQ data .yml text (same as write_eq_settings_yml0 - 3) in memory.
+    
+    Args:
+    - designs (dict): {target_type: (fs, gs, qs)} of "artificial" and "natural".
+    - fri_diffs (dict): {target_type: FRI diff}.
+    - lr (str): "L" or "R".
+    - band_num (int): Number of EQ bands (the number of filters of each design is used,
+                      which is smaller with a tolerance, see EqMake.eq_design).
+    
+    Returns:
+    - text (str): Contents of the .yml file.
+    """
+    
+    text = format_eq_settings_yml0("artificial")
+    for target_type in ["artificial", "natural"]:
+        fs, gs, qs = designs[target_type]
+        text += format_eq_settings_yml1(fs, gs, qs, target_type)
+        text += format_eq_settings_yml2(target_type, fri_diffs[target_type])
+    text += format_eq_settings_yml3(lr, {target_type: len(designs[target_type][0]) for target_type in designs})
+    return text
+
 def write_eq_settings_yml0(out_path, target_type):
     
     if target_type == "artificial":
         with open(out_path, 'w') as file:
-            file.write(f"devices:\n" +
-                       f"  capture:\n" +
-                       f"    type: CoreAudio\n" +
-                       f"    device: \"BlackHole 2ch\"\n" +
-                       f"  playback:\n" +
-                       f"    type: CoreAudio\n" +
-                       f"    device: \"MacBook Pro Speakers\"\n" +
-                       f"\n" +
-                       f"filters:\n")
+            file.write(format_eq_settings_yml0(target_type))
             
 
 def write_eq_settings_yml1(fs, gs, qs, out_path, target_type):
             
     with open(out_path, 'a') as file:
-        for i in range(len(fs)):
-            freq = fs[i]
-            gain = gs[i]
-            q    = qs[i]
-            n    = i + 1
-            title= target_type + "_eq" + str(n)
-            file.write(f"  {title}:\n" +
-                       f"    type: Biquad\n" +
-                       f"    parameters:\n" +
-                       f"      type: Peaking\n" +
-                       f"      freq: {freq:.2f}\n" +
-                       f"      q: {q:.3f}\n" +
-                       f"      gain: {gain:.2f}\n")
+        file.write(format_eq_settings_yml1(fs, gs, qs, target_type))
 
 def write_eq_settings_yml2(out_path, target_type, g_diff):
             
     with open(out_path, 'a') as file:
-        title= target_type + "_gain"   
-        file.write(f"  {title}:\n" +
-                   f"    type: Gain\n" +
-                   f"    parameters:\n" +
-                   f"      gain: {g_diff}\n")
-        title= target_type + "_gain"   
-        file.write(f"  {title}_for_alpha:\n" +
-                   f"    type: Gain\n" +
-                   f"    parameters:\n" +
-                   f"      gain: {-6.0}\n")
+        file.write(format_eq_settings_yml2(target_type, g_diff))
 
 def write_eq_settings_yml3(out_path, lr, band_num):
             
     with open(out_path, 'a') as file:
-        file.write(f"\n" +
-                   f"pipeline:\n")
+        file.write(format_eq_settings_yml3(lr, band_num))
 
-        if lr == "L":
-            ch = [2,4]
-        else:
-            ch = [3,5]
-            
-        for j in ch:
-            file.write(f"  - type: Filter\n" +
-                       f"    channel: {j}\n"
-                       f"    names:\n")
-            for k in range(band_num):
-                n = k + 1
-                if j == 2 or j == 3:
-                    title= "artificial" + "_eq" + str(n)
-                else:
-                    title= "natural" + "_eq" + str(n)
-                file.write(f"      - {title}\n")
-            if j == 2 or j == 3:
-                title= "artificial" + "_gain"
-            else:
-                title= "natural" + "_gain"
-            file.write(f"      - {title}\n")
-            file.write(f"      - {title}_for_alpha\n")
+# FRI file text--------------------------------------------------------------
+def format_fri_data(fri1, fri2):
+    
+    fri_k1, fri_f1, fri_diff1 = fri1
+    fri_k2, fri_f2, fri_diff2 = fri2
+    
+    return ("================================================\n" +
+            "Calculate Frequency Response Integral:FRI\n" +
+            "================================================\n" +
+            "Artificial Flat Target FR Data\n" +
+            "------------------------------------------------\n" +
+            "fri_before_equalization[dB]: " + str(fri_k1) + "\n" +
+            "fri_after_equalization [dB]: " + str(fri_f1) + "\n" +
+            "fri_diff:              [dB]: " + str(fri_diff1) +"\n" +
+            "------------------------------------------------\n" +
+            "Natural Flat Target FR Data\n" +
+            "------------------------------------------------\n" +
+            "fri_before_equalization[dB]: " + str(fri_k2) + "\n" +
+            "fri_after_equalization [dB]: " + str(fri_f2) + "\n" +
+            "fri_diff:              [dB]: " + str(fri_diff2) + "\n" +
+            "------------------------------------------------\n")
+
+# write FRI file--------------------------------------------------------------
+def write_fri_data(out_path, fri1, fri2):
+    
+    with open(out_path, "w") as f:
+        f.write(format_fri_data(fri1, fri2))
+
+# write two column data--------------------------------------------------------------
+def write_two_column_data(out_path, freqs, gains):
+    """
+    Write frequency and gain columns as a comma separated text file (read by read_two_column_data).
+    
+    Args:
+    - out_path (str): Output file path.
+    - freqs (ndarray): NumPy ndarray of frequencies.
+    - gains (ndarray): NumPy ndarray of gains.
+    """
+    
+    np.savetxt(out_path, np.column_stack((freqs, gains)), fmt="%.2f", delimiter=", ")
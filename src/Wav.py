@@ -0,0 +1,196 @@
+#-------------------------------------------------------------------------------------
+# WAV file reading / writing in blocks (memory-mapped), for files larger than the memory.
+# Reading: PCM 8/16/24/32 bit and float 32/64 bit, WAVE_FORMAT_EXTENSIBLE and RF64.
+# Writing: float 32 bit; the file becomes RF64 automatically when it exceeds 4 GiB.
+#-------------------------------------------------------------------------------------
+
+import struct
+import numpy as np
+
+_format_pcm = 1
+_format_float = 3
+_format_extensible = 0xFFFE
+
+# Size of a RIFF file that fits into its 32 bit size fields
+_riff_max = 0xFFFFFFFF
+
+
+def open_wav(file_path):
+    """
+    Open a WAV file for reading in blocks. The samples are memory-mapped, not loaded.
+
+    Args:
+    - file_path (str): Path to the WAV file.
+
+    Returns:
+    - wav (dict): 'fs' (sample rate), 'channels', 'frames', 'bits', 'float' (bool) and
+                  'data' (memory-mapped bytes of the samples, frames x bytes per frame).
+    """
+
+    with open(file_path, "rb") as f:
+        riff, riff_size, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff not in (b"RIFF", b"RF64") or wave != b"WAVE":
+            raise ValueError(f"Not a WAV file: {file_path}")
+
+        fmt = None
+        data_size64 = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"No data chunk in WAV file: {file_path}")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+
+            if chunk_id == b"ds64":
+                body = f.read(chunk_size)
+                data_size64 = struct.unpack("<Q", body[8:16])[0]
+            elif chunk_id == b"fmt ":
+                body = f.read(chunk_size)
+                tag, channels, fs, _, block_align, bits = struct.unpack("<HHIIHH", body[:16])
+                if tag == _format_extensible and chunk_size >= 40:
+                    tag = struct.unpack("<H", body[24:26])[0]
+                fmt = (tag, channels, fs, block_align, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"No fmt chunk before the data chunk: {file_path}")
+                if chunk_size == _riff_max and data_size64 is not None:
+                    chunk_size = data_size64
+                offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + (chunk_size & 1), 1)
+
+    tag, channels, fs, block_align, bits = fmt
+    if tag not in (_format_pcm, _format_float) or (tag == _format_float and bits not in (32, 64)) \
+       or (tag == _format_pcm and bits not in (8, 16, 24, 32)):
+        raise ValueError(f"Unsupported WAV format (format {tag}, {bits} bit): {file_path}")
+
+    # The data chunk may be shorter than its header says (unfinished recordings)
+    file_size = _file_size(file_path)
+    frames = min(chunk_size, file_size - offset) // block_align
+
+    data = np.memmap(file_path, dtype=np.uint8, mode="r", offset=offset, shape=(frames, block_align))
+
+    wav = {'fs':fs,
+           'channels':channels,
+           'frames':frames,
+           'bits':bits,
+           'float':tag == _format_float,
+           'data':data,
+    }
+
+    return wav
+
+def _file_size(file_path):
+    with open(file_path, "rb") as f:
+        return f.seek(0, 2)
+
+def read_block(wav, start, stop):
+    """
+    Read frames [start, stop) of an opened WAV file as floating point samples (full scale = 1.0).
+
+    Args:
+    - wav (dict): WAV file opened with open_wav.
+    - start (int): First frame.
+    - stop (int): Frame after the last frame.
+
+    Returns:
+    - block (ndarray): NumPy ndarray (frames x channels) of float64 samples.
+    """
+
+    raw = np.ascontiguousarray(wav['data'][start:stop])
+    frames = raw.shape[0]
+    channels = wav['channels']
+    bits = wav['bits']
+
+    if wav['float']:
+        dtype = np.float32 if bits == 32 else np.float64
+        return raw.view(dtype).reshape(frames, channels).astype(np.float64)
+
+    if bits == 8:
+        return (raw.reshape(frames, channels).astype(np.float64) - 128) / 128
+    if bits == 24:
+        # 3 bytes little endian -> int32 (sign from the top byte)
+        b = raw.reshape(frames, channels, 3).astype(np.int32)
+        samples = b[:, :, 0] | (b[:, :, 1] << 8) | (b[:, :, 2] << 16)
+        samples -= (samples & 0x800000) << 1
+        return samples / float(1 << 23)
+
+    dtype = np.int16 if bits == 16 else np.int32
+    return raw.view(dtype).reshape(frames, channels) / float(1 << (bits - 1))
+
+def open_writer(file_path, fs, channels):
+    """
+    Open a float 32 bit WAV file for writing in blocks.
+
+    Args:
+    - file_path (str): Path to the WAV file.
+    - fs (int): Sample rate [Hz].
+    - channels (int): Number of channels.
+
+    Returns:
+    - writer (dict): State of the writer (use write_block and close_writer).
+    """
+
+    f = open(file_path, "wb")
+    block_align = 4 * channels
+
+    # The JUNK chunk is replaced with a ds64 chunk if the file becomes RF64
+    f.write(struct.pack("<4sI4s", b"RIFF", 0, b"WAVE"))
+    f.write(struct.pack("<4sI", b"JUNK", 28) + bytes(28))
+    f.write(struct.pack("<4sIHHIIHH", b"fmt ", 16, _format_float, channels, fs, fs * block_align, block_align, 32))
+    f.write(struct.pack("<4sI", b"data", 0))
+
+    writer = {'file':f,
+              'channels':channels,
+              'frames':0,
+              'data_offset':f.tell(),
+    }
+
+    return writer
+
+def write_block(writer, block):
+    """
+    Append a block of samples to a WAV file opened with open_writer.
+
+    Args:
+    - writer (dict): Writer returned by open_writer.
+    - block (ndarray): NumPy ndarray (frames x channels) of samples (full scale = 1.0).
+    """
+
+    block = np.asarray(block, dtype="<f4")
+    if block.ndim != 2 or block.shape[1] != writer['channels']:
+        raise ValueError(f"Block must have the shape (frames, {writer['channels']})")
+
+    writer['file'].write(np.ascontiguousarray(block).tobytes())
+    writer['frames'] += block.shape[0]
+
+def close_writer(writer):
+    """
+    Write the sizes into the header and close a WAV file opened with open_writer.
+
+    Args:
+    - writer (dict): Writer returned by open_writer.
+    """
+
+    f = writer['file']
+    data_size = writer['frames'] * 4 * writer['channels']
+    riff_size = writer['data_offset'] - 8 + data_size
+
+    if data_size & 1:
+        f.write(b"\0")
+
+    if riff_size <= _riff_max:
+        f.seek(4)
+        f.write(struct.pack("<I", riff_size))
+        f.seek(writer['data_offset'] - 4)
+        f.write(struct.pack("<I", data_size))
+    else:
+        # RF64: the sizes are in the ds64 chunk
+        f.seek(0)
+        f.write(struct.pack("<4sI", b"RF64", _riff_max))
+        f.seek(12)
+        f.write(struct.pack("<4sIQQQI", b"ds64", 28, riff_size, data_size, writer['frames'], 0))
+        f.seek(writer['data_offset'] - 4)
+        f.write(struct.pack("<I", _riff_max))
+
+    f.close()
@@ -0,0 +1,22 @@
+# The modules of the program are flat modules in src/ (imported by name, as the scripts do)
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+
+src_dir = Path(__file__).resolve().parent.parent.joinpath("src")
+sys.path.insert(0, str(src_dir))
+
+
+@pytest.fixture
+def sample_config(tmp_path):
+    """config.yaml of the program (sample speaker FR data), writing into a temporary output folder."""
+    with open(src_dir.joinpath("config.yaml"), "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    for key in ['data_file', 'eloud_file', 'k_file', 'target_file']:
+        config[key] = str(src_dir.joinpath(config[key]).resolve())
+    config['output_folder'] = str(tmp_path.joinpath("output"))
+    config['plot'] = "none"
+    Path(config['output_folder']).mkdir()
+    return config
@@ -0,0 +1,78 @@
+# Average: data file expansion and the streaming average of many measurement positions.
+
+import numpy as np
+import pytest
+
+import Average
+import Math
+import Pipeline
+from Utils import write_two_column_data
+
+
+@pytest.fixture
+def positions(tmp_path):
+    rng = np.random.default_rng(0)
+    freqs = np.geomspace(20, 20000, 200)
+    paths = []
+    curves = []
+    for i in range(3):
+        gains = rng.normal(0, 3, len(freqs))
+        path = tmp_path.joinpath(f"pos{i + 1}.txt")
+        write_two_column_data(path, freqs, gains)
+        paths.append(str(path))
+        curves.append(Math.resample_log(*Average.read_two_column_data(path), Math.log_frequency_grid()))
+    return paths, np.array(curves)
+
+def test_expand_fr_files(tmp_path, positions):
+    paths, _ = positions
+    literal = tmp_path.joinpath("meas[1].txt")
+    literal.write_text("20, 0\n20000, 0\n")
+
+    assert Average.expand_fr_files(str(tmp_path.joinpath("pos*.txt"))) == paths
+    assert Average.expand_fr_files([paths[2], str(tmp_path.joinpath("pos[12].txt"))]) == [paths[2]] + paths[:2]
+    # An existing file with glob characters in its name is not a pattern
+    assert Average.expand_fr_files(str(literal)) == [str(literal)]
+    assert Average.expand_fr_files(paths[0]) == [paths[0]]
+    with pytest.raises(ValueError, match="No FR data files match"):
+        Average.expand_fr_files(str(tmp_path.joinpath("missing*.txt")))
+
+@pytest.mark.parametrize("method", ["power", "db"])
+def test_average_fr_matches_direct_average(positions, method):
+    paths, curves = positions
+    weights = [2.0, 1.0, 0.5]
+
+    freqs, gains = Average.average_fr(paths, method, weights)
+
+    np.testing.assert_array_equal(freqs, Math.log_frequency_grid())
+    if method == "power":
+        expected = 10*np.log10(np.average(10**(curves/10), axis=0, weights=weights))
+    else:
+        expected = np.average(curves, axis=0, weights=weights)
+    np.testing.assert_allclose(gains, expected, atol=1e-9)
+
+def test_average_fr_errors(positions):
+    paths, _ = positions
+
+    with pytest.raises(ValueError, match="2 weights for 3"):
+        Average.average_fr(paths, weights=[1, 2])
+    with pytest.raises(ValueError, match="Unknown average method"):
+        Average.average_fr(paths, "median")
+    with pytest.raises(ValueError, match="zero weights"):
+        Average.average_fr(paths, weights=[0, 0, 0])
+
+def test_pipeline_reads_the_average(positions, sample_config):
+    paths, _ = positions
+    params = Pipeline.parse_config(dict(sample_config, data_file=paths, data_weights=[2, 1, 1], average="db"))
+
+    freqs, gains = Pipeline.read_spkr_data(params)
+
+    np.testing.assert_allclose(gains, Average.average_fr(paths, "db", [2, 1, 1])[1])
+
+def test_main(tmp_path, positions, capsys):
+    paths, _ = positions
+    out_path = tmp_path.joinpath("average.txt")
+
+    assert Average.main(paths + ["--method", "db", "-o", str(out_path)]) == 0
+    np.testing.assert_allclose(Average.read_two_column_data(out_path)[1], Average.average_fr(paths, "db")[1], atol=0.005)
+    assert Average.main([str(tmp_path.joinpath("missing.txt"))]) == 1
+    assert "Error: " in capsys.readouterr().out
@@ -0,0 +1,57 @@
+# Batch: manifest loading and the jobs of a batch run.
+
+from pathlib import Path
+
+import pytest
+import yaml
+
+import Batch
+
+
+def write_manifest(tmp_path, manifest):
+    path = tmp_path.joinpath("manifest.yml")
+    path.write_text(yaml.safe_dump(manifest))
+    return path
+
+def test_load_manifest(tmp_path, sample_config):
+    config_path = tmp_path.joinpath("config.yaml")
+    config_path.write_text(yaml.safe_dump(dict(sample_config, data_file="fr/default.txt")))
+    manifest_path = write_manifest(tmp_path, {'output_folder': "batch",
+                                              'defaults': {'slope': -3.0},
+                                              'jobs': [{'name': "room1_L", 'data_file': "fr/L.txt", 'lr': "L"},
+                                                       {'band_num': 10}]})
+
+    jobs = Batch.load_manifest(manifest_path, config_path)
+
+    assert [name for name, _ in jobs] == ["room1_L", "job002"]
+    first, second = jobs[0][1], jobs[1][1]
+    assert first['output_folder'] == str(tmp_path.joinpath("batch", "room1_L"))
+    assert first['data_file'] == str(tmp_path.joinpath("fr", "L.txt"))
+    assert (first['lr'], first['slope'], first['band_num']) == ("L", -3.0, sample_config['band_num'])
+    # Paths of config.yaml are relative to its folder, the target curve cache is shared by the jobs
+    assert second['data_file'] == str(tmp_path.joinpath("fr", "default.txt"))
+    assert second['band_num'] == 10
+    assert first['cache_folder'] == second['cache_folder'] == str(tmp_path.joinpath("batch", ".cache"))
+
+def test_load_manifest_duplicate_names(tmp_path):
+    manifest_path = write_manifest(tmp_path, {'jobs': [{'name': "a"}, {'name': "a"}]})
+
+    with pytest.raises(ValueError, match="Duplicate job name"):
+        Batch.load_manifest(manifest_path)
+
+def test_run_batch(tmp_path, sample_config):
+    out_root = tmp_path.joinpath("batch")
+    manifest_path = write_manifest(tmp_path, {'output_folder': str(out_root),
+                                              'defaults': dict(sample_config, band_num=5),
+                                              'jobs': [{'name': "ok"},
+                                                       {'name': "missing", 'data_file': "missing.txt"}]})
+
+    failed = Batch.run_batch(Batch.load_manifest(manifest_path), workers=1)
+
+    # A failed job does not stop the others; the console output of each job is in its log.txt
+    assert failed == ["missing"]
+    for file in ["eq_1.txt", "eq_2.txt", "eq_R.yml", "fri.txt", "log.txt"]:
+        assert out_root.joinpath("ok", file).is_file()
+    assert "Generate EQ curve" in out_root.joinpath("ok", "log.txt").read_text()
+    assert out_root.joinpath(".cache").is_dir()
+    assert not Path(out_root.joinpath("missing", "eq_1.txt")).exists()
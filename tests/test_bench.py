@@ -0,0 +1,18 @@
+# Bench: the synthetic FR data runs at the number of points it reports.
+
+import numpy as np
+
+import Bench
+import Utils
+
+
+def test_synthetic_fr_points_are_distinct(tmp_path):
+    path = tmp_path.joinpath("synthetic_FR_data.txt")
+    freqs, gains = Bench.make_synthetic_fr(100000)
+
+    Bench.write_synthetic_fr(path, freqs, gains)
+
+    read_freqs, read_gains = Utils.read_spkr_fr_data(path)
+    assert len(read_freqs) == len(np.unique(read_freqs)) == 100000
+    np.testing.assert_allclose(read_freqs, freqs, rtol=1e-7)
+    np.testing.assert_allclose(read_gains, gains, atol=5e-5)
@@ -0,0 +1,92 @@
+# Build: incremental re-runs of the pipeline skip the unchanged stages.
+
+from pathlib import Path
+
+import pytest
+
+import Build
+import EqMake
+import Pipeline
+import TargetCalc
+
+baseline_dir = Path(__file__).resolve().parent.joinpath("data", "baseline")
+baseline_files = ["eq_1.txt", "eq_2.txt", "eq_R.yml", "fri.txt", "target_curve_natural_flat.txt"]
+
+
+@pytest.fixture
+def designs(monkeypatch):
+    # Target types designed by EqMake.eq_design
+    designed = []
+    eq_design = EqMake.eq_design
+
+    def counting_eq_design(data, *args):
+        designed.append(data['target_type'])
+        return eq_design(data, *args)
+
+    monkeypatch.setattr(EqMake, "eq_design", counting_eq_design)
+    return designed
+
+def test_incremental_rerun(sample_config, designs, capsys):
+    config = dict(sample_config, incremental=True)
+    output_folder = Path(config['output_folder'])
+
+    Pipeline.run_pipeline(config)
+    assert designs == ["artificial", "natural"]
+    for file in baseline_files:
+        assert output_folder.joinpath(file).read_text() == baseline_dir.joinpath(file).read_text(), file
+
+    # Nothing changed: no stage runs, the outputs are written again
+    output_folder.joinpath("eq_1.txt").unlink()
+    capsys.readouterr()
+    Pipeline.run_pipeline(config)
+    assert designs == ["artificial", "natural"]
+    assert "Unchanged (reused):  target_calc, eq_design artificial, eq_design natural" in capsys.readouterr().out
+    assert output_folder.joinpath("eq_1.txt").read_text() == baseline_dir.joinpath("eq_1.txt").read_text()
+
+    # Output file names only: no stage runs
+    Pipeline.run_pipeline(dict(config, eq_file_yml="eq_L.yml", lr="L"))
+    assert designs == ["artificial", "natural"]
+    assert output_folder.joinpath("eq_L.yml").is_file()
+
+    # A setting of one target type: only that EQ is designed again
+    Pipeline.run_pipeline(dict(config, high_cutoff2=4000.0))
+    assert designs == ["artificial", "natural", "natural"]
+
+def test_incremental_input_change(tmp_path, sample_config, designs, monkeypatch):
+    data_path = tmp_path.joinpath("FR_data.txt")
+    data_path.write_text(Path(sample_config['data_file']).read_text())
+    config = dict(sample_config, incremental=True, data_file=str(data_path))
+    Pipeline.run_pipeline(config)
+
+    # The speaker data changed: both EQs are designed again, the target curve is reused
+    with data_path.open("a") as f:
+        f.write("25000, 0.0\n")
+    monkeypatch.setattr(TargetCalc, "calc_target_data", None)
+    Pipeline.run_pipeline(config)
+    assert designs == ["artificial", "natural"]*2
+
+def test_stage_keys(sample_config):
+    params = Pipeline.parse_config(sample_config)
+    keys = Build.stage_keys(params)
+
+    changed = Build.stage_keys(dict(params, slope=-3.0))
+    # The EQ designs depend on the target curve
+    assert all(changed[name] != keys[name] for name in keys)
+    changed = Build.stage_keys(dict(params, low_cutoff1=100.0))
+    assert [name for name in keys if changed[name] != keys[name]] == ["artificial", "plot_artificial"]
+    assert Build.stage_keys(dict(params, lr="L", eq1_file="a.txt")) == keys
+
+def test_state_round_trip(tmp_path):
+    state = Build.load_state(tmp_path)
+    assert state == {}
+
+    tmp_path.joinpath("out.txt").write_text("x")
+    Build.record(state, tmp_path, "stage", "key1", {'value': 1}, ["out.txt"])
+    Build.save_state(state, tmp_path)
+    state = Build.load_state(tmp_path)
+
+    assert Build.reuse(state, tmp_path, "stage", "key1") == {'value': 1}
+    assert Build.reuse(state, tmp_path, "stage", "key2") is None
+    # A missing output file makes the stage run again
+    tmp_path.joinpath("out.txt").unlink()
+    assert not Build.is_current(state, tmp_path, "stage", "key1")
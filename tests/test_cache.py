@@ -0,0 +1,59 @@
+# Cache: keys, LRU eviction and the cached target curve.
+
+import os
+
+import numpy as np
+
+import Cache
+import TargetCalc
+
+
+def test_file_digest_follows_contents(tmp_path):
+    path = tmp_path.joinpath("a.txt")
+    path.write_text("20, 1.0\n")
+    first = Cache.file_digest(path)
+
+    path.write_text("20, 2.0\n")
+    os.utime(path, ns=(0, 10**9))
+
+    assert Cache.file_digest(path) != first
+    assert Cache.make_key("a", 1.0) != Cache.make_key("a", 1)
+    assert Cache.make_key("a", 1.0) == Cache.make_key("a", 1.0)
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    arrays = {key: np.full(1000, i, dtype=float) for i, key in enumerate(["a", "b", "c"])}
+    entry_bytes = 8000 + 128  # data + .npy header
+    max_bytes = 2*entry_bytes
+
+    Cache.cache_store(tmp_path, "a", arrays['a'], max_bytes)
+    Cache.cache_store(tmp_path, "b", arrays['b'], max_bytes)
+    # a is older than b, but is used again before c is stored
+    os.utime(tmp_path.joinpath("a.npy"), (1000, 1000))
+    os.utime(tmp_path.joinpath("b.npy"), (2000, 2000))
+    np.testing.assert_array_equal(Cache.cache_load(tmp_path, "a"), arrays['a'])
+    Cache.cache_store(tmp_path, "c", arrays['c'], max_bytes)
+
+    assert Cache.cache_load(tmp_path, "b") is None
+    np.testing.assert_array_equal(Cache.cache_load(tmp_path, "a"), arrays['a'])
+    np.testing.assert_array_equal(Cache.cache_load(tmp_path, "c"), arrays['c'])
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.npy", "c.npy"]
+
+def test_target_calc_cache(tmp_path, sample_config, monkeypatch):
+    cache_dir = tmp_path.joinpath("cache")
+    no_hrtf = tmp_path.joinpath("no_hrtf.txt")
+    output_folder = sample_config['output_folder']
+
+    target = TargetCalc.target_calc(sample_config['eloud_file'], output_folder, -4.5, no_hrtf, cache_dir, plot="none")
+    written = tmp_path.joinpath("output", "target_curve_natural_flat.txt").read_text()
+    assert len(list(cache_dir.glob("*.npy"))) == 1
+
+    # The cached target is reused without calculation (and written again); another slope is another entry
+    tmp_path.joinpath("output", "target_curve_natural_flat.txt").unlink()
+    calc_target_data = TargetCalc.calc_target_data
+    monkeypatch.setattr(TargetCalc, "calc_target_data", None)
+    np.testing.assert_array_equal(TargetCalc.target_calc(sample_config['eloud_file'], output_folder, -4.5,
+                                                         no_hrtf, cache_dir, plot="none"), target)
+    assert tmp_path.joinpath("output", "target_curve_natural_flat.txt").read_text() == written
+    monkeypatch.setattr(TargetCalc, "calc_target_data", calc_target_data)
+    TargetCalc.target_calc(sample_config['eloud_file'], None, -3.0, no_hrtf, cache_dir, plot="none")
+    assert len(list(cache_dir.glob("*.npy"))) == 2
@@ -0,0 +1,79 @@
+# EqMake: the NumPy band fitting loop against the output files of the pandas loop
+# (tests/data/baseline, see test_pipeline.py).
+
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import Pipeline
+import Utils
+from EqMake import eq_make
+
+baseline_dir = Path(__file__).resolve().parent.joinpath("data", "baseline")
+
+
+def fit_log(text):
+    return [line for line in text.splitlines() if "Gaussian" in line or line.startswith("Neighbor")]
+
+@pytest.mark.parametrize("target_type, eq_file", [("artificial", "eq_1.txt"), ("natural", "eq_2.txt")])
+def test_eq_make_reproduces_baseline(sample_config, target_type, eq_file):
+    params = Pipeline.parse_config(sample_config)
+    output_folder = Path(sample_config['output_folder'])
+    shutil.copy(baseline_dir.joinpath("target_curve_natural_flat.txt"), output_folder)
+
+    eq_make(Pipeline.eq_make_data(params, target_type))
+
+    assert output_folder.joinpath(eq_file).read_text() == baseline_dir.joinpath(eq_file).read_text()
+
+def test_batch_q_fit_matches_curve_fit(sample_config, capsys):
+    params = Pipeline.parse_config(sample_config)
+    inputs = Pipeline.load_inputs(params)
+
+    result = Pipeline.design(params, inputs)
+    log = fit_log(capsys.readouterr().out)
+    batch = Pipeline.design(dict(params, q_fit="batch"), inputs, result['target'])
+
+    # The same fitting messages (per dip) and the same filters
+    assert fit_log(capsys.readouterr().out) == log
+
+    for target_type in ["artificial", "natural"]:
+        for key in ['f0s', 'gains', 'q_factors']:
+            np.testing.assert_allclose(batch[target_type][key], result[target_type][key], rtol=1e-5)
+
+def test_refine_lowers_residual(sample_config):
+    params = Pipeline.parse_config(dict(sample_config, refine=True))
+
+    result = Pipeline.design(params, Pipeline.load_inputs(params))
+
+    for target_type in ["artificial", "natural"]:
+        eq = result[target_type]
+        greedy_rms, final_rms = eq['rms']
+        assert final_rms < greedy_rms
+        assert all(params['min_q'] <= q <= params['max_q'] for q in eq['q_factors'])
+
+def test_tolerance_stops_adding_bands(sample_config):
+    params = Pipeline.parse_config(sample_config)
+    inputs = Pipeline.load_inputs(params)
+    full = Pipeline.design(params, inputs)
+
+    tolerance = full['natural']['rms'][1] + 0.5
+    result = Pipeline.design(dict(params, tolerance_rms=tolerance), inputs, full['target'])
+
+    eq = result['natural']
+    assert 0 < len(eq['f0s']) < params['band_num']
+    assert eq['rms'][1] <= tolerance
+    # The bands used are the first bands of the full design
+    np.testing.assert_array_equal(eq['f0s'], full['natural']['f0s'][:len(eq['f0s'])])
+
+def test_remove_duplicate_rows_matches_pandas():
+    pd = pytest.importorskip("pandas")
+    freqs = [20, 20, 40, 20, 80, 40]
+    gains = [1.0, 1.0, 2.0, 1.5, 3.0, 2.0]
+
+    df = pd.DataFrame({'freq': freqs, 'gain': gains}).drop_duplicates()
+    result = Utils.remove_duplicate_rows(freqs, gains)
+
+    np.testing.assert_array_equal(result[0], df['freq'])
+    np.testing.assert_array_equal(result[1], df['gain'])
@@ -0,0 +1,72 @@
+# Marge: channel remapping of the merged config and the command line.
+
+import numpy as np
+import pytest
+import yaml
+
+import Marge
+import Utils
+
+
+def write_eq_yml(path, lr, n, rng):
+    designs = {target_type: (rng.uniform(30, 15000, n), rng.uniform(-9, 3, n), rng.uniform(0.5, 8, n))
+               for target_type in ["artificial", "natural"]}
+    path.write_text(Utils.format_eq_settings_yml(designs, {'artificial': -1.5, 'natural': -0.5}, lr, n))
+    return str(path)
+
+@pytest.fixture
+def eq_files(tmp_path):
+    rng = np.random.default_rng(0)
+    folder = tmp_path.joinpath("eq")
+    folder.mkdir()
+    return [(name, write_eq_yml(folder.joinpath(f"eq_{name}.yml"), lr, n, rng))
+            for name, lr, n in [("L", "L", 3), ("R", "R", 4), ("C", "R", 2)]]
+
+def test_merge_channels_remap(tmp_path, eq_files):
+    out_file = str(tmp_path.joinpath("eqdata.yml"))
+    Marge.merge_channels(eq_files, out_file)
+
+    with open(out_file) as f:
+        merged = yaml.safe_load(f)
+    copies = [(step['channel'], step['dest']) for step in merged['pipeline'] if step['type'] == "Copy"]
+    assert copies == [(0, [3, 6]), (1, [4, 7]), (2, [5, 8])]
+
+    # Input channel i: artificial EQ on channel 3+i, natural EQ on channel 6+i, filters prefixed by the name
+    for i, (name, path) in enumerate(eq_files):
+        with open(path) as f:
+            cfg = yaml.safe_load(f)
+        for key, value in cfg['filters'].items():
+            assert merged['filters'][f"{name}_{key}"] == value
+        steps = [step for step in merged['pipeline'] if any(n.startswith(name + "_") for n in step.get('names', []))]
+        assert len(steps) == len(cfg['pipeline'])
+        lr_index = 0 if name == "L" else 1
+        for step, original in zip(steps, cfg['pipeline']):
+            expected = {2 + lr_index: 3 + i, 4 + lr_index: 6 + i}[original['channel']]
+            assert step['channel'] == expected
+            assert step['names'] == [f"{name}_{n}" for n in original['names']]
+
+def test_main_output_next_to_first_input(tmp_path, eq_files, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    eq_dir = tmp_path.joinpath("eq")
+
+    assert Marge.main([f"{name}={path}" for name, path in eq_files]) == 0
+    assert eq_dir.joinpath("eqdata.yml").is_file()
+    assert Marge.main([f"{name}={path}" for name, path in eq_files] + ["-o", "all.yml"]) == 0
+    assert eq_dir.joinpath("all.yml").is_file()
+
+    # Map files: the files are relative to the map file, the output to the first input file
+    tmp_path.joinpath("channels.yml").write_text(yaml.safe_dump(
+        {'channels': [{'name': "L", 'file': "eq/eq_L.yml"}, {'name': "R", 'file': "eq/eq_R.yml"}]}))
+    assert Marge.main(["--map", "channels.yml", "-o", "lr.yml"]) == 0
+    assert eq_dir.joinpath("lr.yml").is_file()
+
+    # Two files (legacy form)
+    assert Marge.main([eq_files[0][1], eq_files[1][1], "legacy.yml"]) == 0
+    assert eq_dir.joinpath("legacy.yml").is_file()
+    assert [path.name for path in tmp_path.glob("*.yml")] == ["channels.yml"]
+
+def test_main_errors(tmp_path, eq_files, capsys):
+    assert Marge.main([f"L={eq_files[0][1]}", f"R={tmp_path.joinpath('missing.yml')}"]) == 1
+    assert "Error: " in capsys.readouterr().out
+    assert Marge.main(["-o"]) == 1
+    assert "how to use" in capsys.readouterr().out
@@ -0,0 +1,155 @@
+# Math: the batched / vectorized functions against the scalar functions they replaced
+# (kept here as reference).
+
+import numpy as np
+import pytest
+
+import Math
+
+
+# Scalar reference functions (the implementations before vectorization)----------------
+def linear_interpolation_loop(f_range, gains, target_freq):
+    idx = 0
+    while idx < len(f_range) - 1 and f_range[idx + 1] < target_freq:
+        idx += 1
+
+    if idx == len(f_range) - 1:
+        return gains[idx]
+    freq_lower, freq_upper = f_range[idx], f_range[idx + 1]
+    gain_lower, gain_upper = gains[idx], gains[idx + 1]
+    return gain_lower + (gain_upper - gain_lower) * ((target_freq - freq_lower) / (freq_upper - freq_lower))
+
+def peak_filter_loop(f0, gain, q_factor, f_range):
+    w0 = 2 * np.pi * f0 / f_range
+    jw = 1j * 2 * np.pi
+    g = 2**(gain/6)
+    h = (w0**2 + g*w0/q_factor*jw + jw**2) / (w0**2 + w0/(g*q_factor)*jw + jw**2)
+    return np.abs(h)
+
+def eq_curve_loop(f0s, gains, q_factors, f_range):
+    eq_curve = np.zeros(len(f_range))
+    for f0, gain, q in zip(f0s, gains, q_factors):
+        eq_curve += 3*np.log2(peak_filter_loop(f0, gain, q, f_range))
+    return eq_curve
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+def random_fr(rng, n=300):
+    freqs = np.sort(rng.uniform(15, 22000, n))
+    gains = np.cumsum(rng.normal(0, 0.5, n))
+    return freqs, gains
+
+
+# Interpolation-----------------------------------------------------------------------
+def test_linear_interpolation_batch_matches_loop(rng):
+    freqs, gains = random_fr(rng)
+    # Inside, below and above the data, and exactly on the data points
+    targets = np.concatenate((rng.uniform(10, 25000, 500), freqs[::7]))
+
+    batch = Math.linear_interpolation_batch(freqs, gains, targets)
+    loop = np.array([linear_interpolation_loop(freqs, gains, t) for t in targets])
+
+    np.testing.assert_array_equal(batch, loop)
+    assert Math.linear_interpolation(freqs, gains, targets[0]) == loop[0]
+
+
+# EQ curve----------------------------------------------------------------------------
+def test_calculate_eq_curve_matches_loop(rng):
+    f_range = np.geomspace(20, 20000, 1000)
+    f0s = rng.uniform(30, 15000, 12)
+    gains = rng.uniform(-12, 6, 12)
+    q_factors = rng.uniform(0.5, 8, 12)
+
+    np.testing.assert_allclose(Math.calculate_eq_curve(f0s, gains, q_factors, f_range),
+                               eq_curve_loop(f0s, gains, q_factors, f_range), rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(Math.calculate_peak_filter(f0s[0], gains[0], q_factors[0], f_range),
+                               peak_filter_loop(f0s[0], gains[0], q_factors[0], f_range), rtol=1e-12)
+
+
+# Gaussian fit------------------------------------------------------------------------
+def test_fit_gaussians_matches_curve_fit(rng):
+    from scipy.optimize import curve_fit
+
+    xs, ys, p0s = [], [], []
+    for a, b, c, n in [(-8.0, 2.3, 0.05, 40), (5.0, 3.1, 0.08, 25), (-3.0, 2.8, 0.03, 60)]:
+        x = np.linspace(b - 0.1, b + 0.1, n)
+        xs.append(x)
+        ys.append(Math.gaussian_function(x, a, b, c) + rng.normal(0, 0.05, n))
+        p0s.append((a*0.9, b, c*1.2))
+
+    params, ok = Math.fit_gaussians(xs, ys, p0s)
+
+    assert ok.all()
+    for x, y, p0, p in zip(xs, ys, p0s, params):
+        expected, _ = curve_fit(Math.gaussian_function, x, y, p0=p0)
+        np.testing.assert_allclose(p, expected, rtol=1e-6, atol=1e-8)
+
+def test_fit_gaussians_too_few_points():
+    params, ok = Math.fit_gaussians([np.array([1.0, 2.0])], [np.array([0.5, 0.4])], [(1.0, 1.5, 0.5)])
+
+    assert not ok[0]
+
+
+# Refinement--------------------------------------------------------------------------
+def test_calculate_eq_jacobian_matches_finite_differences(rng):
+    f_range = np.geomspace(20, 20000, 1000)
+    params = np.column_stack((rng.uniform(50, 10000, 5), rng.uniform(-10, 5, 5), rng.uniform(0.7, 6, 5)))
+
+    jacobian = Math.calculate_eq_jacobian(*params.T, f_range)
+
+    for k in range(3):
+        step = np.zeros(3)
+        step[k] = 1e-6*max(abs(params[:, k]).max(), 1)
+        upper = Math.calculate_peak_filter_gains(*(params + step).T, f_range)
+        lower = Math.calculate_peak_filter_gains(*(params - step).T, f_range)
+        np.testing.assert_allclose(jacobian[:, :, k], (upper - lower)/(2*step[k]), rtol=1e-4, atol=1e-6)
+
+
+# Smoothing---------------------------------------------------------------------------
+@pytest.mark.parametrize("power", [True, False])
+def test_fractional_octave_smoothing_matches_direct_average(rng, power):
+    freqs, gains = random_fr(rng, 200)
+    fraction = 6
+
+    smoothed = Math.fractional_octave_smoothing(freqs, gains, fraction, power)
+
+    # Direct average of the linearly interpolated curve over each (truncated) window
+    x = np.log2(freqs)
+    y = 10**(gains/10) if power else gains
+    expected = np.empty(len(x))
+    for i, xi in enumerate(x):
+        u = np.linspace(max(xi - 0.5/fraction, x[0]), min(xi + 0.5/fraction, x[-1]), 20001)
+        v = np.interp(u, x, y)
+        expected[i] = 0.5*(v[1:] + v[:-1]).mean()
+    if power:
+        expected = 10*np.log10(expected)
+
+    np.testing.assert_allclose(smoothed, expected, atol=1e-3)
+
+def test_fractional_octave_smoothing_keeps_flat_response():
+    freqs = np.geomspace(20, 20000, 240)
+
+    np.testing.assert_allclose(Math.fractional_octave_smoothing(freqs, np.full(len(freqs), 3.0), 3), 3.0)
+
+
+# Log-frequency grid------------------------------------------------------------------
+def test_log_frequency_grid():
+    np.testing.assert_allclose(Math.log_frequency_grid(), np.logspace(np.log10(20), np.log10(20000), 1000))
+
+    f_range = Math.log_frequency_grid(12, 10, 24000)
+    assert f_range[0] == pytest.approx(10) and f_range[-1] == pytest.approx(24000)
+    assert len(f_range) == int(np.log2(2400)*12) + 1
+
+def test_resample_log_matches_loop(rng):
+    freqs, gains = random_fr(rng)
+    f_range = Math.log_frequency_grid(12, 10, 24000)
+
+    expected = [linear_interpolation_loop(np.log10(freqs), gains, t) for t in np.log10(f_range)]
+    np.testing.assert_array_equal(Math.resample_log(freqs, gains, f_range), expected)
+
+    # Unsorted input with a repeated frequency: sorted, first point of the repetition
+    order = rng.permutation(len(freqs))
+    shuffled = (np.append(freqs[order], freqs[0]), np.append(gains[order], 99.0))
+    np.testing.assert_array_equal(Math.resample_log(*shuffled, f_range), expected)
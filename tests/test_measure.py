@@ -0,0 +1,65 @@
+# Measure: FR data of impulse response and sweep recording WAV files.
+
+import numpy as np
+import pytest
+
+import Measure
+import Wav
+
+
+def write_wav(path, samples, fs=48000):
+    writer = Wav.open_writer(path, fs, samples.shape[1])
+    Wav.write_block(writer, samples)
+    Wav.close_writer(writer)
+    return path
+
+def dirac(frames, peak=100, amplitude=0.5):
+    ir = np.zeros((frames, 1))
+    ir[peak, 0] = amplitude
+    return ir
+
+@pytest.mark.parametrize("seconds", [1.0, 0.1, 0.01])
+@pytest.mark.parametrize("smoothing", [0, Measure.default_smoothing])
+def test_measure_fr_of_dirac_is_flat(tmp_path, seconds, smoothing):
+    # Impulse responses shorter than the window (500 ms) are not repeated
+    path = write_wav(tmp_path.joinpath("ir.wav"), dirac(int(seconds*48000)))
+
+    freqs, gains = Measure.measure_fr(path, smoothing=smoothing)
+
+    assert freqs[0] == pytest.approx(20) and freqs[-1] == pytest.approx(20000)
+    np.testing.assert_allclose(gains[:, 0], 20*np.log10(0.5), atol=1e-6)
+
+def test_window_ir_zero_pads_short_ir():
+    fs = 48000
+    pre, post = int(Measure.default_pre_ms*fs/1000), int(Measure.default_window_ms*fs/1000)
+    ir = np.random.default_rng(0).uniform(-0.1, 0.1, (1000, 2))
+    ir[10, 0] = 1.0
+    ir[500, 1] = 1.0
+
+    windowed = Measure.window_ir(ir, fs)
+    # Window of an impulse response longer than the window (all ones, peak at 0)
+    window = Measure.window_ir(np.ones((pre + post + 1, 1)), fs)[:, 0]
+
+    assert windowed.shape == (pre + post, 2)
+    # Channel 0: the samples before the peak wrap to the end, each sample is used once
+    expected = np.zeros(pre + post)
+    expected[:len(ir)] = np.roll(ir[:, 0], pre - 10)
+    np.testing.assert_array_equal(windowed[:, 0], expected*window)
+    # Channel 1: up to the end of the impulse response, then zeros
+    expected = np.zeros(pre + post)
+    expected[:pre + 500] = ir[500 - pre:, 1]
+    np.testing.assert_array_equal(windowed[:, 1], expected*window)
+
+def test_measure_fr_of_sweep_recording(tmp_path):
+    fs = 48000
+    sweep = Measure.exp_sweep(10, 24000, 2.0, fs)
+    # Speaker: delay of 240 samples and -6 dB
+    recording = np.zeros((len(sweep) + fs//2, 1))
+    recording[240:240 + len(sweep), 0] = 0.5*sweep
+    sweep_path = write_wav(tmp_path.joinpath("sweep.wav"), sweep[:, None])
+    recording_path = write_wav(tmp_path.joinpath("recording.wav"), recording)
+
+    freqs, gains = Measure.measure_fr(recording_path, [0], sweep_path)
+
+    band = (freqs >= 40) & (freqs <= 16000)
+    np.testing.assert_allclose(gains[band, 0], 20*np.log10(0.5), atol=0.1)
@@ -0,0 +1,85 @@
+# MultiChannel: system files, shared arrays and the merged config of all channels.
+
+import os
+
+import numpy as np
+import pytest
+import yaml
+
+import MultiChannel
+
+
+def write_system(tmp_path, sample_config, channels, **system):
+    path = tmp_path.joinpath("system.yml")
+    system.setdefault('output_folder', "system")
+    system.setdefault('defaults', dict(sample_config, band_num=5))
+    system['channels'] = channels
+    path.write_text(yaml.safe_dump(system))
+    return path
+
+def test_load_system(tmp_path, sample_config):
+    path = write_system(tmp_path, sample_config, [{'name': "L"}, {'name': "R"}, {'name': "C", 'band_num': 3}],
+                        merged_file="all.yml")
+
+    channels, merged_path = MultiChannel.load_system(path)
+
+    assert [name for name, _ in channels] == ["L", "R", "C"]
+    assert [config['eq_file_yml'] for _, config in channels] == ["eq_L.yml", "eq_R.yml", "eq_C.yml"]
+    assert [config['lr'] for _, config in channels[:2]] == ["L", "R"]
+    assert channels[2][1]['band_num'] == 3
+    assert channels[0][1]['output_folder'] == str(tmp_path.joinpath("system", "L"))
+    assert merged_path == tmp_path.joinpath("system", "all.yml")
+
+def test_load_system_shared_keys(tmp_path, sample_config):
+    path = write_system(tmp_path, sample_config, [{'name': "L"}, {'name': "R", 'slope': -3.0}])
+
+    with pytest.raises(ValueError, match="slope must be the same for all channels"):
+        MultiChannel.load_system(path)
+
+def test_shared_arrays():
+    arrays = {'target': np.random.default_rng(0).normal(size=(1000, 2)), 'freqs': np.arange(10.0)}
+
+    blocks, specs = MultiChannel.share_arrays(arrays)
+    try:
+        shared, attached = MultiChannel.attach_arrays(specs)
+        for key, array in arrays.items():
+            np.testing.assert_array_equal(shared[key], array)
+            assert not shared[key].flags.writeable
+        del shared
+        for block in attached:
+            block.close()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_system(tmp_path, sample_config, workers):
+    path = write_system(tmp_path, sample_config, [{'name': "L"}, {'name': "R"}, {'name': "C"}])
+    channels, merged_path = MultiChannel.load_system(path)
+    shm = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+
+    failed = MultiChannel.run_system(channels, merged_path, workers)
+
+    assert failed == []
+    with open(merged_path) as f:
+        merged = yaml.safe_load(f)
+    copies = [(step['channel'], step['dest']) for step in merged['pipeline'] if step['type'] == "Copy"]
+    assert copies == [(0, [3, 6]), (1, [4, 7]), (2, [5, 8])]
+    for name in ["L", "R", "C"]:
+        folder = tmp_path.joinpath("system", name)
+        assert folder.joinpath(f"eq_{name}.yml").is_file() and folder.joinpath("log.txt").is_file()
+        assert f"{name}_artificial_eq1" in merged['filters'] and f"{name}_natural_eq1" in merged['filters']
+    # The same speaker data in all channels: the same EQ
+    eqs = {name: tmp_path.joinpath("system", name, "eq_1.txt").read_text() for name in ["L", "R", "C"]}
+    assert eqs['L'] == eqs['R'] == eqs['C']
+    # The shared memory blocks are released
+    if os.path.isdir("/dev/shm"):
+        assert set(os.listdir("/dev/shm")) <= shm
+
+def test_run_system_failed_channel(tmp_path, sample_config):
+    path = write_system(tmp_path, sample_config, [{'name': "L"}, {'name': "R", 'data_file': "missing.txt"}])
+    channels, merged_path = MultiChannel.load_system(path)
+
+    assert MultiChannel.run_system(channels, merged_path, 1) == ["R"]
+    assert not merged_path.exists()
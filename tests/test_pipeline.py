@@ -0,0 +1,52 @@
+# Pipeline: the in-memory pipeline against the output files of the file-based program
+# (tests/data/baseline: sample speaker FR data with config.yaml of the program).
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import Pipeline
+import Utils
+
+baseline_dir = Path(__file__).resolve().parent.joinpath("data", "baseline")
+baseline_files = ["eq_1.txt", "eq_2.txt", "eq_R.yml", "fri.txt", "target_curve_natural_flat.txt"]
+
+
+def test_run_pipeline_reproduces_baseline(sample_config):
+    Pipeline.run_pipeline(sample_config)
+
+    output_folder = Path(sample_config['output_folder'])
+    for file in baseline_files:
+        assert output_folder.joinpath(file).read_text() == baseline_dir.joinpath(file).read_text(), file
+
+def test_design_in_memory(sample_config):
+    params = Pipeline.parse_config(sample_config)
+
+    result = Pipeline.design(params, Pipeline.load_inputs(params))
+
+    # Nothing is written; the filters are those of the baseline files (rounded as written)
+    assert list(Path(sample_config['output_folder']).iterdir()) == []
+    for target_type, file in [("artificial", "eq_1.txt"), ("natural", "eq_2.txt")]:
+        eq = result[target_type]
+        f0s, gains, q_factors = Utils.read_eq_data(baseline_dir.joinpath(file))
+        np.testing.assert_allclose(eq['f0s'], f0s, atol=0.005)
+        np.testing.assert_allclose(eq['gains'], gains, atol=0.005)
+        np.testing.assert_allclose(eq['q_factors'], q_factors, atol=0.0005)
+    target = Utils.read_two_column_data(baseline_dir.joinpath("target_curve_natural_flat.txt"))
+    np.testing.assert_allclose(result['target'][:, 1], target[1], atol=5e-7)
+    assert result['natural']['fri'][2] == pytest.approx(Utils.read_fri_diff(baseline_dir.joinpath("fri.txt")))
+
+def test_parallel_designs_match_serial(sample_config, capsys):
+    params = Pipeline.parse_config(sample_config)
+    inputs = Pipeline.load_inputs(params)
+    assert not params['parallel_designs']
+
+    serial = Pipeline.design(params, inputs)
+    log = capsys.readouterr().out
+    parallel = Pipeline.design(dict(params, parallel_designs=True), inputs, serial['target'])
+
+    assert capsys.readouterr().out == log
+    for target_type in ["artificial", "natural"]:
+        for key in ['f0s', 'gains', 'q_factors', 'fri']:
+            np.testing.assert_array_equal(parallel[target_type][key], serial[target_type][key])
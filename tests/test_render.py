@@ -0,0 +1,79 @@
+# Render: biquad coefficients, block-based rendering and reading the EQ files.
+
+import numpy as np
+import pytest
+import yaml
+
+import Marge
+import Render
+import Utils
+import Wav
+
+
+def test_peaking_sos_gain_at_f0():
+    from scipy.signal import sosfreqz
+
+    f0s, gains, q_factors = [100.0, 1000.0, 8000.0], [-6.0, 3.0, -12.0], [1.0, 4.0, 2.0]
+    sos = Render.peaking_sos(f0s, gains, q_factors, 48000)
+
+    for i, (f0, gain) in enumerate(zip(f0s, gains)):
+        _, h = sosfreqz(sos[i:i + 1], worN=[f0], fs=48000)
+        assert 20*np.log10(abs(h[0])) == pytest.approx(gain, abs=1e-9)
+
+def test_render_wav_blocks_match_one_pass(tmp_path):
+    from scipy.signal import sosfilt
+
+    samples = np.random.default_rng(0).uniform(-0.5, 0.5, (5000, 2)).astype(np.float32)
+    in_path = tmp_path.joinpath("in.wav")
+    writer = Wav.open_writer(in_path, 48000, 2)
+    Wav.write_block(writer, samples)
+    Wav.close_writer(writer)
+    filters = ([200.0, 3000.0], [-6.0, 4.0], [2.0, 1.0], -3.0)
+
+    out_path = tmp_path.joinpath("out.wav")
+    peak = Render.render_wav(in_path, out_path, {1: filters}, block_frames=777)
+
+    wav = Wav.open_wav(out_path)
+    out = Wav.read_block(wav, 0, wav['frames'])
+    expected = sosfilt(Render.peaking_sos(*filters[:3], 48000), samples[:, 1].astype(float))*10**(-3.0/20)
+    np.testing.assert_array_equal(out[:, 0], samples[:, 0])
+    np.testing.assert_allclose(out[:, 1], expected, atol=1e-6)
+    assert peak == pytest.approx(np.abs(out).max(), rel=1e-6)
+
+def test_read_eq_filters_of_merged_file(tmp_path):
+    rng = np.random.default_rng(0)
+    designs = {}
+    paths = []
+    for name, n in [("L", 3), ("R", 4), ("C", 2)]:
+        design = {target_type: (np.round(rng.uniform(30, 15000, n), 2), np.round(rng.uniform(-9, 3, n), 2),
+                                np.round(rng.uniform(0.5, 8, n), 3))
+                  for target_type in ["artificial", "natural"]}
+        designs[name] = design
+        path = tmp_path.joinpath(f"eq_{name}.yml")
+        path.write_text(Utils.format_eq_settings_yml(design, {'artificial': -1.5, 'natural': -0.5},
+                                                     name if name in ("L", "R") else "R", n))
+        paths.append((name, str(path)))
+    out_file = str(tmp_path.joinpath("eqdata.yml"))
+    Marge.merge_channels(paths, out_file)
+
+    # Input channel i: artificial EQ on channel 3+i, natural EQ on channel 6+i
+    for target_type, gain in [("artificial", -1.5 - 6.0), ("natural", -0.5 - 6.0)]:
+        channels = Render.read_eq_filters(out_file, target_type)
+        assert sorted(channels) == [0, 1, 2]
+        for i, name in enumerate(["L", "R", "C"]):
+            f0s, gains, q_factors, total_gain = channels[i]
+            for values, expected in zip((f0s, gains, q_factors), designs[name][target_type]):
+                np.testing.assert_allclose(values, expected)
+            assert total_gain == pytest.approx(gain)
+
+    # The file of one speaker: its own channel, or the first one for another channel
+    assert Render.parse_eq_args([f"L={paths[0][1]}", f"2={paths[1][1]}"], "natural").keys() == {0, 2}
+
+def test_eq_file_without_filters(tmp_path, capsys):
+    path = tmp_path.joinpath("empty.yml")
+    path.write_text(yaml.safe_dump({'filters': {}, 'pipeline': []}))
+
+    with pytest.raises(ValueError, match="no artificial EQ filters"):
+        Render.parse_eq_args([f"L={path}"], "artificial")
+    assert Render.main(["--eq", f"L={path}", "--rate", "48000", "--sos-out", str(tmp_path.joinpath("sos.txt"))]) == 1
+    assert "Error: " in capsys.readouterr().out
@@ -0,0 +1,26 @@
+# SonusCorrect: the config check of --check-config (no GUI modules are imported).
+
+import sys
+
+import yaml
+
+import SonusCorrect
+
+
+def write_config(tmp_path, config):
+    path = tmp_path.joinpath("config.yaml")
+    path.write_text(yaml.safe_dump(config))
+    return path
+
+def test_check_config(tmp_path, sample_config):
+    assert SonusCorrect.check_config(str(write_config(tmp_path, sample_config))) == []
+    assert "tkinter" not in sys.modules
+
+def test_check_config_errors(tmp_path, sample_config):
+    missing = str(tmp_path.joinpath("missing.txt"))
+    path = write_config(tmp_path, dict(sample_config, data_file=[sample_config['data_file'], missing],
+                                       min_q=9.0))
+
+    errors = SonusCorrect.check_config(str(path))
+
+    assert errors == [f"data_file: file not found: {missing}", "min_q > max_q: 9.0 > 8.0"]
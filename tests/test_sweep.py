@@ -0,0 +1,77 @@
+# Sweep: sampling of the parameter sets and the ranked evaluation.
+
+import csv
+import io
+import contextlib
+
+import numpy as np
+import pytest
+import yaml
+
+import Pipeline
+import Sweep
+
+
+def write_sweep(tmp_path, sweep):
+    path = tmp_path.joinpath("sweep.yml")
+    path.write_text(yaml.safe_dump(sweep))
+    return path
+
+def test_grid_points(tmp_path):
+    sweep = Sweep.load_sweep(write_sweep(tmp_path, {'params': {'band_num': [10, 20],
+                                                               'dip_alpha': {'min': 0.0, 'max': 1.0, 'num': 3}}}))
+
+    points = Sweep.make_points(sweep)
+
+    assert points == [{'band_num': b, 'dip_alpha': a} for b in [10, 20] for a in [0.0, 0.5, 1.0]]
+    assert all(isinstance(point['band_num'], int) for point in points)
+
+@pytest.mark.parametrize("method", ["random", "lhs"])
+def test_sampled_points(tmp_path, method):
+    sweep = Sweep.load_sweep(write_sweep(tmp_path, {'method': method, 'samples': 10, 'seed': 1,
+                                                    'params': {'max_q': {'min': 4.0, 'max': 9.0},
+                                                               'band_num': {'min': 5, 'max': 15}}}))
+
+    points = Sweep.make_points(sweep)
+
+    assert len(points) == 10 and points == Sweep.make_points(sweep)
+    max_qs = np.array([point['max_q'] for point in points])
+    assert ((4.0 <= max_qs) & (max_qs <= 9.0)).all()
+    assert all(isinstance(point['band_num'], int) and 5 <= point['band_num'] <= 15 for point in points)
+    if method == "lhs":
+        # One point in each of the 10 strata of each range
+        assert sorted(((max_qs - 4.0)/5.0*10).astype(int)) == list(range(10))
+
+@pytest.mark.parametrize("sweep, message", [({'method': "sobol", 'params': {'band_num': [10]}}, "Unknown method"),
+                                            ({'rank': "fri", 'params': {'band_num': [10]}}, "Unknown rank"),
+                                            ({'params': {'slope': [-3, -4]}}, "cannot be swept"),
+                                            ({'params': {'band_num': 10}}, "list of values"),
+                                            ({}, "No params")])
+def test_load_sweep_errors(tmp_path, sweep, message):
+    with pytest.raises(ValueError, match=message):
+        Sweep.load_sweep(write_sweep(tmp_path, sweep))
+
+def test_run_sweep(tmp_path, sample_config):
+    points = [{'band_num': 3}, {'band_num': 8}, {'band_num': 8, 'min_q': 9.0}]
+
+    rows = Sweep.run_sweep(sample_config, points, "rms", workers=1)
+
+    # More bands fit better; the invalid point is last
+    assert [row['band_num'] for row in rows] == [8, 3, 8]
+    assert rows[-1]['error'] == "min_q > max_q" and rows[-1]['score'] == float("inf")
+    assert rows[0]['score'] < rows[1]['score']
+
+    # The scores are those of a normal design with the same settings
+    params = Pipeline.parse_config(dict(sample_config, band_num=8))
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = Pipeline.design(params, Pipeline.load_inputs(params))
+    assert rows[0]['rms_natural'] == pytest.approx(result['natural']['rms'][1])
+    assert rows[0]['fri_artificial'] == pytest.approx(result['artificial']['fri'][2])
+    assert rows[0]['bands_artificial'] == 8
+
+    out_path = tmp_path.joinpath("sweep.csv")
+    Sweep.write_table(out_path, rows, ['band_num', 'min_q'])
+    with open(out_path, newline="") as f:
+        table = list(csv.DictReader(f))
+    assert [(row['rank'], row['band_num'], row['error']) for row in table] == [("1", "8", ""), ("2", "3", ""),
+                                                                               ("3", "8", "min_q > max_q")]
@@ -0,0 +1,64 @@
+# Utils: the columnar readers against the line-by-line readers they replaced
+# (kept here as reference).
+
+import numpy as np
+import pytest
+
+import Utils
+
+
+# Line-by-line reference functions (the implementations before the columnar readers)------
+def read_eq_data_loop(text):
+    frequencies, gains, q_factors = [], [], []
+    for line in text.splitlines():
+        if line.startswith('Filter') and line.split()[2] == "ON":
+            frequencies.append(float(line.split()[5]))
+            gains.append(float(line.split()[8]))
+            q_factors.append(float(line.split()[11]))
+    return frequencies, gains, q_factors
+
+def collapse_duplicates_loop(freqs, gains):
+    frequencies, out = [], []
+    for freq, gain in zip(freqs, gains):
+        freq_pre = frequencies[-1] if frequencies else 0
+        if freq_pre != freq:
+            frequencies.append(freq)
+            out.append(gain)
+    return frequencies, out
+
+
+# EQ data-----------------------------------------------------------------------------
+def test_parse_eq_data_matches_line_parser():
+    rng = np.random.default_rng(0)
+    text = ""
+    for n, (freq, gain, q) in enumerate(zip(rng.uniform(20, 20000, 8), rng.uniform(-12, 6, 8), rng.uniform(0.5, 8, 8)), 1):
+        text += f"Filter {n}: ON  PK  Fc  {freq:.2f} Hz  Gain  {gain:.2f} dB  Q  {q:.3f}\n"
+    text += "Filter 9: OFF  PK  Fc  100.00 Hz  Gain  -3.00 dB  Q  1.000\n"
+
+    parsed = Utils.parse_eq_data(text)
+
+    for values, expected in zip(parsed, read_eq_data_loop(text)):
+        np.testing.assert_array_equal(values, expected)
+    assert len(parsed[0]) == 8
+
+
+# Two column data---------------------------------------------------------------------
+def test_read_two_column_data(tmp_path):
+    path = tmp_path.joinpath("fr.txt")
+    path.write_text("* REW export\nFreq(Hz), SPL(dB), Phase\n20, 1.5, 10\n20, 1.7, 10\n40 2.5 0\n80\t-3.0\t5,\n")
+
+    freqs, gains = Utils.read_two_column_data(path)
+    np.testing.assert_array_equal(freqs, [20, 20, 40, 80])
+    np.testing.assert_array_equal(gains, [1.5, 1.7, 2.5, -3.0])
+
+    freqs, gains = Utils.read_spkr_fr_data(path)
+    expected = collapse_duplicates_loop([20, 20, 40, 80], [1.5, 1.7, 2.5, -3.0])
+    np.testing.assert_array_equal(freqs, expected[0])
+    np.testing.assert_array_equal(gains, expected[1])
+
+def test_read_two_column_data_rejects_uneven_lines(tmp_path):
+    path = tmp_path.joinpath("fr.txt")
+    path.write_text("10, 1\n20, 2, 5\n30\n")
+
+    with pytest.raises(ValueError, match="line 2"):
+        Utils.read_two_column_data(path)